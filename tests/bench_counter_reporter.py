@@ -0,0 +1,47 @@
+"""CounterReporter overhead benchmark.
+
+Measures the cost of 1M counter increments with and without a
+CounterReporter aggressively exporting the counters in the
+background.
+
+Usage:
+    python bench_counter_reporter.py
+"""
+import time
+
+import testbase
+from trpycore.counter.atomic import AtomicCounters
+from trpycore.counter.reporter import CallbackSink, CounterReporter
+from trpycore.counter.striped import StripedCounters
+
+INCREMENTS = 1000000
+COUNTER_NAMES = ["counter%d" % i for i in range(100)]
+
+def run(counters):
+    names = COUNTER_NAMES * (INCREMENTS / len(COUNTER_NAMES))
+    increment = counters.increment
+    start = time.time()
+    for name in names:
+        increment(name)
+    return time.time() - start
+
+def benchmark(counters_class):
+    baseline = run(counters_class(counter_names=COUNTER_NAMES))
+
+    counters = counters_class(counter_names=COUNTER_NAMES)
+    batches = []
+    reporter = CounterReporter(counters, CallbackSink(batches.append), interval=0.01)
+    reporter.start()
+    reported = run(counters)
+    reporter.stop()
+    reporter.join()
+
+    overhead = (reported - baseline) / baseline * 100
+    print "%s: %d increments" % (counters_class.__name__, INCREMENTS)
+    print "    without reporter: %.3fs (%d/sec)" % (baseline, INCREMENTS / baseline)
+    print "    with reporter:    %.3fs (%d/sec), %d reports" % (reported, INCREMENTS / reported, len(batches))
+    print "    overhead:         %.1f%%" % overhead
+
+if __name__ == "__main__":
+    benchmark(AtomicCounters)
+    benchmark(StripedCounters)
@@ -0,0 +1,48 @@
+"""Pool instrumentation overhead benchmark.
+
+Measures the cost of 100K borrow/return cycles for each pool
+with and without instrumentation.
+
+Usage:
+    python bench_pool.py
+"""
+import time
+
+import testbase
+from trpycore.factory.base import Factory
+from trpycore.pool.elastic import ElasticPool
+from trpycore.pool.factory import FactoryPool
+from trpycore.pool.queue import QueuePool
+from trpycore.pool.simple import SimplePool
+from trpycore.pool.threadlocal import ThreadLocalPool
+
+BORROWS = 100000
+
+class ObjectFactory(Factory):
+    def create(self):
+        return object()
+
+def run(pool):
+    get = pool.get
+    start = time.time()
+    for i in xrange(BORROWS):
+        with get():
+            pass
+    return time.time() - start
+
+def benchmark(name, create_pool):
+    baseline = run(create_pool(False))
+    instrumented = run(create_pool(True))
+    overhead = (instrumented - baseline) / baseline * 100
+    print "%s: %d borrows" % (name, BORROWS)
+    print "    uninstrumented: %.3fs (%.2fus/borrow)" % (baseline, baseline / BORROWS * 1000000)
+    print "    instrumented:   %.3fs (%.2fus/borrow)" % (instrumented, instrumented / BORROWS * 1000000)
+    print "    overhead:       %.1f%% (%.2fus/borrow)" % (overhead, (instrumented - baseline) / BORROWS * 1000000)
+
+if __name__ == "__main__":
+    factory = ObjectFactory()
+    benchmark("QueuePool", lambda i: QueuePool(10, factory, instrumented=i))
+    benchmark("ElasticPool", lambda i: ElasticPool(factory, instrumented=i))
+    benchmark("ThreadLocalPool", lambda i: ThreadLocalPool(factory, instrumented=i))
+    benchmark("FactoryPool", lambda i: FactoryPool(factory, instrumented=i))
+    benchmark("SimplePool", lambda i: SimplePool(object(), instrumented=i))
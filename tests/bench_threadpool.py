@@ -0,0 +1,66 @@
+"""Work stealing thread pool benchmark.
+
+Measures the time to process 200K tiny work items with ThreadPool
+and WorkStealingThreadPool, both for work items put from outside
+the pool, and for tasks fanned out from within worker threads.
+
+Usage:
+    python bench_threadpool.py
+"""
+import threading
+import time
+
+import testbase
+from trpycore.thread.threadpool import ThreadPool
+from trpycore.thread.workstealing import WorkStealingThreadPool
+
+ITEMS = 200000
+FANOUT = 1000
+
+def run_put(pool):
+    start = time.time()
+    pool.start()
+    put = pool.put
+    for i in xrange(ITEMS):
+        put(i)
+    pool.stop()
+    pool.join()
+    return time.time() - start
+
+def run_fanout(pool):
+    done = threading.Event()
+    remaining = [ITEMS]
+    lock = threading.Lock()
+
+    def leaf():
+        with lock:
+            remaining[0] -= 1
+            if not remaining[0]:
+                done.set()
+
+    def spawn():
+        for i in xrange(FANOUT):
+            pool.submit(leaf)
+
+    start = time.time()
+    pool.start()
+    for i in xrange(ITEMS / FANOUT):
+        pool.submit(spawn)
+    done.wait()
+    pool.stop()
+    pool.join()
+    return time.time() - start
+
+def benchmark(name, run, num_threads):
+    processor = lambda item: None
+    baseline = run(ThreadPool(num_threads, processor))
+    stealing = run(WorkStealingThreadPool(num_threads, processor))
+    print "%s: %d items, %d threads" % (name, ITEMS, num_threads)
+    print "    ThreadPool:             %.3fs (%.2fus/item)" % (baseline, baseline / ITEMS * 1000000)
+    print "    WorkStealingThreadPool: %.3fs (%.2fus/item)" % (stealing, stealing / ITEMS * 1000000)
+    print "    speedup:                %.2fx" % (baseline / stealing)
+
+if __name__ == "__main__":
+    for num_threads in [4, 16]:
+        benchmark("put", run_put, num_threads)
+        benchmark("fanout", run_fanout, num_threads)
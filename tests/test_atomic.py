@@ -0,0 +1,236 @@
+import threading
+import time
+import unittest
+import Queue
+
+import testbase
+from trpycore.atomic import Atomic, AtomicStampedReference, AtomicUpdateException
+from trpycore.atomic.backoff import ExponentialBackoff
+from trpycore.atomic.ringbuffer import RingBufferQueue
+from trpycore.thread.threadpool import ThreadPool
+
+class TestAtomic(unittest.TestCase):
+
+    def test_basic(self):
+        value = Atomic(1)
+        self.assertEqual(value.get(), 1)
+        self.assertEqual(value.set(2), 1)
+        self.assertEqual(value.get(), 2)
+        self.assertEqual(value.update(lambda v: v * 10), 20)
+        self.assertEqual(value.get(), 20)
+
+    def test_increment(self):
+        value = Atomic(0)
+        self.assertEqual(value.increment(), 1)
+        self.assertEqual(value.increment(5), 6)
+        self.assertEqual(value.decrement(2), 4)
+        self.assertEqual(value.decrement(), 3)
+
+    def test_update_failure(self):
+        value = Atomic(0)
+
+        def func(current):
+            #Simulate contention by modifying value underneath us
+            value.set(current + 100)
+            return current + 1
+
+        with self.assertRaises(AtomicUpdateException):
+            value.update(func, spin=False)
+
+        stats = value.stats()
+        self.assertEqual(stats["attempts"], 1)
+        self.assertEqual(stats["failures"], 1)
+        self.assertEqual(stats["max_retries"], 1)
+
+    def test_stats(self):
+        value = Atomic(0.0, backoff=ExponentialBackoff(max_delay=0.0001))
+        contention = [3]
+
+        def func(current):
+            #Simulate contention for the first few attempts by
+            #replacing the value with an equal, but distinct, object.
+            if contention[0]:
+                contention[0] -= 1
+                value.set(current + 0.0)
+            return current + 1
+
+        self.assertEqual(value.update(func), 1.0)
+        stats = value.stats()
+        self.assertEqual(stats["attempts"], 4)
+        self.assertEqual(stats["failures"], 3)
+        self.assertEqual(stats["max_retries"], 3)
+
+        value.increment()
+        stats = value.stats()
+        self.assertEqual(stats["attempts"], 5)
+        self.assertEqual(stats["failures"], 3)
+
+        value.reset_stats()
+        self.assertEqual(value.stats(), {"attempts": 0, "failures": 0, "max_retries": 0})
+
+    def test_threads(self):
+        value = Atomic(0, backoff=ExponentialBackoff())
+
+        def run():
+            for i in range(1000):
+                value.increment()
+
+        threads = [threading.Thread(target=run) for i in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(value.get(), 10000)
+
+    def test_compare_and_set_many(self):
+        a, b, c = object(), object(), object()
+        value = Atomic((a, b))
+        self.assertEqual(value.compare_and_set_many((a, c), (c, c)), False)
+        self.assertEqual(value.compare_and_set_many((a,), (c,)), False)
+        self.assertEqual(value.compare_and_set_many((a, b), [b, c]), True)
+        self.assertEqual(value.get(), (b, c))
+
+
+class TestAtomicStampedReference(unittest.TestCase):
+
+    def test_basic(self):
+        a, b = object(), object()
+        ref = AtomicStampedReference(a)
+        self.assertIs(ref.get(), a)
+        self.assertEqual(ref.get_stamp(), 0)
+        self.assertEqual(ref.set(b), (a, 0))
+        self.assertEqual(ref.get_pair(), (b, 1))
+        self.assertEqual(ref.set(a, 10), (b, 1))
+        self.assertEqual(ref.get_pair(), (a, 10))
+
+    def test_aba(self):
+        a, b = object(), object()
+        ref = AtomicStampedReference(a)
+        value, stamp = ref.get_pair()
+
+        #Change value to b and then back to a
+        self.assertEqual(ref.compare_and_set(a, b, stamp), True)
+        self.assertEqual(ref.compare_and_set(b, a, stamp + 1), True)
+        self.assertIs(ref.get(), a)
+
+        #Stale snapshot must fail even though value is a
+        self.assertEqual(ref.compare_and_set(value, b, stamp), False)
+        self.assertEqual(ref.get_pair(), (a, 2))
+
+    def test_attempt_stamp(self):
+        a, b = object(), object()
+        ref = AtomicStampedReference(a)
+        self.assertEqual(ref.attempt_stamp(b, 5), False)
+        self.assertEqual(ref.attempt_stamp(a, 5), True)
+        self.assertEqual(ref.get_pair(), (a, 5))
+
+    def test_update(self):
+        ref = AtomicStampedReference(0)
+
+        def run():
+            for i in range(1000):
+                ref.update(lambda v: v + 1)
+
+        threads = [threading.Thread(target=run) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(ref.get_pair(), (4000, 4000))
+
+
+class TestRingBufferQueue(unittest.TestCase):
+
+    def test_basic(self):
+        queue = RingBufferQueue(3)
+        self.assertEqual(queue.maxsize, 4)
+        self.assertEqual(queue.empty(), True)
+        for i in range(4):
+            self.assertEqual(queue.offer(i), True)
+        self.assertEqual(queue.offer(4), False)
+        self.assertEqual(queue.full(), True)
+        self.assertEqual(queue.qsize(), 4)
+        self.assertEqual([queue.poll() for i in range(4)], [0, 1, 2, 3])
+        self.assertEqual(queue.poll(), None)
+        self.assertEqual(queue.poll(-1), -1)
+
+    def test_none_item(self):
+        queue = RingBufferQueue(2)
+        queue.put(None)
+        self.assertEqual(queue.get(), None)
+        with self.assertRaises(Queue.Empty):
+            queue.get_nowait()
+
+    def test_timeout(self):
+        queue = RingBufferQueue(2)
+        queue.put(1)
+        queue.put(2)
+        with self.assertRaises(Queue.Full):
+            queue.put_nowait(3)
+        start = time.time()
+        with self.assertRaises(Queue.Full):
+            queue.put(3, timeout=0.1)
+        self.assertGreaterEqual(time.time() - start, 0.1)
+        self.assertEqual(queue.get(timeout=0.1), 1)
+        self.assertEqual(queue.get_nowait(), 2)
+        with self.assertRaises(Queue.Empty):
+            queue.get(timeout=0.1)
+
+    def test_threads(self):
+        queue = RingBufferQueue(16)
+        results = []
+        lock = threading.Lock()
+
+        def produce(start):
+            for i in range(start, start + 1000):
+                queue.put(i)
+
+        def consume():
+            items = [queue.get() for i in range(1000)]
+            with lock:
+                results.extend(items)
+
+        threads = [threading.Thread(target=produce, args=(i * 1000,)) for i in range(4)]
+        threads.extend(threading.Thread(target=consume) for i in range(4))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(results), range(4000))
+
+    def test_blocking(self):
+        queue = RingBufferQueue(2)
+        results = []
+
+        #Consumer blocks on the condition once spin_retries expire
+        consumer = threading.Thread(target=lambda: results.append(queue.get(timeout=5)))
+        consumer.start()
+        time.sleep(0.2)
+        self.assertEqual(queue.getters, 1)
+        queue.put(1)
+        consumer.join()
+        self.assertEqual(results, [1])
+
+        queue.put(2)
+        queue.put(3)
+        producer = threading.Thread(target=lambda: queue.put(4, timeout=5))
+        producer.start()
+        time.sleep(0.2)
+        self.assertEqual(queue.putters, 1)
+        self.assertEqual(queue.poll(), 2)
+        producer.join()
+        self.assertEqual([queue.get_nowait() for i in range(2)], [3, 4])
+
+    def test_threadpool(self):
+        counter = Atomic(0)
+        pool = ThreadPool(4, lambda item: counter.increment(item), queue=RingBufferQueue(8))
+        pool.start()
+        for i in range(100):
+            pool.put(1)
+        pool.stop()
+        pool.join()
+        self.assertEqual(counter.get(), 100)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,395 @@
+import math
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+
+import testbase
+from trpycore.counter.atomic import AtomicCounters
+from trpycore.counter.basic import BasicCounters
+from trpycore.counter.hierarchical import HierarchicalCounters, counter_key
+from trpycore.counter.histogram import AtomicHistogram, BasicHistogram, HistogramLayout
+from trpycore.counter.meter import Meter, SlidingWindowCounter
+from trpycore.counter.reporter import CallbackSink, CounterReporter, FileSink, StatsdSink
+from trpycore.counter.shared import SharedCounters
+from trpycore.counter.striped import StripedCounter, StripedCounters
+
+class TestCounters(unittest.TestCase):
+
+    counters_class = AtomicCounters
+
+    def setUp(self):
+        self.counters = self.counters_class(counter_names=["requests"])
+
+    def test_basic(self):
+        self.assertEqual("requests" in self.counters, True)
+        self.assertEqual("errors" in self.counters, False)
+        self.assertEqual(self.counters["requests"], 0)
+        with self.assertRaises(KeyError):
+            self.counters["errors"]
+
+        self.counters.increment("requests")
+        self.counters.increment("requests", 5)
+        self.counters.decrement("errors", 2)
+        self.assertEqual(self.counters.get("requests"), 6)
+        self.assertEqual(self.counters.get("errors"), -2)
+        self.assertEqual(self.counters.set("requests", 1), 6)
+        self.assertEqual(self.counters.as_dict(), {"requests": 1, "errors": -2})
+
+
+class TestBasicCounters(TestCounters):
+    counters_class = BasicCounters
+
+
+class TestStripedCounters(TestCounters):
+    counters_class = StripedCounters
+
+    def test_threads(self):
+        def run():
+            for i in range(1000):
+                self.counters.increment("requests")
+                self.counters.increment("errors", 2)
+
+        threads = [threading.Thread(target=run) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.counters.as_dict(), {"requests": 8000, "errors": 16000})
+
+    def test_fold(self):
+        counter = self.counters.get_counter("requests")
+        counter.increment(3)
+
+        def run():
+            counter.increment(10)
+
+        threads = [threading.Thread(target=run) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        del threads
+
+        #Exited threads cells should have been folded into base
+        self.assertEqual(len(counter.cells), 1)
+        self.assertEqual(counter.get(), 83)
+        self.assertEqual(counter.set(0), 83)
+        counter.increment()
+        self.assertEqual(counter.get(), 1)
+
+    def test_fold_holding_lock(self):
+        class Local(object):
+            pass
+
+        counter = StripedCounter("requests", local_class=Local)
+        counter.increment(5)
+
+        def run():
+            #Fold the cell while this thread holds the lock
+            with counter.lock:
+                del counter.local.owner
+
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+        thread.join(1)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(len(counter.cells), 0)
+        self.assertEqual(counter.get(), 5)
+
+
+class TestHierarchicalCounters(TestCounters):
+    counters_class = HierarchicalCounters
+
+    def test_counter_key(self):
+        self.assertEqual(counter_key("requests"), "requests")
+        self.assertEqual(counter_key("requests", {"method": "get", "host": "a"}), "requests;host=a;method=get")
+
+    def test_sum(self):
+        self.counters.increment("thrift.method.getUser.errors", 2)
+        self.counters.increment("thrift.method.getUser.requests", 10)
+        self.counters.increment("thrift.method.getChat.errors", 1)
+        self.counters.increment("thrift.methods.errors", 100)
+        self.counters.increment("thrift.method.getChat.errors", 3, tags={"host": "a"})
+        self.counters.increment("thrift.method.getChat.errors", 4, tags={"host": "b"})
+
+        self.assertEqual(self.counters.sum("thrift.method"), 20)
+        self.assertEqual(self.counters.sum("thrift.method.getChat"), 8)
+        self.assertEqual(self.counters.sum("thrift.method.getChat.errors"), 8)
+        self.assertEqual(self.counters.sum("thrift.method", tags={"host": "a"}), 3)
+        self.assertEqual(self.counters.sum("thrift"), 120)
+        self.assertEqual(self.counters.sum("unknown"), 0)
+        self.assertEqual(self.counters.get("thrift.method.getChat.errors", tags={"host": "b"}), 4)
+
+        self.assertEqual(self.counters.snapshot("thrift.method.getChat"), {
+            "thrift.method.getChat.errors": 1,
+            "thrift.method.getChat.errors;host=a": 3,
+            "thrift.method.getChat.errors;host=b": 4})
+
+
+class TestHistogram(unittest.TestCase):
+
+    def test_layout(self):
+        layout = HistogramLayout(1000000, 4)
+        previous = -1
+        for value in range(0, 100000, 7):
+            index = layout.index(value)
+            self.assertGreaterEqual(index, previous)
+            self.assertLessEqual(layout.lowest_value(index), value)
+            self.assertGreaterEqual(layout.highest_value(index), value)
+            #relative error bounded by 1/2**(precision_bits-1)
+            self.assertLessEqual(layout.highest_value(index) - layout.lowest_value(index), value / 8.0)
+            previous = index
+
+    def test_percentile(self):
+        histogram = BasicHistogram("latency")
+        snapshot = histogram.snapshot()
+        self.assertEqual(snapshot.count, 0)
+        self.assertEqual(snapshot.percentile(50), 0)
+
+        for value in range(1, 10001):
+            histogram.record(value)
+
+        snapshot = histogram.snapshot()
+        self.assertEqual(snapshot.count, 10000)
+        self.assertEqual(snapshot.min, 1)
+        self.assertEqual(snapshot.max, 10000)
+        self.assertAlmostEqual(snapshot.mean(), 5000.5)
+        for percentile in [1, 50, 90, 99, 99.9]:
+            expected = 10000 * percentile / 100.0
+            self.assertAlmostEqual(snapshot.percentile(percentile), expected, delta=expected / 64.0)
+        self.assertEqual(snapshot.percentile(100), 10000)
+
+        with self.assertRaises(ValueError):
+            histogram.record(-1)
+
+    def test_max_value(self):
+        histogram = BasicHistogram("latency", max_value=1000)
+        histogram.record(5000)
+        snapshot = histogram.snapshot()
+        self.assertEqual(snapshot.max, 5000)
+        self.assertEqual(snapshot.percentile(50), 5000)
+        self.assertEqual(len(snapshot.counts), histogram.layout.bucket_count)
+
+    def test_merge(self):
+        histogram1 = BasicHistogram("latency")
+        histogram2 = AtomicHistogram("latency")
+        histogram1.record(10, 3)
+        histogram2.record(1000, 1)
+
+        snapshot = histogram1.snapshot().merge(histogram2.snapshot())
+        self.assertEqual(snapshot.count, 4)
+        self.assertEqual(snapshot.total, 1030)
+        self.assertEqual(snapshot.min, 10)
+        self.assertEqual(snapshot.max, 1000)
+        self.assertEqual(snapshot.percentile(75), 10)
+        self.assertGreaterEqual(snapshot.percentile(100), 1000)
+
+        with self.assertRaises(ValueError):
+            snapshot.merge(BasicHistogram("other", max_value=10).snapshot())
+
+    def test_reset(self):
+        histogram = AtomicHistogram("latency")
+        histogram.record(10)
+        snapshot = histogram.reset()
+        self.assertEqual(snapshot.count, 1)
+        self.assertEqual(histogram.snapshot().count, 0)
+        self.assertEqual(histogram.snapshot().as_dict()["p99"], 0)
+
+
+class Clock(object):
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TestMeter(unittest.TestCase):
+
+    def test_rates(self):
+        clock = Clock()
+        meter = Meter("requests", clock=clock)
+        meter.mark(50)
+        self.assertEqual(meter.one_minute_rate(), 0.0)
+
+        clock.now += 5
+        self.assertEqual(meter.get_count(), 50)
+        self.assertAlmostEqual(meter.mean_rate(), 10.0)
+        self.assertAlmostEqual(meter.one_minute_rate(), 10.0)
+        self.assertAlmostEqual(meter.five_minute_rate(), 10.0)
+
+        #Idle for a minute, one minute rate should decay by ~1/e
+        clock.now += 60
+        self.assertAlmostEqual(meter.one_minute_rate(), 10.0 / math.e, places=3)
+        self.assertGreater(meter.fifteen_minute_rate(), meter.five_minute_rate())
+
+        values = meter.as_dict()
+        self.assertEqual(values["count"], 50)
+        self.assertEqual(sorted(values.keys()), ["count", "m15_rate", "m1_rate", "m5_rate", "mean_rate"])
+
+    def test_long_idle(self):
+        clock = Clock()
+        meter = Meter("requests", clock=clock)
+        meter.mark(10)
+        clock.now += 86400 * 365
+        self.assertAlmostEqual(meter.fifteen_minute_rate(), 0.0)
+
+
+class TestSlidingWindowCounter(unittest.TestCase):
+
+    def test_window(self):
+        clock = Clock()
+        counter = SlidingWindowCounter("errors", window=10, buckets=10, clock=clock)
+        self.assertEqual(counter.increment(5), 5)
+        clock.now += 5
+        counter.mark(3)
+        self.assertEqual(counter.get(), 8)
+        self.assertAlmostEqual(counter.rate(), 0.8)
+
+        clock.now += 5
+        self.assertEqual(counter.get(), 3)
+
+        clock.now += 5
+        self.assertEqual(counter.get(), 0)
+
+        counter.increment(1)
+        clock.now += 1000
+        self.assertEqual(counter.get(), 0)
+        self.assertEqual(counter.set(7), 0)
+        self.assertEqual(counter.get(), 7)
+        self.assertEqual(counter.decrement(2), 5)
+
+
+class TestSharedCounters(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.counters = SharedCounters("test", ["requests", "errors"], directory=self.directory)
+
+    def tearDown(self):
+        self.counters.close()
+        shutil.rmtree(self.directory)
+
+    def test_basic(self):
+        self.assertEqual("requests" in self.counters, True)
+        self.assertEqual(self.counters.increment("requests", 5), 5)
+        self.assertEqual(self.counters.decrement("requests"), 4)
+        self.assertEqual(self.counters.set("errors", 7), 0)
+        self.assertEqual(self.counters.as_dict(), {"requests": 4, "errors": 7})
+        with self.assertRaises(KeyError):
+            self.counters.increment("unknown")
+
+    def test_attach(self):
+        self.counters.increment("errors")
+        counters = SharedCounters("test", directory=self.directory)
+        counters.increment("errors")
+        self.assertEqual(self.counters.get("errors"), 2)
+        counters.close()
+
+        with self.assertRaises(ValueError):
+            SharedCounters("test", ["other"], directory=self.directory)
+
+    def test_processes(self):
+        pids = []
+        for i in range(4):
+            pid = os.fork()
+            if pid == 0:
+                try:
+                    counters = SharedCounters("test", directory=self.directory)
+                    for j in range(1000):
+                        counters.increment("requests")
+                finally:
+                    os._exit(0)
+            pids.append(pid)
+
+        for pid in pids:
+            os.waitpid(pid, 0)
+        self.assertEqual(self.counters.get("requests"), 4000)
+
+
+class TestCounterReporter(unittest.TestCase):
+
+    def setUp(self):
+        self.counters = AtomicCounters()
+
+    def test_deltas(self):
+        batches = []
+        reporter = CounterReporter(self.counters, CallbackSink(batches.append), prefix="svc")
+        self.counters.increment("requests", 5)
+        self.counters.increment("errors")
+        reporter.report()
+        self.counters.increment("requests", 2)
+        reporter.report()
+        reporter.report()
+
+        self.assertEqual(len(batches), 2)
+        self.assertEqual(sorted((n, v) for n, v, t in batches[0]), [("svc.errors", 1), ("svc.requests", 5)])
+        self.assertEqual([(n, v) for n, v, t in batches[1]], [("svc.requests", 2)])
+
+    def test_sink_failure(self):
+        batches = []
+        def write(batch):
+            if not batches:
+                batches.append(None)
+                raise IOError("sink unavailable")
+            batches.append(batch)
+
+        reporter = CounterReporter(self.counters, CallbackSink(write))
+        self.counters.increment("requests", 5)
+        with self.assertRaises(IOError):
+            reporter.report()
+        self.counters.increment("requests", 2)
+        reporter.report()
+        self.assertEqual([(n, v) for n, v, t in batches[1]], [("requests", 7)])
+
+    def test_thread(self):
+        batches = []
+        reporter = CounterReporter(self.counters, CallbackSink(batches.append), interval=0.01, deltas=False)
+        reporter.start()
+        self.counters.increment("requests")
+        reporter.stop()
+        reporter.join()
+        self.assertEqual(reporter.is_alive(), False)
+        self.assertEqual([(n, v) for n, v, t in batches[-1]], [("requests", 1)])
+
+    def test_file_sink(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "counters.txt")
+            reporter = CounterReporter(self.counters, FileSink(path))
+            self.counters.increment("requests", 3)
+            reporter.report()
+            reporter.sink.close()
+            with open(path) as f:
+                name, value, timestamp = f.read().split()
+            self.assertEqual((name, value), ("requests", "3"))
+        finally:
+            shutil.rmtree(directory)
+
+    def test_statsd_sink(self):
+        listener = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        listener.bind(("127.0.0.1", 0))
+        listener.settimeout(5)
+        try:
+            sink = StatsdSink("127.0.0.1", listener.getsockname()[1], max_packet_size=20)
+            reporter = CounterReporter(self.counters, sink)
+            self.counters.increment("requests", 3)
+            self.counters.increment("errors", 1)
+            reporter.report()
+            sink.close()
+
+            lines = []
+            while len(lines) < 2:
+                lines.extend(listener.recv(1024).split("\n"))
+            self.assertEqual(sorted(lines), ["errors:1|c", "requests:3|c"])
+        finally:
+            listener.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import unittest
+
+import gevent
+import gevent.queue
+
+import testbase
+from trpycore.greenlet.pool import GreenletPool
+from trpycore.thread.threadpool import ThreadPoolShutdownException
+
+class TestGreenletPool(unittest.TestCase):
+    def setUp(self):
+        self.counter = 0
+        self.sleep = 0
+
+        def processor(item):
+            gevent.sleep(self.sleep)
+            self.counter += item
+
+        self.pool = GreenletPool(5, processor, queue=gevent.queue.Queue(5))
+
+    def test_basic(self):
+        self.assertEqual(self.pool.is_alive(), False)
+        self.pool.put(1)
+        self.pool.put(2)
+        self.pool.put(1)
+        self.assertEqual(self.counter, 0)
+        self.pool.start()
+        self.assertEqual(self.pool.is_alive(), True)
+        self.pool.stop()
+        self.pool.join()
+        self.assertEqual(self.counter, 4)
+        self.assertEqual(self.pool.is_alive(), False)
+
+    def test_join_timeout(self):
+        self.sleep = 0.2
+        self.pool.start()
+        self.pool.put(1)
+        self.pool.stop()
+        self.pool.join(0.1)
+        self.assertEqual(self.pool.is_alive(), True)
+        self.pool.join(1)
+        self.assertEqual(self.pool.is_alive(), False)
+        self.assertEqual(self.counter, 1)
+
+    def test_queue_full(self):
+        for i in range(5):
+            self.pool.put(1)
+        with self.assertRaises(gevent.queue.Full):
+            self.pool.put(1, block=False)
+        self.pool.start()
+        self.pool.stop()
+        self.pool.join()
+        self.assertEqual(self.counter, 5)
+
+    def test_subclass(self):
+        class Pool(GreenletPool):
+            def __init__(self):
+                super(Pool, self).__init__(2)
+                self.items = []
+
+            def process(self, item):
+                self.items.append(item)
+
+        pool = Pool()
+        pool.start()
+        pool.put(1)
+        pool.stop()
+        pool.join()
+        self.assertEqual(pool.items, [1])
+
+    def test_submit(self):
+        self.pool.start()
+        self.assertEqual(self.pool.submit(lambda x: x * 2, 2).get(timeout=1), 4)
+        with self.assertRaises(ZeroDivisionError):
+            self.pool.submit(divmod, 1, 0).get(timeout=1)
+        self.assertEqual(list(self.pool.map(lambda x: x * 2, range(10), chunksize=3)),
+                [x * 2 for x in range(10)])
+        self.pool.stop()
+        self.pool.join()
+
+    def test_as_completed(self):
+        self.pool.start()
+        slow = self.pool.submit(gevent.sleep, 0.1)
+        fast = self.pool.submit(lambda: 1)
+        self.assertEqual(list(self.pool.as_completed([slow, fast])), [fast, slow])
+        blocked = self.pool.submit(gevent.sleep, 1)
+        with self.assertRaises(gevent.Timeout):
+            list(self.pool.as_completed([blocked], timeout=0.05))
+        self.pool.stop()
+        self.pool.join()
+
+    def test_shutdown(self):
+        self.sleep = 0.1
+        self.pool.start()
+        for i in range(5):
+            self.pool.put(1)
+        gevent.sleep(0)
+        result = self.pool.submit(lambda: 1)
+        unprocessed = self.pool.shutdown(drain=False, timeout=1)
+        self.assertEqual(len(unprocessed), 1)
+        with self.assertRaises(ThreadPoolShutdownException):
+            result.get(timeout=1)
+        self.assertEqual(self.counter, 5)
+        self.assertEqual(self.pool.is_alive(), False)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,522 @@
+import bisect
+import functools
+import hashlib
+import threading
+import time
+import unittest
+
+import testbase
+from trpycore.atomic.ringbuffer import RingBufferQueue
+from trpycore.factory.base import Factory
+from trpycore.pool.base import PoolEmptyException
+from trpycore.pool.elastic import ElasticPool
+from trpycore.pool.factory import FactoryPool
+from trpycore.pool.keyed import KeyedPool
+from trpycore.pool.queue import QueuePool
+from trpycore.pool.simple import SimplePool
+from trpycore.pool.threadlocal import ThreadLocalPool
+
+def wait_for(condition, timeout=5):
+    """Poll until condition() is true, or timeout expires.
+
+    Returns:
+        True if condition() became true, False otherwise.
+    """
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            return False
+        time.sleep(0.001)
+    return True
+
+
+class Connection(object):
+    def __init__(self, id):
+        self.id = id
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionFactory(Factory):
+    def __init__(self, delay=0):
+        super(ConnectionFactory, self).__init__()
+        self.lock = threading.Lock()
+        self.delay = delay
+        self.created = []
+
+    def create(self):
+        time.sleep(self.delay)
+        with self.lock:
+            connection = Connection(len(self.created))
+            self.created.append(connection)
+        return connection
+
+
+class TestQueuePool(unittest.TestCase):
+
+    def test_basic(self):
+        factory = ConnectionFactory()
+        pool = QueuePool(2, factory)
+        self.assertEqual(len(factory.created), 2)
+        with pool.get() as c1:
+            with pool.get() as c2:
+                self.assertNotEqual(c1, c2)
+                with self.assertRaises(PoolEmptyException):
+                    pool.get(block=False)
+        with pool.get(timeout=1) as c3:
+            self.assertIn(c3, factory.created)
+
+    def test_discard_on_exception(self):
+        factory = ConnectionFactory()
+        pool = QueuePool(1, factory, instrumented=True)
+        with self.assertRaises(IOError):
+            with pool.get() as c1:
+                raise IOError("broken connection")
+        self.assertTrue(c1.closed)
+        with pool.get(block=False) as c2:
+            self.assertIsNot(c1, c2)
+        with self.assertRaises(ValueError):
+            with pool.get() as c3:
+                raise ValueError()
+        self.assertIs(c2, c3)
+        self.assertFalse(c3.closed)
+        self.assertEqual(pool.stats()["discards"], 1)
+
+    def test_discard_create_failure(self):
+        factory = ConnectionFactory()
+        pool = QueuePool(1, factory)
+        pool.factory = Factory()
+        with self.assertRaises(IOError):
+            with pool.get():
+                raise IOError()
+        self.assertEqual(pool.missing, 1)
+        with self.assertRaises(PoolEmptyException):
+            pool.get(block=False)
+
+        #Next borrower retries the replacement
+        pool.factory = factory
+        with pool.get(block=False) as c1:
+            self.assertEqual(c1.id, 1)
+        self.assertEqual(pool.missing, 0)
+
+    def test_ring_buffer_capacity(self):
+        #RingBufferQueue's default capacity is 1024
+        with self.assertRaises(ValueError):
+            QueuePool(1025, ConnectionFactory(), queue_class=RingBufferQueue)
+
+        pool = QueuePool(2000, ConnectionFactory(),
+                queue_class=functools.partial(RingBufferQueue, 2048))
+        with pool.get(block=False) as c1:
+            self.assertEqual(c1.id, 0)
+        self.assertEqual(pool.queue.qsize(), 2000)
+
+
+class TestElasticPool(unittest.TestCase):
+
+    def setUp(self):
+        self.factory = ConnectionFactory()
+
+    def test_lazy(self):
+        pool = ElasticPool(self.factory, min_size=1, max_size=2)
+        self.assertEqual(len(self.factory.created), 0)
+
+        with pool.get() as c1:
+            self.assertEqual(len(self.factory.created), 1)
+        with pool.get() as c2:
+            self.assertIs(c1, c2)
+            with pool.get() as c3:
+                self.assertIsNot(c2, c3)
+                self.assertEqual(pool.size, 2)
+                with self.assertRaises(PoolEmptyException):
+                    pool.get(block=False)
+                with self.assertRaises(PoolEmptyException):
+                    pool.get(timeout=0.1)
+        self.assertEqual(len(self.factory.created), 2)
+
+    def test_blocking(self):
+        pool = ElasticPool(self.factory, max_size=1)
+        results = []
+
+        def borrow():
+            with pool.get(timeout=5) as connection:
+                results.append(connection)
+
+        with pool.get() as connection:
+            thread = threading.Thread(target=borrow)
+            thread.start()
+            time.sleep(0.1)
+            self.assertEqual(results, [])
+        thread.join()
+        self.assertEqual(results, [connection])
+
+    def test_idle_eviction(self):
+        pool = ElasticPool(self.factory, min_size=1, max_size=3, idle_timeout=0.1)
+        with pool.get():
+            with pool.get():
+                with pool.get():
+                    pass
+        self.assertEqual(pool.size, 3)
+        time.sleep(0.2)
+        self.assertEqual(pool.evict(), 2)
+        self.assertEqual(pool.size, 1)
+        self.assertEqual(len([c for c in self.factory.created if c.closed]), 2)
+
+    def test_prewarm(self):
+        factory = ConnectionFactory(delay=0.2)
+        start = time.time()
+        pool = ElasticPool(factory, min_size=5, max_size=10, prewarm=True)
+        self.assertLess(time.time() - start, 0.9)
+        self.assertEqual(len(factory.created), 5)
+        self.assertEqual(len(pool.idle), 5)
+
+    def test_create_failure(self):
+        pool = ElasticPool(Factory(), max_size=1)
+        with self.assertRaises(PoolEmptyException):
+            pool.get()
+        self.assertEqual(pool.size, 0)
+
+    def test_discard_on_exception(self):
+        pool = ElasticPool(self.factory, max_size=1)
+        with self.assertRaises(IOError):
+            with pool.get() as c1:
+                raise IOError("broken connection")
+        self.assertTrue(c1.closed)
+        #Replaced asynchronously, although min_size is 0
+        self.assertTrue(wait_for(lambda: len(pool.idle) == 1))
+        self.assertEqual(pool.size, 1)
+        self.assertEqual(len(self.factory.created), 2)
+        with pool.get() as c2:
+            self.assertIsNot(c1, c2)
+
+    def test_discard_untracked(self):
+        pool = ElasticPool(self.factory, max_size=2)
+        with pool.get() as c1:
+            c2 = pool.get().instance
+        pool.discard(c2)
+        self.assertTrue(wait_for(lambda: len(pool.idle) == 2))
+        pool.discard(c2)
+        pool.discard(Connection(100))
+        self.assertEqual(pool.size, 2)
+        self.assertEqual(len(self.factory.created), 3)
+
+    def test_discard_exceptions(self):
+        pool = ElasticPool(self.factory, max_size=1, discard_exceptions=(IOError,))
+        with self.assertRaises(ValueError):
+            with pool.get() as c1:
+                raise ValueError()
+        self.assertFalse(c1.closed)
+        with pool.get() as c2:
+            self.assertIs(c1, c2)
+
+    def test_validate(self):
+        pool = ElasticPool(self.factory, max_size=2, validate=lambda c: c.id != 0)
+        with pool.get() as c1:
+            self.assertEqual(c1.id, 0)
+        with pool.get() as c2:
+            self.assertEqual(c2.id, 1)
+        self.assertTrue(c1.closed)
+        self.assertEqual(pool.size, 1)
+
+    def test_reset(self):
+        def reset(connection):
+            if connection.id == 0:
+                raise RuntimeError("unable to rollback")
+        pool = ElasticPool(self.factory, max_size=2, reset=reset)
+        with pool.get() as c1:
+            pass
+        self.assertTrue(c1.closed)
+        self.assertTrue(wait_for(lambda: len(pool.idle) == 1))
+        self.assertEqual(pool.size, 1)
+
+    def test_max_uses(self):
+        pool = ElasticPool(self.factory, max_size=1, max_uses=2)
+        with pool.get() as c1:
+            pass
+        with pool.get() as c2:
+            self.assertIs(c1, c2)
+        self.assertTrue(c1.closed)
+        with pool.get() as c3:
+            self.assertIsNot(c1, c3)
+
+    def test_max_lifetime(self):
+        pool = ElasticPool(self.factory, max_size=1, max_lifetime=0.1)
+        with pool.get() as c1:
+            pass
+        time.sleep(0.2)
+        with pool.get() as c2:
+            self.assertIsNot(c1, c2)
+        self.assertTrue(c1.closed)
+
+    def test_max_lifetime_idle(self):
+        pool = ElasticPool(self.factory, max_size=3, max_lifetime=0.1)
+        with pool.get():
+            with pool.get():
+                with pool.get():
+                    pass
+        time.sleep(0.2)
+        #Borrowing only expires the idle objects it encounters
+        with pool.get() as c1:
+            self.assertEqual(c1.id, 3)
+            self.assertEqual(len(pool.idle), 0)
+        self.assertEqual(pool.size, 1)
+
+        with pool.get():
+            with pool.get():
+                pass
+        time.sleep(0.2)
+        self.assertEqual(pool.evict(), 2)
+        self.assertEqual(pool.size, 0)
+
+    def test_replenish(self):
+        pool = ElasticPool(self.factory, min_size=2, max_size=2, prewarm=True)
+        c1 = pool.get().instance
+        pool.discard(c1)
+        self.assertTrue(wait_for(lambda: len(pool.idle) == 2))
+        self.assertEqual(pool.size, 2)
+        self.assertEqual(len(pool.idle), 2)
+        self.assertEqual(len(self.factory.created), 3)
+
+    def test_health_check(self):
+        broken = set()
+        pool = ElasticPool(self.factory, min_size=2, max_size=2, prewarm=True,
+                validate=lambda c: c.id not in broken, health_check_interval=0.05)
+        broken.add(0)
+        self.assertTrue(wait_for(lambda: len(self.factory.created) == 3))
+        pool.close()
+        self.assertTrue(self.factory.created[0].closed)
+        self.assertEqual(len(self.factory.created), 3)
+        self.assertEqual(pool.size, 0)
+
+    def test_health_check_order(self):
+        pool = ElasticPool(self.factory, max_size=3, validate=lambda c: True)
+        with pool.get():
+            with pool.get():
+                with pool.get():
+                    pass
+        idle = list(pool.idle)
+        self.assertEqual(pool.health_check(), 0)
+        #Idle objects remain ordered least recently used first
+        self.assertEqual(list(pool.idle), idle)
+
+
+class TestThreadLocalPool(unittest.TestCase):
+
+    def setUp(self):
+        self.factory = ConnectionFactory()
+
+    def run_thread(self, target):
+        thread = threading.Thread(target=target)
+        thread.start()
+        thread.join()
+
+    def test_per_instance(self):
+        pool1 = ThreadLocalPool(self.factory)
+        pool2 = ThreadLocalPool(self.factory)
+        with pool1.get() as c1:
+            with pool2.get() as c2:
+                self.assertIsNot(c1, c2)
+        with pool1.get() as c3:
+            self.assertIs(c1, c3)
+
+    def test_reclaim(self):
+        pool = ThreadLocalPool(self.factory)
+
+        def borrow():
+            with pool.get():
+                pass
+
+        for i in range(5):
+            self.run_thread(borrow)
+        #join() returns before the exiting thread's locals are
+        #released, which is what triggers reclaiming.
+        self.assertTrue(wait_for(lambda: pool.size == 0))
+        self.assertEqual(len(self.factory.created), 5)
+        self.assertTrue(all(c.closed for c in self.factory.created))
+        self.assertEqual(pool.size, 0)
+        self.assertEqual(pool.owners, {})
+
+    def test_max_size(self):
+        pool = ThreadLocalPool(self.factory, max_size=1, instrumented=True)
+        results = []
+
+        def borrow():
+            with pool.get(timeout=5) as connection:
+                results.append(connection)
+
+        def borrow_nowait():
+            try:
+                pool.get(block=False)
+            except PoolEmptyException as error:
+                results.append(error)
+
+        with pool.get() as c1:
+            self.run_thread(borrow_nowait)
+        self.assertIsInstance(results.pop(), PoolEmptyException)
+        self.assertEqual(pool.stats()["timeouts"], 1)
+
+        owner = threading.Thread(target=borrow)
+        owner.start()
+        owner.join(0.1)
+        self.assertTrue(owner.is_alive())
+
+        #Release this thread's object to unblock the owner thread
+        del pool.local.owner
+        owner.join()
+        self.assertTrue(c1.closed)
+        self.assertEqual(len(results), 1)
+        self.assertTrue(wait_for(lambda: pool.size == 0))
+
+
+class Node(object):
+    def __init__(self, token, data=None):
+        self.token = token
+        self.data = data
+
+    def __cmp__(self, other):
+        return cmp(self.token, other.token)
+
+
+class Hashring(object):
+    """In-memory hashring providing the HashringWatch interface."""
+
+    def __init__(self, nodes=None):
+        self.nodes = sorted(nodes or [])
+
+    def hashring(self):
+        return list(self.nodes)
+
+    def preference_list(self, data):
+        token = long(hashlib.md5(data).hexdigest(), 16)
+        index = bisect.bisect(self.nodes, Node(token)) % max(len(self.nodes), 1)
+        return self.nodes[index:] + self.nodes[:index]
+
+    def change(self, observer, nodes):
+        previous = self.hashring()
+        self.nodes = sorted(nodes)
+        observer(self, previous, self.hashring(), [], [])
+
+
+class TestKeyedPool(unittest.TestCase):
+
+    def setUp(self):
+        self.factories = {}
+        self.hashring = Hashring([
+            Node(0x0, "a"),
+            Node(0x5 << 124, "b"),
+            Node(0xa << 124, "c"),
+            Node(0xf << 124, "a")])
+        self.pool = KeyedPool(self.create_pool, self.hashring)
+
+    def create_pool(self, endpoint):
+        factory = self.factories[endpoint] = ConnectionFactory()
+        factory.endpoint = endpoint
+        return ElasticPool(factory, max_size=1, instrumented=True)
+
+    def test_get(self):
+        self.assertEqual(sorted(self.pool.pools.keys()), ["a", "b", "c"])
+        for key in ["0", "1", "2", "3"]:
+            endpoints = self.pool.endpoints(key)
+            self.assertEqual(sorted(endpoints), ["a", "b", "c"])
+            with self.pool.get(key) as connection:
+                self.assertIn(connection, self.factories[endpoints[0]].created)
+
+    def test_failover(self):
+        endpoints = self.pool.endpoints("0")
+        with self.pool.get("0") as c1:
+            with self.pool.get("0") as c2:
+                self.assertIn(c2, self.factories[endpoints[1]].created)
+                self.factories[endpoints[2]].create = lambda: None
+                with self.assertRaises(PoolEmptyException):
+                    self.pool.get("0", timeout=0.01)
+        self.assertEqual(self.pool.stats()[endpoints[0]]["borrows"], 1)
+
+    def test_max_endpoints(self):
+        self.pool.max_endpoints = 1
+        with self.pool.get("0"):
+            with self.assertRaises(PoolEmptyException):
+                self.pool.get("0", block=False)
+
+    def test_watch_observer(self):
+        self.hashring.change(self.pool.watch_observer, [Node(0x0, "a"), Node(0x1, "d")])
+        self.assertEqual(sorted(self.pool.pools.keys()), ["a", "d"])
+        for endpoint in ["b", "c"]:
+            self.assertTrue(all(c.closed for c in self.factories[endpoint].created))
+
+        self.hashring.change(self.pool.watch_observer, [])
+        self.assertEqual(self.pool.pools, {})
+        with self.assertRaises(PoolEmptyException):
+            self.pool.get("0")
+
+
+class TestPoolMetrics(unittest.TestCase):
+
+    def test_queue_pool(self):
+        pool = QueuePool(2, ConnectionFactory(), instrumented=True)
+        with pool.get():
+            stats = pool.stats()
+            self.assertEqual(stats["in_use"], 1)
+            self.assertEqual(stats["utilization"], 0.5)
+            time.sleep(0.01)
+        with self.assertRaises(PoolEmptyException):
+            with pool.get():
+                with pool.get():
+                    pool.get(timeout=0.01)
+
+        stats = pool.stats()
+        self.assertEqual(stats["borrows"], 3)
+        self.assertEqual(stats["timeouts"], 1)
+        self.assertEqual(stats["creates"], 2)
+        self.assertEqual(stats["in_use"], 0)
+        self.assertEqual(stats["hold"]["count"], 3)
+        self.assertGreaterEqual(stats["hold"]["max"], 10000)
+        self.assertGreaterEqual(stats["wait"]["max"], 10000)
+        self.assertEqual(stats["create"]["count"], 2)
+
+    def test_pools(self):
+        pools = [
+            SimplePool(Connection(0), instrumented=True),
+            FactoryPool(ConnectionFactory(), instrumented=True),
+            ThreadLocalPool(ConnectionFactory(), instrumented=True),
+            ElasticPool(ConnectionFactory(), instrumented=True)
+        ]
+        for pool in pools:
+            with pool.get():
+                self.assertEqual(pool.stats()["in_use"], 1)
+            stats = pool.stats()
+            self.assertEqual(stats["borrows"], 1)
+            self.assertEqual(stats["in_use"], 0)
+            self.assertEqual(stats["hold"]["count"], 1)
+
+    def test_elastic_pool(self):
+        pool = ElasticPool(Factory(), max_size=1, instrumented=True)
+        with self.assertRaises(PoolEmptyException):
+            pool.get()
+        pool.factory = ConnectionFactory()
+        with self.assertRaises(IOError):
+            with pool.get():
+                raise IOError()
+        self.assertTrue(wait_for(lambda: len(pool.idle) == 1))
+        stats = pool.stats()
+        self.assertEqual(stats["create_failures"], 1)
+        self.assertEqual(stats["timeouts"], 0)
+        self.assertEqual(stats["creates"], 2)
+        self.assertEqual(stats["discards"], 1)
+        self.assertEqual(stats["size"], 1)
+
+    def test_simple_pool_empty(self):
+        pool = SimplePool(None, instrumented=True)
+        with self.assertRaises(PoolEmptyException):
+            pool.get()
+        self.assertEqual(pool.stats()["timeouts"], 0)
+
+    def test_uninstrumented(self):
+        pool = QueuePool(1, ConnectionFactory())
+        with pool.get():
+            pass
+        self.assertEqual(pool.stats(), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,218 @@
+import gc
+import unittest
+
+import gevent
+import gevent.event
+
+import testbase
+from trpycore.factory.base import Factory
+from trpycore.pool.base import PoolEmptyException
+from trpycore.pool_gevent.fair import GFairPool
+from trpycore.pool_gevent.threadlocal import GThreadLocalPool
+
+class Connection(object):
+    def __init__(self, id):
+        self.id = id
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionFactory(Factory):
+    def __init__(self, delay=0):
+        super(ConnectionFactory, self).__init__()
+        self.delay = delay
+        self.created = []
+        self.creating = 0
+        self.max_creating = 0
+
+    def create(self):
+        self.creating += 1
+        self.max_creating = max(self.creating, self.max_creating)
+        gevent.sleep(self.delay)
+        self.creating -= 1
+        connection = Connection(len(self.created))
+        self.created.append(connection)
+        return connection
+
+
+class TestFairPool(unittest.TestCase):
+
+    def setUp(self):
+        self.factory = ConnectionFactory()
+
+    def test_fifo(self):
+        pool = GFairPool(self.factory, max_size=1)
+        order = []
+
+        def borrow(i):
+            with pool.get():
+                order.append(i)
+                gevent.sleep(0.01)
+
+        greenlets = [gevent.spawn(borrow, i) for i in range(10)]
+        gevent.joinall(greenlets)
+        self.assertEqual(order, range(10))
+        self.assertEqual(len(self.factory.created), 1)
+
+    def test_timeout(self):
+        pool = GFairPool(self.factory, max_size=1, instrumented=True)
+        with pool.get():
+            with self.assertRaises(PoolEmptyException):
+                pool.get(block=False)
+            with self.assertRaises(PoolEmptyException):
+                pool.get(timeout=0.01)
+        self.assertEqual(len(pool.waiters), 0)
+        self.assertEqual(pool.stats()["timeouts"], 2)
+
+    def test_kill(self):
+        pool = GFairPool(self.factory, max_size=1)
+        context = pool.get()
+        waiter = gevent.spawn(pool.get)
+        gevent.sleep(0)
+        self.assertEqual(len(pool.waiters), 1)
+
+        waiter.kill()
+        self.assertEqual(len(pool.waiters), 0)
+        pool.put(context.instance)
+        self.assertEqual(list(pool.idle), [context.instance])
+
+    def test_kill_after_handoff(self):
+        pool = GFairPool(self.factory, max_size=1)
+        context = pool.get()
+        waiter = gevent.event.AsyncResult()
+        pool.waiters.append(waiter)
+
+        #Object handed to a waiter which is killed before it runs
+        pool.put(context.instance)
+        pool._cancel(waiter)
+        self.assertEqual(list(pool.idle), [context.instance])
+
+    def test_concurrent_create(self):
+        self.factory.delay = 0.05
+        pool = GFairPool(self.factory, max_size=10, max_creating=3)
+
+        def borrow():
+            with pool.get():
+                gevent.sleep(0.01)
+
+        greenlets = [gevent.spawn(borrow) for i in range(10)]
+        gevent.joinall(greenlets)
+        self.assertEqual(self.factory.max_creating, 3)
+        self.assertLessEqual(pool.size, 10)
+        #Let creations spawned for the last waiters complete
+        gevent.sleep(0.01)
+        self.assertEqual(pool.creating, 0)
+        self.assertEqual(pool.size, len(pool.idle))
+
+    def test_create_failure(self):
+        pool = GFairPool(Factory(), max_size=1, instrumented=True)
+        with self.assertRaises(PoolEmptyException):
+            pool.get(timeout=1)
+        self.assertEqual(pool.size, 0)
+        self.assertEqual(pool.stats()["create_failures"], 1)
+        self.assertEqual(pool.stats()["timeouts"], 0)
+
+    def test_max_creating_waiters(self):
+        self.factory.delay = 0.01
+        pool = GFairPool(self.factory, max_size=3, max_creating=1)
+        borrowed = []
+
+        def borrow():
+            with pool.get(timeout=1) as connection:
+                borrowed.append(connection)
+                gevent.sleep(0.1)
+
+        greenlets = [gevent.spawn(borrow) for i in range(3)]
+        gevent.joinall(greenlets)
+        self.assertTrue(all(greenlet.successful() for greenlet in greenlets))
+        self.assertEqual(len(set(borrowed)), 3)
+        self.assertEqual(self.factory.max_creating, 1)
+
+    def test_create_failure_waiters(self):
+        pool = GFairPool(Factory(), max_size=3, max_creating=1)
+        greenlets = [gevent.spawn(pool.get) for i in range(3)]
+        #Every waiter fails, rather than waiting forever
+        gevent.joinall(greenlets, timeout=1)
+        for greenlet in greenlets:
+            self.assertTrue(greenlet.ready())
+            self.assertIsInstance(greenlet.exception, PoolEmptyException)
+        self.assertEqual(pool.size, 0)
+
+    def test_nonblocking(self):
+        pool = GFairPool(self.factory, max_size=2)
+        with pool.get(block=False) as c1:
+            with pool.get(block=False) as c2:
+                self.assertIsNot(c1, c2)
+                with self.assertRaises(PoolEmptyException):
+                    pool.get(block=False)
+        self.assertEqual(len(self.factory.created), 2)
+        with pool.get(block=False) as c3:
+            self.assertIn(c3, [c1, c2])
+
+        pool = GFairPool(Factory(), max_size=1)
+        with self.assertRaises(PoolEmptyException):
+            pool.get(block=False)
+        self.assertEqual(pool.size, 0)
+
+    def test_discard(self):
+        pool = GFairPool(self.factory, max_size=1)
+        with self.assertRaises(IOError):
+            with pool.get() as c1:
+                raise IOError()
+        self.assertTrue(c1.closed)
+        with pool.get() as c2:
+            self.assertIsNot(c1, c2)
+
+
+class TestThreadLocalPool(unittest.TestCase):
+
+    def setUp(self):
+        self.factory = ConnectionFactory()
+
+    def test_per_greenlet(self):
+        pool = GThreadLocalPool(self.factory)
+        results = []
+
+        def borrow():
+            with pool.get() as c1:
+                with pool.get() as c2:
+                    self.assertIs(c1, c2)
+                    results.append(c1)
+
+        gevent.joinall([gevent.spawn(borrow) for i in range(3)])
+        self.assertEqual(len(set(results)), 3)
+
+    def test_reclaim(self):
+        pool = GThreadLocalPool(self.factory, max_size=2)
+        results = []
+
+        def borrow():
+            with pool.get(timeout=1) as connection:
+                results.append(connection)
+                gevent.sleep(0.01)
+
+        #Greenlets are not retained, so their objects are
+        #reclaimed as soon as they exit.
+        for i in range(4):
+            gevent.spawn(borrow)
+        gevent.sleep(0.1)
+        gc.collect()
+        self.assertEqual(len(results), 4)
+        self.assertTrue(all(c.closed for c in results))
+        self.assertEqual(pool.size, 0)
+
+    def test_max_size(self):
+        pool = GThreadLocalPool(self.factory, max_size=1)
+        with pool.get():
+            greenlet = gevent.spawn(pool.get, block=False)
+            greenlet.join()
+            self.assertIsInstance(greenlet.exception, PoolEmptyException)
+            greenlet = gevent.spawn(pool.get, timeout=0.01)
+            greenlet.join()
+            self.assertIsInstance(greenlet.exception, PoolEmptyException)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import multiprocessing
+import os
+import unittest
+
+import testbase
+from trpycore.process.pool import ProcessCrashedException, ProcessPool, SharedItem
+
+def square(value):
+    return value * value
+
+def pid():
+    return os.getpid()
+
+def crash():
+    os._exit(1)
+
+class TestProcessPool(unittest.TestCase):
+    def setUp(self):
+        self.counter = multiprocessing.Value("i", 0)
+
+        def processor(item):
+            with self.counter.get_lock():
+                self.counter.value += len(item) if isinstance(item, (str, buffer)) else item
+
+        self.pool = ProcessPool(2, processor)
+
+    def tearDown(self):
+        self.pool.stop()
+        self.pool.join()
+
+    def test_basic(self):
+        self.assertEqual(self.pool.is_alive(), False)
+        self.pool.put(1)
+        self.pool.put(2)
+        self.pool.put(1)
+        self.pool.start()
+        self.assertEqual(self.pool.is_alive(), True)
+        self.pool.stop()
+        self.pool.join()
+        self.assertEqual(self.counter.value, 4)
+        self.assertEqual(self.pool.is_alive(), False)
+
+    def test_restart(self):
+        self.pool.start()
+        self.assertEqual(self.pool.shutdown(), [])
+        self.pool.start()
+        self.assertEqual(self.pool.submit(square, 3).get(timeout=5), 9)
+
+    def test_submit(self):
+        self.pool.start()
+        self.assertEqual(self.pool.submit(square, 3).get(timeout=5), 9)
+        self.assertNotEqual(self.pool.submit(pid).get(timeout=5), os.getpid())
+        with self.assertRaises(ZeroDivisionError):
+            self.pool.submit(divmod, 1, 0).get(timeout=5)
+        self.assertEqual(list(self.pool.map(square, range(10), chunksize=3)),
+                [square(i) for i in range(10)])
+
+    def test_batch(self):
+        self.pool = ProcessPool(1, batch_size=10, batch_timeout=0.1)
+        results = [self.pool.submit(pid) for i in range(10)]
+        self.pool.start()
+        self.assertEqual(len(set(r.get(timeout=5) for r in results)), 1)
+
+    def test_max_tasks(self):
+        self.pool = ProcessPool(1, max_tasks=2)
+        self.pool.start()
+        pids = [self.pool.submit(pid).get(timeout=5) for i in range(4)]
+        self.assertEqual(pids[0], pids[1])
+        self.assertNotEqual(pids[1], pids[2])
+        self.assertEqual(pids[2], pids[3])
+
+    def test_crash(self):
+        self.pool = ProcessPool(1, batch_size=3, batch_timeout=0.1)
+        results = [self.pool.submit(square, 2), self.pool.submit(crash), self.pool.submit(square, 3)]
+        self.pool.start()
+        with self.assertRaises(ProcessCrashedException):
+            results[1].get(timeout=5)
+        self.assertEqual(results[0].get(timeout=5), 4)
+        self.assertEqual(results[2].get(timeout=5), 9)
+        self.assertEqual(self.pool.submit(square, 4).get(timeout=5), 16)
+        self.assertEqual(self.pool.threads[0].restarts, 2)
+
+    def test_unpicklable(self):
+        self.pool.start()
+        with self.assertRaises(Exception):
+            self.pool.submit(lambda: 1).get(timeout=5)
+
+    def test_shared(self):
+        self.pool = ProcessPool(1, self.pool.processor, shared_size=16)
+        self.pool.put(SharedItem("x" * 10))
+        self.pool.put(SharedItem("x" * 100))
+        self.pool.start()
+        self.pool.stop()
+        self.pool.join()
+        self.assertEqual(self.counter.value, 110)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,7 +4,12 @@ import unittest
 import Queue
 
 import testbase
-from trpycore.thread.threadpool import ThreadPool
+from trpycore.thread.autoscaling import AutoscalingThreadPool
+from trpycore.thread.result import AsyncResult, wait_all, wait_any
+from trpycore.thread.scheduling import DeadlineExpiredException, SchedulingQueue
+from trpycore.thread.threadpool import BatchProcessingException, Task, ThreadPool, \
+        ThreadPoolShutdownException
+from trpycore.thread.workstealing import WorkStealingThreadPool
 
 class TestThreadPool(unittest.TestCase):
     def setUp(self):
@@ -82,6 +87,649 @@ class TestThreadPool(unittest.TestCase):
         self.assertEqual(pool.is_alive(), False)
 
 
+class TestThreadPoolMetrics(unittest.TestCase):
+    def setUp(self):
+        def processor(item):
+            if item is None:
+                raise ValueError()
+            time.sleep(item)
+
+        self.processor = processor
+
+    def test_disabled(self):
+        pool = ThreadPool(1, self.processor)
+        pool.put(0)
+        self.assertEqual(pool.stats(), {})
+        self.assertEqual(pool.queue.get(), 0)
+
+    def test_stats(self):
+        pool = ThreadPool(2, self.processor, instrumented=True)
+        pool.put(0.05)
+        pool.put(None)
+        self.assertEqual(pool.stats()["depth"], 2)
+        time.sleep(0.05)
+        pool.start()
+        with self.assertRaises(ZeroDivisionError):
+            pool.submit(divmod, 1, 0).get(timeout=1)
+        time.sleep(0.1)
+        stats = pool.stats()
+        self.assertEqual(len(stats["workers"]), 2)
+        self.assertGreater(max(stats["workers"].values()), 0)
+        self.assertGreater(stats["utilization"], 0)
+        pool.stop()
+        pool.join()
+
+        stats = pool.stats()
+        self.assertEqual(stats["workers"], {})
+        self.assertEqual(stats["processed"], 3)
+        self.assertEqual(stats["errors"], 2)
+        self.assertEqual(stats["exceptions"], {"ValueError": 1, "ZeroDivisionError": 1})
+        self.assertEqual(stats["depth"], 0)
+        self.assertEqual(stats["wait"]["count"], 3)
+        self.assertGreaterEqual(stats["wait"]["max"], 50000)
+        self.assertGreaterEqual(stats["process"]["max"], 50000)
+
+    def test_batch(self):
+        items = []
+        pool = ThreadPool(1, items.extend, batch_size=3, instrumented=True)
+        for i in range(6):
+            pool.put(i)
+        pool.start()
+        pool.stop()
+        pool.join()
+        self.assertEqual(items, range(6))
+
+        stats = pool.stats()
+        self.assertEqual(stats["processed"], 6)
+        self.assertEqual(stats["wait"]["count"], 6)
+        self.assertEqual(stats["process"]["count"], 2)
+
+
+class TestShutdown(unittest.TestCase):
+    def setUp(self):
+        self.processed = []
+        self.sleep = 0
+
+        def processor(item):
+            time.sleep(self.sleep)
+            self.processed.append(item)
+
+        self.processor = processor
+
+    def test_drain(self):
+        pool = ThreadPool(2, self.processor)
+        for i in range(10):
+            pool.put(i)
+        pool.start()
+        self.assertEqual(pool.shutdown(), [])
+        self.assertEqual(sorted(self.processed), range(10))
+        self.assertEqual(pool.is_alive(), False)
+        with self.assertRaises(ThreadPoolShutdownException):
+            pool.put(1)
+
+    def test_drain_timeout(self):
+        self.sleep = 0.1
+        pool = ThreadPool(1, self.processor, instrumented=True)
+        pool.start()
+        for i in range(10):
+            pool.put(i)
+        result = pool.submit(lambda: 1)
+        unprocessed = pool.shutdown(timeout=0.25)
+        self.assertEqual(pool.is_alive(), True)
+        self.assertEqual(unprocessed[-1].result, result)
+        with self.assertRaises(ThreadPoolShutdownException):
+            result.get(timeout=1)
+        pool.join()
+        self.assertEqual(pool.is_alive(), False)
+        self.assertEqual(len(self.processed) + len(unprocessed), 11)
+
+    def test_no_drain(self):
+        self.sleep = 0.1
+        pool = ThreadPool(1, self.processor)
+        pool.start()
+        for i in range(10):
+            pool.put(i)
+        time.sleep(0.05)
+        unprocessed = pool.shutdown(drain=False, timeout=1)
+        self.assertEqual(self.processed, [0])
+        self.assertEqual(unprocessed, range(1, 10))
+        self.assertEqual(pool.is_alive(), False)
+
+    def test_concurrent_put(self):
+        for pool in [ThreadPool(2, self.processor), WorkStealingThreadPool(2, self.processor)]:
+            del self.processed[:]
+            accepted = []
+
+            def produce():
+                try:
+                    for i in xrange(1000000):
+                        pool.put(i)
+                        accepted.append(i)
+                except ThreadPoolShutdownException:
+                    pass
+
+            pool.start()
+            producer = threading.Thread(target=produce)
+            producer.start()
+            time.sleep(0.05)
+            unprocessed = pool.shutdown(drain=False, timeout=1)
+            producer.join()
+            #Every accepted work item is either processed or returned
+            self.assertEqual(sorted(self.processed + unprocessed), accepted)
+
+    def test_blocked_put(self):
+        self.sleep = 1
+        pool = ThreadPool(1, self.processor, queue=Queue.Queue(1))
+        pool.start()
+        pool.put(0)
+        time.sleep(0.05)
+        pool.put(1)
+        producer = threading.Thread(target=pool.put, args=(2,))
+        producer.start()
+        time.sleep(0.05)
+
+        #Puts do not wait for another producer blocked on a full queue
+        start = time.time()
+        with self.assertRaises(Queue.Full):
+            pool.put(3, block=False)
+        self.assertLess(time.time() - start, 0.1)
+
+        start = time.time()
+        unprocessed = pool.shutdown(drain=False, timeout=0.2)
+        self.assertLess(time.time() - start, 0.5)
+        producer.join()
+        self.assertEqual(unprocessed, [1, 2])
+        pool.join()
+        self.assertEqual(self.processed, [0])
+
+    def test_autoscaling(self):
+        self.sleep = 0.1
+        pool = AutoscalingThreadPool(1, 2, self.processor)
+        pool.start()
+        for i in range(10):
+            pool.put(i)
+        time.sleep(0.05)
+        self.assertEqual(pool.shutdown(drain=False, timeout=1), range(1, 10))
+        self.assertEqual(pool.is_alive(), False)
+
+    def test_work_stealing(self):
+        self.sleep = 0.1
+        pool = WorkStealingThreadPool(1, self.processor)
+        pool.start()
+        for i in range(10):
+            pool.put(i)
+        time.sleep(0.05)
+        self.assertEqual(len(pool.shutdown(drain=False, timeout=1)), 9)
+        self.assertEqual(pool.is_alive(), False)
+
+
+class TestSubmit(unittest.TestCase):
+    def setUp(self):
+        self.pool = ThreadPool(4, lambda item: None)
+        self.pool.start()
+
+    def tearDown(self):
+        self.pool.stop()
+        self.pool.join()
+
+    def test_submit(self):
+        result = self.pool.submit(lambda x, y=0: x + y, 1, y=2)
+        self.assertEqual(result.get(timeout=1), 3)
+
+        result = self.pool.submit(lambda: 1 / 0)
+        with self.assertRaises(ZeroDivisionError):
+            result.get(timeout=1)
+        self.assertFalse(result.successful())
+
+    def test_map(self):
+        results = self.pool.map(lambda x: x * 2, xrange(100), chunksize=7)
+        self.assertEqual(list(results), [x * 2 for x in xrange(100)])
+
+    def test_map_in_flight(self):
+        lock = threading.Lock()
+        state = {"running": 0, "max_running": 0}
+
+        def square(x):
+            with lock:
+                state["running"] += 1
+                state["max_running"] = max(state["running"], state["max_running"])
+            time.sleep(0.01)
+            with lock:
+                state["running"] -= 1
+            return x * x
+
+        #Consume slowly, so at most max_in_flight chunks are submitted.
+        results = []
+        for result in self.pool.map(square, range(20), max_in_flight=2):
+            results.append(result)
+            time.sleep(0.01)
+        self.assertEqual(results, [x * x for x in range(20)])
+        self.assertLessEqual(state["max_running"], 2)
+
+    def test_as_completed(self):
+        results = [self.pool.submit(time.sleep, delay) for delay in [0.3, 0.1, 0.2]]
+        completed = list(self.pool.as_completed(results, timeout=2))
+        self.assertEqual(completed, [results[1], results[2], results[0]])
+
+        results = [self.pool.submit(time.sleep, 1)]
+        with self.assertRaises(AsyncResult.Timeout):
+            list(self.pool.as_completed(results, timeout=0.1))
+
+    def test_link(self):
+        linked = []
+        result = AsyncResult()
+        result.link(linked.append)
+        self.assertEqual(linked, [])
+        result.set(1)
+        self.assertEqual(linked, [result])
+        result.link(linked.append)
+        self.assertEqual(linked, [result, result])
+
+    def test_then(self):
+        result = self.pool.submit(lambda: 2)
+        chained = result.then(lambda x: x * 3).then(lambda x: self.pool.submit(lambda: x + 1))
+        self.assertEqual(chained.get(timeout=1), 7)
+
+        failed = self.pool.submit(lambda: 1 / 0).then(lambda x: x * 3)
+        with self.assertRaises(ZeroDivisionError):
+            failed.get(timeout=1)
+
+        raised = self.pool.submit(lambda: 0).then(lambda x: 1 / x)
+        with self.assertRaises(ZeroDivisionError):
+            raised.get(timeout=1)
+
+    def test_wait_all(self):
+        results = [self.pool.submit(time.sleep, delay) for delay in [0.1, 0.05, 0]]
+        self.assertEqual(wait_all(results, timeout=2), results)
+        self.assertEqual(wait_all([]), [])
+
+        blocked = AsyncResult()
+        results = [self.pool.submit(lambda: 1), blocked]
+        self.assertEqual(wait_all(results, timeout=0.1), results[:1])
+
+    def test_wait_any(self):
+        results = [self.pool.submit(time.sleep, 0.2), self.pool.submit(lambda: 1)]
+        self.assertIs(wait_any(results, timeout=2), results[1])
+        self.assertIs(wait_any(results), results[1])
+        self.assertIsNone(wait_any([AsyncResult()], timeout=0.05))
+
+    def test_unlink(self):
+        blocked = AsyncResult()
+        results = [self.pool.submit(lambda: 1), blocked]
+        self.assertIs(wait_any(results, timeout=2), results[0])
+        self.assertEqual(blocked.callbacks, [])
+        wait_all(results, timeout=0.05)
+        self.assertEqual(blocked.callbacks, [])
+
+        linked = []
+        blocked.link(linked.append)
+        blocked.unlink(linked.append)
+        blocked.unlink(linked.append)
+        blocked.set(1)
+        self.assertEqual(linked, [])
+
+
+class TestAutoscalingThreadPool(unittest.TestCase):
+    def setUp(self):
+        self.counter = 0
+        self.lock = threading.Lock()
+
+        def processor(item):
+            time.sleep(item)
+            with self.lock:
+                self.counter += 1
+
+        self.pool = AutoscalingThreadPool(1, 4, processor,
+                wait_threshold=0.01, idle_timeout=0.2, interval=0.05)
+
+    def tearDown(self):
+        self.pool.stop()
+        self.pool.join()
+
+    def test_basic(self):
+        self.pool.put(0)
+        self.pool.start()
+        self.assertEqual(self.pool.submit(lambda: 1).get(timeout=1), 1)
+        self.pool.stop()
+        self.pool.join()
+        self.assertEqual(self.counter, 1)
+        self.assertEqual(self.pool.is_alive(), False)
+
+    def test_restart_while_retiring(self):
+        event = threading.Event()
+        pool = AutoscalingThreadPool(1, 2, lambda item: event.wait(5),
+                idle_timeout=0, interval=60)
+        pool.start()
+        with pool.lock:
+            pool._spawn(1)
+        pool.put(0)
+        pool.put(1)
+        time.sleep(0.1)
+
+        #Queue a STOP_ITEM to retire a worker, which is not taken,
+        #since both workers are busy.
+        for worker in pool.workers:
+            worker.idle_since = time.time() - 1
+            break
+        self.assertEqual(pool.scale(), -1)
+        pool.stop()
+        event.set()
+        pool.join()
+        self.assertEqual(pool.queue.qsize(), 0)
+
+        pool.start()
+        self.assertEqual(pool.submit(lambda: 1).get(timeout=1), 1)
+        time.sleep(0.1)
+        self.assertEqual(pool.num_threads, 1)
+        pool.stop()
+        pool.join()
+
+    def test_grow_and_shrink(self):
+        self.pool.start()
+        self.assertEqual(self.pool.num_threads, 1)
+        for i in range(40):
+            self.pool.put(0.05)
+        time.sleep(0.3)
+        self.assertEqual(self.pool.num_threads, 4)
+
+        #Workers are retired one at a time once idle
+        while self.counter < 40:
+            time.sleep(0.05)
+        self.assertEqual(self.pool.num_threads, 4)
+        time.sleep(0.6)
+        self.assertEqual(self.pool.num_threads, 1)
+
+    def test_cooldown(self):
+        self.pool.cooldown = 10
+        self.pool.start()
+        for i in range(10):
+            self.pool.put(0.05)
+        time.sleep(0.3)
+        grown = self.pool.num_threads
+        self.assertGreater(grown, 1)
+        time.sleep(0.5)
+        self.assertEqual(self.pool.num_threads, grown)
+
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.batches = []
+
+    def test_batch_size(self):
+        pool = ThreadPool(1, self.batches.append, batch_size=3)
+        for i in range(7):
+            pool.put(i)
+        pool.start()
+        pool.stop()
+        pool.join()
+        self.assertEqual(self.batches, [[0, 1, 2], [3, 4, 5], [6]])
+
+    def test_batch_timeout(self):
+        pool = ThreadPool(1, self.batches.append, batch_size=100, batch_timeout=0.2)
+        pool.start()
+        pool.put(1)
+        time.sleep(0.05)
+        pool.put(2)
+        time.sleep(0.3)
+        pool.put(3)
+        pool.stop()
+        pool.join()
+        self.assertEqual(self.batches, [[1, 2], [3]])
+
+    def test_error_isolation(self):
+        def processor(batch):
+            if "bad" in batch:
+                raise ValueError()
+            self.batches.append(batch)
+
+        pool = ThreadPool(1, processor, batch_size=3)
+        for item in ["a", "bad", "b", "c"]:
+            pool.put(item)
+        pool.start()
+        pool.stop()
+        pool.join()
+        self.assertEqual(self.batches, [["a"], ["b"], ["c"]])
+
+    def test_partial_failure(self):
+        processed = []
+        def processor(batch):
+            failed = []
+            for item in batch:
+                if item == "bad":
+                    failed.append(item)
+                else:
+                    processed.append(item)
+            if failed:
+                raise BatchProcessingException(failed)
+
+        pool = ThreadPool(1, processor, batch_size=3, instrumented=True)
+        for item in ["a", "bad", "b", "c"]:
+            pool.put(item)
+        pool.start()
+        pool.stop()
+        pool.join()
+        #Successful items are not reprocessed
+        self.assertEqual(processed, ["a", "b", "c"])
+        self.assertEqual(pool.stats()["exceptions"], {"BatchProcessingException": 1})
+
+    def test_subclass(self):
+        class MyThreadPool(ThreadPool):
+            def process(self, item):
+                if item == "bad":
+                    raise ValueError()
+                batches.append(item)
+
+        batches = self.batches
+        pool = MyThreadPool(2, batch_size=10)
+        for item in ["a", "bad", "b"]:
+            pool.put(item)
+        pool.start()
+        result = pool.submit(lambda: 1)
+        self.assertEqual(result.get(timeout=1), 1)
+        pool.stop()
+        pool.join()
+        self.assertEqual(sorted(self.batches), ["a", "b"])
+
+
+class TestSchedulingQueue(unittest.TestCase):
+    def setUp(self):
+        self.processed = []
+        self.expired = []
+        self.queue = SchedulingQueue(expired_observer=self.expired.append)
+        self.pool = ThreadPool(1, self.processed.append, queue=self.queue)
+
+    def test_priority(self):
+        now = time.time()
+        self.pool.put("bulk1", priority=10)
+        self.pool.put("interactive1", priority=0)
+        self.pool.put("bulk2", priority=10)
+        self.pool.put("interactive2", priority=0, deadline=now + 10)
+        self.pool.put("interactive3", priority=0, deadline=now + 5)
+        self.pool.put("default")
+        self.pool.start()
+        self.pool.stop()
+        self.pool.join()
+        self.assertEqual(self.processed, [
+            "interactive3", "interactive2", "interactive1", "default", "bulk1", "bulk2"])
+
+    def test_stop_item(self):
+        self.pool.start()
+        self.pool.put(time.sleep, priority=0)
+        self.pool.stop()
+        self.pool.put("bulk", priority=100)
+        self.pool.join()
+        self.assertEqual(self.processed[1:], ["bulk"])
+
+    def test_deadline(self):
+        self.pool.put("expired", deadline=time.time() - 1)
+        task = Task(lambda: 1)
+        self.pool.put(task, deadline=time.time() - 1)
+        self.pool.put("valid", deadline=time.time() + 10)
+        self.pool.start()
+        self.pool.stop()
+        self.pool.join()
+        self.assertEqual(self.processed, ["valid"])
+        self.assertEqual(self.expired, ["expired", task])
+        with self.assertRaises(DeadlineExpiredException):
+            task.result.get(timeout=1)
+
+    def test_deadline_instrumented(self):
+        pools = [
+            ThreadPool(1, self.processed.append, queue=self.queue, instrumented=True),
+            AutoscalingThreadPool(1, 1, self.processed.append, queue=self.queue)
+        ]
+        for pool in pools:
+            del self.expired[:]
+            pool.put("expired", deadline=time.time() - 1)
+            result = pool.submit(lambda: 1)
+            pool.put("valid", deadline=time.time() + 10)
+            pool.start()
+            self.assertEqual(result.get(timeout=1), 1)
+
+            task = Task(lambda: 1)
+            pool.put(task, deadline=time.time() - 1)
+            pool.stop()
+            pool.join()
+            self.assertEqual(self.expired, ["expired", task])
+            with self.assertRaises(DeadlineExpiredException):
+                task.result.get(timeout=1)
+
+    def test_stats(self):
+        self.pool.put("expired", priority=1, deadline=time.time() - 1)
+        self.pool.put("bulk", priority=1)
+        self.pool.put("interactive", priority=0)
+        self.queue.get()
+        stats = self.queue.stats()
+        self.assertEqual(stats[0]["dequeued"], 1)
+        self.assertEqual(stats[0]["wait"]["count"], 1)
+        self.assertEqual(stats[1]["queued"], 2)
+        self.assertGreater(stats[1]["oldest"], 0)
+        self.queue.get()
+        stats = self.queue.stats()
+        self.assertEqual(stats[1]["expired"], 1)
+        self.assertEqual(stats[1]["dequeued"], 1)
+        self.assertEqual(stats[1]["queued"], 0)
+        with self.assertRaises(Queue.Empty):
+            self.queue.get(timeout=0.01)
+
+class TestWorkStealingThreadPool(unittest.TestCase):
+    def setUp(self):
+        self.counter = 0
+        self.lock = threading.Lock()
+
+        def processor(item):
+            with self.lock:
+                self.counter += item
+
+        self.pool = WorkStealingThreadPool(4, processor)
+
+    def test_basic(self):
+        self.assertEqual(self.pool.is_alive(), False)
+        for i in range(100):
+            self.pool.put(1)
+        self.assertEqual(self.counter, 0)
+        self.pool.start()
+        self.assertEqual(self.pool.is_alive(), True)
+        self.pool.stop()
+        self.pool.join()
+        self.assertEqual(self.counter, 100)
+        self.assertEqual(self.pool.is_alive(), False)
+
+    def test_idle_wakeup(self):
+        self.pool.start()
+        time.sleep(0.1)
+        result = self.pool.submit(lambda: 1)
+        self.assertEqual(result.get(timeout=1), 1)
+        self.pool.stop()
+        self.pool.join()
+
+    def test_idle_wakeup_stress(self):
+        event = threading.Event()
+        pool = WorkStealingThreadPool(4, lambda item: event.set())
+        pool.start()
+        #Each item is put while all workers are idle or going idle,
+        #so a lost wakeup leaves it queued with every worker asleep.
+        for i in xrange(2000):
+            event.clear()
+            pool.put(i)
+            self.assertTrue(event.wait(5), "lost wakeup on trial %d" % i)
+        pool.stop()
+        pool.join()
+
+    def test_burst_wakeup(self):
+        active = set()
+        condition = threading.Condition()
+
+        def processor(item):
+            #Wait until all workers are processing concurrently
+            with condition:
+                active.add(threading.current_thread())
+                condition.notify_all()
+                deadline = time.time() + 2
+                while len(active) < 4 and time.time() < deadline:
+                    condition.wait(deadline - time.time())
+
+        pool = WorkStealingThreadPool(4, processor)
+        notified = []
+        notify = pool.condition.notify
+        def count_notify(*args):
+            notified.append(args)
+            notify(*args)
+        pool.condition.notify = count_notify
+
+        pool.start()
+        try:
+            time.sleep(0.1)
+            self.assertEqual(pool.sleeping, 4)
+            #Each work item wakes a worker, rather than relying on
+            #the first woken worker to steal the rest.
+            for i in range(4):
+                pool.put(i)
+            self.assertEqual(len(notified), 4)
+        finally:
+            pool.stop()
+            pool.join()
+        self.assertEqual(len(active), 4)
+
+    def test_local_submit(self):
+        pool = WorkStealingThreadPool(1, None)
+        order = []
+
+        def spawn():
+            return [pool.submit(order.append, i) for i in range(3)]
+
+        #Tasks submitted from a worker are pushed to its own
+        #deque, and are popped most recently submitted first.
+        pool.start()
+        results = pool.submit(spawn).get(timeout=1)
+        for result in results:
+            result.get(timeout=1)
+        self.assertEqual(order, [2, 1, 0])
+        pool.stop()
+        pool.join()
+
+    def test_steal(self):
+        threads = []
+        event = threading.Event()
+
+        def task():
+            threads.append(threading.current_thread())
+            event.wait(1)
+
+        def spawn():
+            return [self.pool.submit(task) for i in range(4)]
+
+        #All tasks are pushed to the spawning worker's deque,
+        #so the other workers must steal them.
+        self.pool.start()
+        results = self.pool.submit(spawn).get(timeout=1)
+        time.sleep(0.1)
+        event.set()
+        for result in results:
+            result.get(timeout=1)
+        self.assertGreater(len(set(threads)), 1)
+        self.pool.stop()
+        self.pool.join()
 
 
 if __name__ == "__main__":
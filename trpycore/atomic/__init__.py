@@ -1 +1,3 @@
-from trpycore.atomic.atomic import Atomic
+from trpycore.atomic.atomic import Atomic, AtomicStampedReference, AtomicUpdateException
+from trpycore.atomic.backoff import Backoff, NoBackoff, ExponentialBackoff, GeventBackoff
+from trpycore.atomic.ringbuffer import RingBufferQueue
@@ -1,5 +1,9 @@
+from trpycore.atomic.backoff import NoBackoff
 from trpycore.atomic.value import AtomicValue
 
+#Default backoff strategy, retry immediately
+NO_BACKOFF = NoBackoff()
+
 class AtomicUpdateException(Exception):
     pass
 
@@ -10,18 +14,31 @@ class Atomic(object):
     providing atomic operations through the
     compare_and_set method.
 
+    Contention statistics (attempts, failures, and max_retries)
+    are maintained for update() calls to help identify hot
+    atomics. Note that for performance reasons these statistics
+    are not updated atomically and should be treated as
+    approximate under heavy contention.
+
     Usage:
         v = Atomic(1)
         v.update(lambda v: v+1)
     """
 
-    def __init__(self, value=None):
+    def __init__(self, value=None, backoff=None):
         """Atomic constructor.
 
         Args:
             value: Object to wrap for atomic operations.
+            backoff: Optional Backoff object to use when an
+                update fails due to contention. If not provided,
+                failed updates will be retried immediately.
         """
         self.value = AtomicValue(value)
+        self.backoff = backoff or NO_BACKOFF
+        self.attempts = 0
+        self.failures = 0
+        self.max_retries = 0
 
     def get(self):
         """Get the current value.
@@ -46,14 +63,44 @@ class Atomic(object):
 
         Compare the current value to the expected_value and
         only set the new_value if the current value matches
-        the expected_value.
+        the expected_value. Values are compared by identity.
 
         Returns:
-            new value
+            True if the value was set, False otherwise.
         """
         return self.value.compare_and_set(expected_value, new_value)
+
+    def compare_and_set_many(self, expected_values, new_values):
+        """Atomically compare and set multiple fields.
+
+        The wrapped value must be a tuple. Each field of the
+        current tuple is compared (by identity) to the corresponding
+        field in expected_values, and only if all fields match is
+        the value replaced with tuple(new_values).
+
+        This is safe from ABA problems since the comparison is
+        ultimately made against the identity of the current tuple
+        itself, which is kept alive for the duration of the call.
+
+        Usage:
+            v = Atomic((head, size))
+            v.compare_and_set_many((head, size), (new_head, size+1))
+
+        Args:
+            expected_values: sequence of expected field values
+            new_values: sequence of new field values
+        Returns:
+            True if the value was set, False otherwise.
+        """
+        current_value = self.value.get()
+        if len(current_value) != len(expected_values):
+            return False
+        for current, expected in zip(current_value, expected_values):
+            if current is not expected:
+                return False
+        return self.value.compare_and_set(current_value, tuple(new_values))
     
-    def update(self, func, spin=True):
+    def update(self, func, spin=True, backoff=None):
         """Atomically update the value using func.
 
         Update the current_value with output of
@@ -69,36 +116,211 @@ class Atomic(object):
                 failures due to contention should be
                 retried until successful. Otherwise
                 an AtomicUpdateException will be raised.
+            backoff: Optional Backoff object to use for this
+                update, overriding the instance backoff.
         Returns:
             new value
         Raises:
             AtomicUpdateException if spin=False and
             the update failes due to contention.
         """
-        while True:
-            current_value = self.get()
-            new_value = func(current_value)
-            if self.compare_and_set(current_value, new_value):
-                break
-            if not spin:
-                raise AtomicUpdateException("atomic update failed")
+        backoff = backoff or self.backoff
+        attempts = failures = 0
+        try:
+            while True:
+                attempts += 1
+                current_value = self.value.get()
+                new_value = func(current_value)
+                if self.value.compare_and_set(current_value, new_value):
+                    break
+                failures += 1
+                if not spin:
+                    raise AtomicUpdateException("atomic update failed")
+                backoff.backoff(failures)
+        finally:
+            self.attempts += attempts
+            if failures:
+                self.failures += failures
+                if failures > self.max_retries:
+                    self.max_retries = failures
         return new_value
 
-    def increment(self, spin=True):
+    def increment(self, n=1, spin=True):
         """Atomic increment.
         
-        Equivalent to v.update(lambda v: v+1)
+        Equivalent to v.update(lambda v: v+n)
+
+        Args:
+            n: optional value to increment by
+            spin: see update()
         Returns:
             new value
         """
-        return self.update(lambda v: v+1)
+        return self.update(lambda v: v+n, spin)
 
-    def decrement(self, spin=True):
+    def decrement(self, n=1, spin=True):
         """Atomic decrement.
 
-        Equivalent to v.update(lambda v: v-1)
+        Equivalent to v.update(lambda v: v-n)
 
+        Args:
+            n: optional value to decrement by
+            spin: see update()
         Returns:
             new value
         """
-        return self.update(lambda v: v-1)
+        return self.update(lambda v: v-n, spin)
+
+    def stats(self):
+        """Return contention statistics.
+
+        Returns:
+            dict of the form {
+                "attempts": total compare and set attempts,
+                "failures": total failed compare and set attempts,
+                "max_retries": max retries for a single update
+            }
+        """
+        return {
+            "attempts": self.attempts,
+            "failures": self.failures,
+            "max_retries": self.max_retries
+        }
+
+    def reset_stats(self):
+        """Reset contention statistics."""
+        self.attempts = 0
+        self.failures = 0
+        self.max_retries = 0
+
+
+class AtomicStampedReference(object):
+    """Atomic stamped reference class.
+
+    This class pairs a value with an integer stamp which is
+    updated atomically along with the value. Since the stamp
+    is incremented on each update, compare_and_set will fail
+    against a stale snapshot even if the value has been
+    changed and then changed back to the same object (ABA),
+    which is common when objects are recycled from a pool.
+
+    Usage:
+        ref = AtomicStampedReference(node)
+        value, stamp = ref.get_pair()
+        ref.compare_and_set(value, new_node, stamp)
+    """
+
+    def __init__(self, value=None, stamp=0, backoff=None):
+        """AtomicStampedReference constructor.
+
+        Args:
+            value: Object to wrap for atomic operations.
+            stamp: Optional initial integer stamp.
+            backoff: Optional Backoff object to use when an
+                update fails due to contention.
+        """
+        self.pair = Atomic((value, stamp), backoff)
+
+    def get(self):
+        """Get the current value.
+
+        Returns:
+            Current value.
+        """
+        return self.pair.get()[0]
+
+    def get_stamp(self):
+        """Get the current stamp.
+
+        Returns:
+            Current stamp.
+        """
+        return self.pair.get()[1]
+
+    def get_pair(self):
+        """Get the current value and stamp.
+
+        Returns:
+            (value, stamp) tuple
+        """
+        return self.pair.get()
+
+    def set(self, value, stamp=None):
+        """Set the value.
+
+        Args:
+            value: new value to set
+            stamp: Optional new stamp. If not provided,
+                the current stamp will be incremented.
+        Returns:
+            old (value, stamp) tuple
+        """
+        if stamp is None:
+            while True:
+                current_pair = self.pair.get()
+                new_pair = (value, current_pair[1] + 1)
+                if self.pair.compare_and_set(current_pair, new_pair):
+                    return current_pair
+        return self.pair.set((value, stamp))
+
+    def compare_and_set(self, expected_value, new_value, expected_stamp, new_stamp=None):
+        """Atomically compare and set value and stamp.
+
+        Only set the new_value and new_stamp if the current value
+        is expected_value (by identity) and the current stamp
+        equals expected_stamp.
+
+        Args:
+            expected_value: expected current value
+            new_value: new value to set
+            expected_stamp: expected current stamp
+            new_stamp: Optional new stamp. If not provided,
+                expected_stamp + 1 will be used.
+        Returns:
+            True if the value and stamp were set, False otherwise.
+        """
+        if new_stamp is None:
+            new_stamp = expected_stamp + 1
+        current_pair = self.pair.get()
+        if current_pair[0] is not expected_value or current_pair[1] != expected_stamp:
+            return False
+        return self.pair.compare_and_set(current_pair, (new_value, new_stamp))
+
+    def attempt_stamp(self, expected_value, new_stamp):
+        """Atomically set the stamp if the value is expected_value.
+
+        Args:
+            expected_value: expected current value
+            new_stamp: new stamp to set
+        Returns:
+            True if the stamp was set, False otherwise.
+        """
+        current_pair = self.pair.get()
+        if current_pair[0] is not expected_value:
+            return False
+        return self.pair.compare_and_set(current_pair, (expected_value, new_stamp))
+
+    def update(self, func, spin=True, backoff=None):
+        """Atomically update the value using func and increment the stamp.
+
+        Args:
+            func: callable taking the current value as
+                its sole argument and returning the
+                new value.
+            spin: see Atomic.update()
+            backoff: see Atomic.update()
+        Returns:
+            new (value, stamp) tuple
+        Raises:
+            AtomicUpdateException if spin=False and
+            the update failes due to contention.
+        """
+        return self.pair.update(lambda pair: (func(pair[0]), pair[1] + 1), spin, backoff)
+
+    def stats(self):
+        """Return contention statistics.
+
+        Returns:
+            dict of contention statistics, see Atomic.stats().
+        """
+        return self.pair.stats()
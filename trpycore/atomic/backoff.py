@@ -0,0 +1,113 @@
+import abc
+import random
+import time
+
+class Backoff(object):
+    """Backoff abstract base class.
+
+    Backoff strategies are used to reduce contention when
+    an atomic operation fails and needs to be retried.
+    """
+    __metaclass__ = abc.ABCMeta
+
+    @abc.abstractmethod
+    def backoff(self, retries):
+        """Backoff before retrying a failed atomic operation.
+
+        Args:
+            retries: number of consecutive failed attempts,
+                starting at 1 for the first retry.
+        """
+        return
+
+class NoBackoff(Backoff):
+    """No backoff strategy.
+
+    Failed atomic operations will be retried immediately
+    in a tight loop.
+    """
+
+    def backoff(self, retries):
+        """Backoff before retrying a failed atomic operation.
+
+        Args:
+            retries: number of consecutive failed attempts,
+                starting at 1 for the first retry.
+        """
+        return
+
+class ExponentialBackoff(Backoff):
+    """Exponential backoff strategy with optional jitter.
+
+    Each consecutive failure doubles (multiplier) the amount of time
+    to sleep before retrying, up to max_delay. If jitter is enabled,
+    the actual delay is chosen randomly between 0 and the computed
+    delay, which prevents contending threads from retrying in lockstep.
+    """
+
+    def __init__(self, initial_delay=0.00001, max_delay=0.01, multiplier=2, jitter=True):
+        """ExponentialBackoff constructor.
+
+        Args:
+            initial_delay: delay in seconds before the first retry
+            max_delay: maximum delay in seconds before any retry
+            multiplier: delay multiplier applied for each failure
+            jitter: if True, randomize delay between 0 and the
+                computed delay.
+        """
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+
+    def delay(self, retries):
+        """Compute the delay for the given number of retries.
+
+        Args:
+            retries: number of consecutive failed attempts,
+                starting at 1 for the first retry.
+        Returns:
+            delay in seconds
+        """
+        #Cap the exponent to avoid overflow when converting to float
+        exponent = min(retries - 1, 64)
+        delay = self.initial_delay * (self.multiplier ** exponent)
+        delay = min(delay, self.max_delay)
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        return delay
+
+    def backoff(self, retries):
+        """Backoff before retrying a failed atomic operation.
+
+        Args:
+            retries: number of consecutive failed attempts,
+                starting at 1 for the first retry.
+        """
+        time.sleep(self.delay(retries))
+
+class GeventBackoff(Backoff):
+    """Gevent backoff strategy.
+
+    Yields to the gevent hub before retrying, which gives other
+    greenlets a chance to run (and complete their updates).
+    Greenlets never yield on their own while spinning, so
+    this strategy should always be used for atomics shared
+    across greenlets which may contend.
+    """
+
+    def __init__(self):
+        """GeventBackoff constructor."""
+        #Import gevent here so that gevent is only required
+        #when this backoff strategy is actually used.
+        import gevent
+        self.sleep = gevent.sleep
+
+    def backoff(self, retries):
+        """Backoff before retrying a failed atomic operation.
+
+        Args:
+            retries: number of consecutive failed attempts,
+                starting at 1 for the first retry.
+        """
+        self.sleep(0)
@@ -0,0 +1,233 @@
+import Queue
+import threading
+import time
+
+from trpycore.atomic.backoff import ExponentialBackoff
+from trpycore.atomic.value import AtomicRingBuffer
+
+#Sentinel used to detect empty polls, since None is a valid item
+_EMPTY = object()
+
+class RingBufferQueue(object):
+    """Bounded lock-free queue backed by an AtomicRingBuffer.
+
+    RingBufferQueue provides a Queue.Queue compatible put/get interface
+    on top of the lock-free AtomicRingBuffer. Non-blocking operations
+    (offer/poll, put_nowait/get_nowait) only take a lock to wake
+    blocked threads. Blocking operations retry the non-blocking
+    operation, using the backoff strategy to wait between attempts,
+    and once spin_retries attempts have failed, block on a condition
+    until woken by a non-blocking operation.
+
+    RingBufferQueue can be used as the queue argument to ThreadPool
+    and as the queue_class for QueuePool.
+
+    Note that capacity is rounded up to the nearest power of 2,
+    with a minimum capacity of 2.
+    """
+
+    def __init__(self, maxsize=1024, backoff=None, spin_retries=10):
+        """RingBufferQueue constructor.
+
+        Args:
+            maxsize: maximum number of items in the queue. This
+                will be rounded up to the nearest power of 2.
+            backoff: Optional Backoff object to use between
+                attempts when blocking in put() or get().
+                If not provided, an ExponentialBackoff with
+                a maximum delay of 5ms will be used.
+            spin_retries: Optional number of failed attempts after
+                which put() and get() block on a condition. If None,
+                put() and get() retry with backoff indefinitely,
+                which is required for greenlets without monkey
+                patching, i.e. with GeventBackoff.
+        """
+        self.ring_buffer = AtomicRingBuffer(maxsize)
+        self.maxsize = self.ring_buffer.capacity
+        self.backoff = backoff or ExponentialBackoff(
+                initial_delay=0.00005,
+                max_delay=0.005)
+        self.spin_retries = spin_retries
+
+        #Conditions for blocked put() and get() calls, along with
+        #the number of blocked calls, so that non-blocking operations
+        #only take the lock when there is a blocked call to wake.
+        self.lock = threading.Lock()
+        self.not_full = threading.Condition(self.lock)
+        self.not_empty = threading.Condition(self.lock)
+        self.putters = 0
+        self.getters = 0
+
+    def _notify(self, condition):
+        """Wake a blocked call waiting on condition."""
+        with self.lock:
+            condition.notify()
+
+    def _wait(self, condition, attempt, deadline):
+        """Block on condition until woken or deadline expires.
+
+        Args:
+            condition: not_full or not_empty condition
+            attempt: non-blocking operation to retry once
+                registered as blocked, returning True
+                if the operation succeeded.
+            deadline: optional time in seconds at which to
+                stop waiting.
+        Returns:
+            True if attempt succeeded, False otherwise.
+        """
+        with self.lock:
+            #Register as blocked before retrying, since non-blocking
+            #operations complete before checking for blocked calls.
+            #Either the retry observes the completed operation, or
+            #the operation observes this call and notifies it.
+            if condition is self.not_empty:
+                self.getters += 1
+            else:
+                self.putters += 1
+            try:
+                if attempt():
+                    return True
+                if deadline is None:
+                    condition.wait()
+                else:
+                    condition.wait(max(deadline - time.time(), 0))
+                return False
+            finally:
+                if condition is self.not_empty:
+                    self.getters -= 1
+                else:
+                    self.putters -= 1
+
+    def offer(self, item):
+        """Add item to the queue without blocking.
+
+        Args:
+            item: item to add to the queue
+        Returns:
+            True if item was added, False if queue is full.
+        """
+        if self.ring_buffer.offer(item):
+            if self.getters:
+                self._notify(self.not_empty)
+            return True
+        return False
+
+    def poll(self, default=None):
+        """Remove and return an item from the queue without blocking.
+
+        Args:
+            default: value to return if the queue is empty
+        Returns:
+            item, or default if the queue is empty.
+        """
+        item = self.ring_buffer.poll(_EMPTY)
+        if item is _EMPTY:
+            return default
+        if self.putters:
+            self._notify(self.not_full)
+        return item
+
+    def put(self, item, block=True, timeout=None):
+        """Put an item into the queue.
+
+        Args:
+            item: item to add to the queue
+            block: if True block until space is available
+            timeout: if block is True, block at most timeout
+                seconds and then raise Queue.Full.
+        Raises:
+            Queue.Full if the queue is full.
+        """
+        if self.offer(item):
+            return
+        elif not block:
+            raise Queue.Full
+
+        deadline = None if timeout is None else time.time() + timeout
+        attempt = lambda: self.ring_buffer.offer(item)
+        retries = 0
+        while True:
+            if deadline is not None and time.time() >= deadline:
+                raise Queue.Full
+            retries += 1
+            if self.spin_retries is None or retries <= self.spin_retries:
+                self.backoff.backoff(retries)
+                succeeded = attempt()
+            else:
+                succeeded = self._wait(self.not_full, attempt, deadline) or attempt()
+            if succeeded:
+                break
+
+        if self.getters:
+            self._notify(self.not_empty)
+
+    def put_nowait(self, item):
+        """Put an item into the queue without blocking.
+
+        Raises:
+            Queue.Full if the queue is full.
+        """
+        return self.put(item, False)
+
+    def get(self, block=True, timeout=None):
+        """Remove and return an item from the queue.
+
+        Args:
+            block: if True block until an item is available
+            timeout: if block is True, block at most timeout
+                seconds and then raise Queue.Empty.
+        Returns:
+            item
+        Raises:
+            Queue.Empty if the queue is empty.
+        """
+        item = self.poll(_EMPTY)
+        if item is not _EMPTY:
+            return item
+        elif not block:
+            raise Queue.Empty
+
+        deadline = None if timeout is None else time.time() + timeout
+        #Single element list, so that attempt() can return the item
+        polled = [_EMPTY]
+        def attempt():
+            polled[0] = self.ring_buffer.poll(_EMPTY)
+            return polled[0] is not _EMPTY
+
+        retries = 0
+        while True:
+            if deadline is not None and time.time() >= deadline:
+                raise Queue.Empty
+            retries += 1
+            if self.spin_retries is None or retries <= self.spin_retries:
+                self.backoff.backoff(retries)
+                succeeded = attempt()
+            else:
+                succeeded = self._wait(self.not_empty, attempt, deadline) or attempt()
+            if succeeded:
+                break
+
+        if self.putters:
+            self._notify(self.not_full)
+        return polled[0]
+
+    def get_nowait(self):
+        """Remove and return an item from the queue without blocking.
+
+        Raises:
+            Queue.Empty if the queue is empty.
+        """
+        return self.get(False)
+
+    def qsize(self):
+        """Return the approximate size of the queue."""
+        return self.ring_buffer.size()
+
+    def empty(self):
+        """Return True if the queue is empty (not reliable)."""
+        return self.ring_buffer.size() == 0
+
+    def full(self):
+        """Return True if the queue is full (not reliable)."""
+        return self.ring_buffer.size() >= self.maxsize
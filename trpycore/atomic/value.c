@@ -12,6 +12,25 @@
 #error No CAS operation available for this platform
 #endif
 
+/**
+ * Size CAS and memory barrier macros.
+ */
+#if __ENVIRONMENT_MAC_OS_X_VERSION_MIN_REQUIRED__ >= 1050
+    #define ATOMIC_CAS_SIZE(ptr, old_value, new_value) \
+        OSAtomicCompareAndSwapLongBarrier((long) (old_value), (long) (new_value), (volatile long *) (ptr))
+    #define ATOMIC_BARRIER() OSMemoryBarrier()
+#elif defined(_MSC_VER)
+    #define ATOMIC_CAS_SIZE(ptr, old_value, new_value) \
+        (InterlockedCompareExchangePointer((PVOID volatile *) (ptr), (PVOID) (new_value), (PVOID) (old_value)) == (PVOID) (old_value))
+    #define ATOMIC_BARRIER() MemoryBarrier()
+#elif (__GNUC__ * 10000 + __GNUC_MINOR__ * 100 + __GNUC_PATCHLEVEL__) > 40100
+    #define ATOMIC_CAS_SIZE(ptr, old_value, new_value) \
+        __sync_bool_compare_and_swap((ptr), (old_value), (new_value))
+    #define ATOMIC_BARRIER() __sync_synchronize()
+#else
+#error No CAS operation available for this platform
+#endif
+
 typedef struct AtomicValue {
     PyObject_HEAD
     PyObject *value;
@@ -30,6 +49,7 @@ static int AtomicValue_clear(PyObject *self) {
 }
 
 static void AtomicValue_dealloc(PyObject *self) {
+    PyObject_GC_UnTrack(self);
     AtomicValue_clear(self);
     Py_TYPE(self)->tp_free((PyObject *) self);
 }
@@ -44,11 +64,14 @@ static PyObject* AtomicValue_new(PyTypeObject *type, PyObject *args, PyObject *k
 
 static int AtomicValue_init(AtomicValue *self, PyObject *args, PyObject *kwargs) {
     PyObject *value;
+    PyObject *old_value;
     if(!PyArg_ParseTuple(args, "O", &value)) {
         return -1;
     }
+    Py_INCREF(value);
+    old_value = self->value;
     self->value = value;
-    Py_INCREF(self->value);
+    Py_XDECREF(old_value);
     return 0;
 }
 
@@ -63,11 +86,10 @@ static PyObject* AtomicValue_set(AtomicValue *self, PyObject *args) {
     if(!PyArg_ParseTuple(args, "O", &new_value)) {
         return NULL;
     }
+    /* Reference to old_value is transferred to the caller */
+    Py_INCREF(new_value);
     old_value = self->value;
-    Py_INCREF(old_value);
-
     self->value = new_value;
-    Py_INCREF(self->value);
 
     return old_value;
 }
@@ -77,6 +99,11 @@ static PyObject* AtomicValue_set(AtomicValue *self, PyObject *args) {
  * Note that these operations will be in all python interpreters,
  * even those without a GIL.
  *
+ * The comparison is by identity. The reference held on the current
+ * value is only released once the swap succeeds, and the caller
+ * holds a reference to expected_value for the duration of the call,
+ * so its address cannot be recycled by another object mid-CAS.
+ *
  * Returns True if value is updated, False otherwise.
  */
 static PyObject* AtomicValue_compare_and_set(AtomicValue *self, PyObject *args) {
@@ -86,30 +113,33 @@ static PyObject* AtomicValue_compare_and_set(AtomicValue *self, PyObject *args)
         return NULL;
     }
 
-    Py_INCREF(self->value);
-    Py_INCREF(expected_value);
+    /* Take the reference for the new value up front, since once the
+     * swap succeeds other threads may immediately read it. */
     Py_INCREF(new_value);
 
 #if __ENVIRONMENT_MAC_OS_X_VERSION_MIN_REQUIRED__ >= 1050
-    if (OSAtomicCompareAndSwapPtr(expected_value, new_value, (void *) &self->value)) {
-        Py_INCREF(Py_True);
-        return Py_True;
+    if (OSAtomicCompareAndSwapPtrBarrier(expected_value, new_value, (void * volatile *) &self->value)) {
+        /* Release the reference previously held on the swapped value */
+        Py_DECREF(expected_value);
+        Py_RETURN_TRUE;
     }
 #elif defined(_MSC_VER)
-    if (InterlockedCompareExchange(&self->value, new_value, old_value)) {
-        Py_INCREF(Py_True);
-        return Py_True;
+    if (InterlockedCompareExchangePointer((PVOID volatile *) &self->value, new_value, expected_value) == expected_value) {
+        /* Release the reference previously held on the swapped value */
+        Py_DECREF(expected_value);
+        Py_RETURN_TRUE;
     }
 #elif (__GNUC__ * 10000 + __GNUC_MINOR__ * 100 + __GNUC_PATCHLEVEL__) > 40100
     if (__sync_bool_compare_and_swap(&self->value, expected_value, new_value)) {
-        Py_INCREF(Py_True);
-        return Py_True;
+        /* Release the reference previously held on the swapped value */
+        Py_DECREF(expected_value);
+        Py_RETURN_TRUE;
     }
 #else
 #error No CAS operation available for this platform
 #endif
-    Py_INCREF(Py_False);
-    return Py_False;
+    Py_DECREF(new_value);
+    Py_RETURN_FALSE;
 }
 
 static PyMemberDef value_members[] = {
@@ -171,26 +201,431 @@ static PyTypeObject AtomicValueType = {
     0,
 };
 
+#if PY_MAJOR_VERSION >= 3
+#define PyInt_FromSsize_t PyLong_FromSsize_t
+#endif
+
+/**
+ * Bounded multi-producer / multi-consumer ring buffer.
+ *
+ * Each slot in the buffer is paired with a sequence number which
+ * indicates whether the slot is ready to be written by a producer
+ * or read by a consumer. Producers and consumers claim positions
+ * by atomically advancing enqueue_pos / dequeue_pos with CAS, so
+ * neither offer nor poll requires a lock.
+ */
+typedef struct RingBufferCell {
+    volatile size_t sequence;
+    PyObject *item;
+} RingBufferCell;
+
+typedef struct AtomicRingBuffer {
+    PyObject_HEAD
+    RingBufferCell *buffer;
+    size_t capacity;
+    size_t mask;
+    volatile size_t enqueue_pos;
+    volatile size_t dequeue_pos;
+} AtomicRingBuffer;
+
+static int AtomicRingBuffer_traverse(PyObject *self, visitproc visit, void *arg) {
+    AtomicRingBuffer *rb = (AtomicRingBuffer *) self;
+    size_t i;
+    if(rb->buffer != NULL) {
+        for(i = 0; i < rb->capacity; i++) {
+            Py_VISIT(rb->buffer[i].item);
+        }
+    }
+    return 0;
+}
+
+static int AtomicRingBuffer_clear(PyObject *self) {
+    AtomicRingBuffer *rb = (AtomicRingBuffer *) self;
+    size_t i;
+    if(rb->buffer != NULL) {
+        for(i = 0; i < rb->capacity; i++) {
+            Py_CLEAR(rb->buffer[i].item);
+        }
+    }
+    return 0;
+}
+
+static void AtomicRingBuffer_dealloc(PyObject *self) {
+    AtomicRingBuffer *rb = (AtomicRingBuffer *) self;
+    PyObject_GC_UnTrack(self);
+    AtomicRingBuffer_clear(self);
+    if(rb->buffer != NULL) {
+        PyMem_Free(rb->buffer);
+        rb->buffer = NULL;
+    }
+    Py_TYPE(self)->tp_free((PyObject *) self);
+}
+
+static int AtomicRingBuffer_init(AtomicRingBuffer *self, PyObject *args, PyObject *kwargs) {
+    static char *kwlist[] = {"capacity", NULL};
+    Py_ssize_t requested = 1024;
+    size_t capacity = 2;
+    size_t i;
+
+    if(!PyArg_ParseTupleAndKeywords(args, kwargs, "|n", kwlist, &requested)) {
+        return -1;
+    }
+    if(requested <= 0) {
+        PyErr_SetString(PyExc_ValueError, "capacity must be greater than 0");
+        return -1;
+    }
+    if(self->buffer != NULL) {
+        PyErr_SetString(PyExc_RuntimeError, "ring buffer already initialized");
+        return -1;
+    }
+
+    /* Round capacity up to a power of 2 so positions can be masked */
+    while(capacity < (size_t) requested) {
+        capacity <<= 1;
+    }
+
+    self->buffer = (RingBufferCell *) PyMem_Malloc(capacity * sizeof(RingBufferCell));
+    if(self->buffer == NULL) {
+        PyErr_NoMemory();
+        return -1;
+    }
+    for(i = 0; i < capacity; i++) {
+        self->buffer[i].sequence = i;
+        self->buffer[i].item = NULL;
+    }
+    self->capacity = capacity;
+    self->mask = capacity - 1;
+    self->enqueue_pos = 0;
+    self->dequeue_pos = 0;
+    ATOMIC_BARRIER();
+    return 0;
+}
+
+static int AtomicRingBuffer_check(AtomicRingBuffer *self) {
+    if(self->buffer == NULL) {
+        PyErr_SetString(PyExc_RuntimeError, "ring buffer not initialized");
+        return 0;
+    }
+    return 1;
+}
+
+/**
+ * Offer an item to the ring buffer without blocking.
+ *
+ * Returns True if the item was added, False if the buffer is full.
+ */
+static PyObject* AtomicRingBuffer_offer(AtomicRingBuffer *self, PyObject *args) {
+    PyObject *item;
+    RingBufferCell *cell;
+    size_t pos;
+    size_t sequence;
+    Py_ssize_t diff;
+
+    if(!PyArg_ParseTuple(args, "O", &item)) {
+        return NULL;
+    }
+    if(!AtomicRingBuffer_check(self)) {
+        return NULL;
+    }
+
+    pos = self->enqueue_pos;
+    for(;;) {
+        cell = &self->buffer[pos & self->mask];
+        sequence = cell->sequence;
+        ATOMIC_BARRIER();
+        diff = (Py_ssize_t) sequence - (Py_ssize_t) pos;
+        if(diff == 0) {
+            if(ATOMIC_CAS_SIZE(&self->enqueue_pos, pos, pos + 1)) {
+                break;
+            }
+        } else if(diff < 0) {
+            Py_RETURN_FALSE;
+        }
+        pos = self->enqueue_pos;
+    }
+
+    Py_INCREF(item);
+    cell->item = item;
+    ATOMIC_BARRIER();
+    cell->sequence = pos + 1;
+    Py_RETURN_TRUE;
+}
+
+/**
+ * Poll an item from the ring buffer without blocking.
+ *
+ * Returns the item, or default (None) if the buffer is empty.
+ */
+static PyObject* AtomicRingBuffer_poll(AtomicRingBuffer *self, PyObject *args) {
+    PyObject *default_value = Py_None;
+    PyObject *item;
+    RingBufferCell *cell;
+    size_t pos;
+    size_t sequence;
+    Py_ssize_t diff;
+
+    if(!PyArg_ParseTuple(args, "|O", &default_value)) {
+        return NULL;
+    }
+    if(!AtomicRingBuffer_check(self)) {
+        return NULL;
+    }
+
+    pos = self->dequeue_pos;
+    for(;;) {
+        cell = &self->buffer[pos & self->mask];
+        sequence = cell->sequence;
+        ATOMIC_BARRIER();
+        diff = (Py_ssize_t) sequence - (Py_ssize_t) (pos + 1);
+        if(diff == 0) {
+            if(ATOMIC_CAS_SIZE(&self->dequeue_pos, pos, pos + 1)) {
+                break;
+            }
+        } else if(diff < 0) {
+            Py_INCREF(default_value);
+            return default_value;
+        }
+        pos = self->dequeue_pos;
+    }
+
+    /* Reference is transferred from the buffer to the caller */
+    item = cell->item;
+    cell->item = NULL;
+    ATOMIC_BARRIER();
+    cell->sequence = pos + self->mask + 1;
+    return item;
+}
+
+/**
+ * Approximate number of items in the ring buffer.
+ */
+static PyObject* AtomicRingBuffer_size(AtomicRingBuffer *self) {
+    size_t enqueue_pos = self->enqueue_pos;
+    size_t dequeue_pos = self->dequeue_pos;
+    Py_ssize_t size = (Py_ssize_t) (enqueue_pos - dequeue_pos);
+    if(size < 0) {
+        size = 0;
+    } else if((size_t) size > self->capacity) {
+        size = self->capacity;
+    }
+    return PyInt_FromSsize_t(size);
+}
+
+static PyMemberDef ringbuffer_members[] = {
+    {"capacity", T_PYSSIZET, offsetof(AtomicRingBuffer, capacity), READONLY, "capacity"},
+    {NULL}
+};
+
+static PyMethodDef ringbuffer_methods[] = {
+    {"offer", (PyCFunction) AtomicRingBuffer_offer, METH_VARARGS, "Offer item without blocking"},
+    {"poll", (PyCFunction) AtomicRingBuffer_poll, METH_VARARGS, "Poll item without blocking"},
+    {"size", (PyCFunction) AtomicRingBuffer_size, METH_NOARGS, "Approximate size"},
+    {NULL}
+};
+
+static PyTypeObject AtomicRingBufferType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "atomic.value.AtomicRingBuffer",
+    sizeof(AtomicRingBuffer),
+    0,
+    AtomicRingBuffer_dealloc,
+    0,
+    0,
+    0,
+    0,
+    0,
+    0,
+    0,
+    0,
+    0,
+    0,
+    0,
+    0,
+    0,
+    0,
+    Py_TPFLAGS_DEFAULT | Py_TPFLAGS_HAVE_GC,
+    "Bounded lock-free multi-producer / multi-consumer ring buffer",
+    AtomicRingBuffer_traverse,
+    AtomicRingBuffer_clear,
+    0,
+    0,
+    0,
+    0,
+    ringbuffer_methods,
+    ringbuffer_members,
+    0,
+    0,
+    0,
+    0,
+    0,
+    0,
+    (initproc) AtomicRingBuffer_init,
+    0,
+    0,
+    0,
+};
+
+/**
+ * Atomic operations on 64-bit integer slots within a writable buffer.
+ *
+ * These functions are intended for use with shared memory, i.e.
+ * an mmap'd file shared across processes, where atomicity must be
+ * guaranteed by the hardware rather than the GIL.
+ */
+#if __ENVIRONMENT_MAC_OS_X_VERSION_MIN_REQUIRED__ >= 1050
+    #define ATOMIC_ADD_INT64(ptr, delta) OSAtomicAdd64Barrier((delta), (volatile int64_t *) (ptr))
+    #define ATOMIC_CAS_INT64(ptr, old_value, new_value) \
+        OSAtomicCompareAndSwap64Barrier((old_value), (new_value), (volatile int64_t *) (ptr))
+#elif defined(_MSC_VER)
+    #define ATOMIC_ADD_INT64(ptr, delta) \
+        (InterlockedExchangeAdd64((volatile LONGLONG *) (ptr), (delta)) + (delta))
+    #define ATOMIC_CAS_INT64(ptr, old_value, new_value) \
+        (InterlockedCompareExchange64((volatile LONGLONG *) (ptr), (new_value), (old_value)) == (old_value))
+#elif (__GNUC__ * 10000 + __GNUC_MINOR__ * 100 + __GNUC_PATCHLEVEL__) > 40100
+    #define ATOMIC_ADD_INT64(ptr, delta) __sync_add_and_fetch((ptr), (delta))
+    #define ATOMIC_CAS_INT64(ptr, old_value, new_value) \
+        __sync_bool_compare_and_swap((ptr), (old_value), (new_value))
+#else
+#error No CAS operation available for this platform
+#endif
+
+/**
+ * Helper to get a pointer to the 64-bit slot at index within buffer.
+ *
+ * Returns NULL and sets an exception if the slot is out of
+ * bounds or not properly aligned.
+ */
+static volatile PY_LONG_LONG* buffer_slot(void *buffer, Py_ssize_t length, Py_ssize_t index) {
+    char *slot;
+    if(index < 0 || (index + 1) * (Py_ssize_t) sizeof(PY_LONG_LONG) > length) {
+        PyErr_SetString(PyExc_IndexError, "slot index out of range");
+        return NULL;
+    }
+    slot = (char *) buffer + index * sizeof(PY_LONG_LONG);
+    if(((size_t) slot) % sizeof(PY_LONG_LONG) != 0) {
+        PyErr_SetString(PyExc_ValueError, "buffer is not 8-byte aligned");
+        return NULL;
+    }
+    return (volatile PY_LONG_LONG *) slot;
+}
+
+#if PY_MAJOR_VERSION >= 3
+#define BUFFER_ARGS(format) "w*" format
+#define BUFFER_DECLARE Py_buffer view
+#define BUFFER_PARSE &view
+#define BUFFER_DATA view.buf
+#define BUFFER_LENGTH view.len
+#define BUFFER_RELEASE PyBuffer_Release(&view)
+#else
+#define BUFFER_ARGS(format) "w#" format
+#define BUFFER_DECLARE char *buffer; Py_ssize_t length
+#define BUFFER_PARSE &buffer, &length
+#define BUFFER_DATA buffer
+#define BUFFER_LENGTH length
+#define BUFFER_RELEASE
+#endif
+
+/**
+ * Atomically add delta to the 64-bit slot at index.
+ *
+ * Returns the new slot value.
+ */
+static PyObject* atomic_add(PyObject *self, PyObject *args) {
+    BUFFER_DECLARE;
+    Py_ssize_t index;
+    PY_LONG_LONG delta;
+    PY_LONG_LONG result;
+    volatile PY_LONG_LONG *slot;
+
+    if(!PyArg_ParseTuple(args, BUFFER_ARGS("nL"), BUFFER_PARSE, &index, &delta)) {
+        return NULL;
+    }
+    slot = buffer_slot(BUFFER_DATA, BUFFER_LENGTH, index);
+    if(slot == NULL) {
+        BUFFER_RELEASE;
+        return NULL;
+    }
+    result = ATOMIC_ADD_INT64(slot, delta);
+    BUFFER_RELEASE;
+    return PyLong_FromLongLong(result);
+}
+
+/**
+ * Atomically read the 64-bit slot at index.
+ */
+static PyObject* atomic_get(PyObject *self, PyObject *args) {
+    BUFFER_DECLARE;
+    Py_ssize_t index;
+    PY_LONG_LONG result;
+    volatile PY_LONG_LONG *slot;
+
+    if(!PyArg_ParseTuple(args, BUFFER_ARGS("n"), BUFFER_PARSE, &index)) {
+        return NULL;
+    }
+    slot = buffer_slot(BUFFER_DATA, BUFFER_LENGTH, index);
+    if(slot == NULL) {
+        BUFFER_RELEASE;
+        return NULL;
+    }
+    result = ATOMIC_ADD_INT64(slot, 0);
+    BUFFER_RELEASE;
+    return PyLong_FromLongLong(result);
+}
+
+/**
+ * Atomically set the 64-bit slot at index.
+ *
+ * Returns the previous slot value.
+ */
+static PyObject* atomic_set(PyObject *self, PyObject *args) {
+    BUFFER_DECLARE;
+    Py_ssize_t index;
+    PY_LONG_LONG value;
+    PY_LONG_LONG old_value;
+    volatile PY_LONG_LONG *slot;
+
+    if(!PyArg_ParseTuple(args, BUFFER_ARGS("nL"), BUFFER_PARSE, &index, &value)) {
+        return NULL;
+    }
+    slot = buffer_slot(BUFFER_DATA, BUFFER_LENGTH, index);
+    if(slot == NULL) {
+        BUFFER_RELEASE;
+        return NULL;
+    }
+    do {
+        old_value = *slot;
+    } while(!ATOMIC_CAS_INT64(slot, old_value, value));
+    BUFFER_RELEASE;
+    return PyLong_FromLongLong(old_value);
+}
+
+static PyMethodDef module_methods[] = {
+    {"atomic_add", (PyCFunction) atomic_add, METH_VARARGS, "Atomically add to 64-bit buffer slot"},
+    {"atomic_get", (PyCFunction) atomic_get, METH_VARARGS, "Atomically get 64-bit buffer slot"},
+    {"atomic_set", (PyCFunction) atomic_set, METH_VARARGS, "Atomically set 64-bit buffer slot"},
+    {NULL}
+};
+
 #if PY_MAJOR_VERSION >= 3
 #define MOD_ERROR_VAL NULL
 #define MOD_SUCCESS_VAL(val) val
 #define MOD_INIT(name) PyMODINIT_FUNC PyInit__##name(void)
-#define MOD_DEF(ob, name, doc) \
+#define MOD_DEF(ob, name, doc, methods) \
     static struct PyModuleDef moduledef = { \
-        PyModuleDef_HEAD_INIT, name, doc, -1}; \
+        PyModuleDef_HEAD_INIT, name, doc, -1, methods}; \
 ob = PyModule_Create(&moduledef);
 #else
 #define MOD_ERROR_VAL
 #define MOD_SUCCESS_VAL(val)
 #define MOD_INIT(name) void init##name(void)
-#define MOD_DEF(ob, name, doc) \
-    ob = Py_InitModule3(name, NULL, doc);
+#define MOD_DEF(ob, name, doc, methods) \
+    ob = Py_InitModule3(name, methods, doc);
 #endif
 
 MOD_INIT(value) {
     PyObject *m;
 
-    MOD_DEF(m, "value", "Atomic value module");
+    MOD_DEF(m, "value", "Atomic value module", module_methods);
     if (m == NULL) {
         return MOD_ERROR_VAL;
     }
@@ -203,5 +638,13 @@ MOD_INIT(value) {
     Py_INCREF(&AtomicValueType);
     PyModule_AddObject(m, "AtomicValue", (PyObject *) &AtomicValueType);
 
+    AtomicRingBufferType.tp_new = PyType_GenericNew;
+    if (PyType_Ready(&AtomicRingBufferType) < 0) {
+        return MOD_ERROR_VAL;
+    }
+
+    Py_INCREF(&AtomicRingBufferType);
+    PyModule_AddObject(m, "AtomicRingBuffer", (PyObject *) &AtomicRingBufferType);
+
     return MOD_SUCCESS_VAL(m);
 }
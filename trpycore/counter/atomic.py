@@ -196,5 +196,8 @@ class AtomicCounters(Counters):
         Returns:
             dict of the form {name: value}
         """
+        #Only hold the lock long enough to copy the counters, so
+        #that counter creation is not blocked while reading values.
         with self.lock:
-            return {k : v.get() for k,v in self.counters.iteritems()}
+            counters = self.counters.items()
+        return {k : v.get() for k,v in counters}
@@ -151,3 +151,35 @@ class Counters(object):
             dict of the form {name: value}
         """
         return
+
+class Histogram(object):
+    """Histogram abstract base class."""
+    __metaclass__ = abc.ABCMeta
+
+    @abc.abstractmethod
+    def record(self, value, count=1):
+        """Record value in the histogram.
+
+        Args:
+            value: non-negative integer value to record
+            count: optional number of times to record value
+        """
+        return
+
+    @abc.abstractmethod
+    def snapshot(self):
+        """Get a snapshot of the histogram.
+
+        Returns:
+            HistogramSnapshot object
+        """
+        return
+
+    @abc.abstractmethod
+    def reset(self):
+        """Reset histogram, discarding all recorded values.
+
+        Returns:
+            HistogramSnapshot object prior to reset
+        """
+        return
@@ -0,0 +1,260 @@
+import threading
+
+from trpycore.counter.atomic import AtomicCounter
+from trpycore.counter.base import Counters
+from trpycore.datastruct.trie import Trie
+
+#Separator between counter name components, i.e. thrift.method.errors
+NAME_SEPARATOR = "."
+
+#Separator between counter name and tags, i.e. errors;host=a
+TAG_SEPARATOR = ";"
+
+def counter_key(counter_name, tags=None):
+    """Get the canonical key for a counter name and tags.
+
+    Tags are sorted by name so that the same tag set always
+    produces the same key, i.e.
+        counter_key("requests", {"method": "get", "host": "a"})
+    returns "requests;host=a;method=get".
+
+    Args:
+        counter_name: dot separated counter name
+        tags: Optional dict of tag names to values
+    Returns:
+        canonical counter key
+    """
+    if not tags:
+        return counter_name
+    tags = ["%s=%s" % (k, v) for k, v in sorted(tags.iteritems())]
+    return TAG_SEPARATOR.join([counter_name] + tags)
+
+class HierarchicalCounters(Counters):
+    """Hierarchical Counters class.
+
+    This class indexes dot separated counter names, i.e.
+    thrift.method.getUser.errors, in a Trie, so that counters can
+    be aggregated by prefix (sum) or snapshotted by prefix (snapshot)
+    without scanning every counter. Counters can also be tagged, in
+    which case the tags are part of the counter key and can be used
+    to filter aggregations.
+
+    Counter lookups are cached by name and tags, so repeated updates
+    to the same counter do not need to canonicalize or walk the Trie.
+
+    This class is safe for using across multiple threads if the
+    counter_class is (AtomicCounter is used by default).
+    """
+
+    def __init__(self, initial_value=0, counter_names=None, counter_class=AtomicCounter):
+        """HierarchicalCounters constructor.
+
+        Args:
+            initial_value: Optional initial value for new counters
+            counter_names: Optional list of counter_name to
+                create counters during initialization. Otherwise,
+                counters will automatically be created as needed.
+            counter_class: Optional Counter class to use for
+                counters, taking (name, value) constructor args.
+        """
+        self.initial_value = initial_value
+        self.counter_class = counter_class
+        self.lock = threading.Lock()
+        self.trie = Trie()
+        self.counters = {}
+        self.cache = {}
+
+        for counter_name in counter_names or []:
+            self._get_or_create_counter(counter_name)
+
+    def __contains__(self, counter_name):
+        """Check if counter_name is contained within Counters.
+
+        Args:
+            counter_name: counter name or canonical counter key
+        Returns:
+            True if counter_name exists, False otherwise.
+        """
+        return counter_name in self.counters
+
+    def __getitem__(self, counter_name):
+        """Get counter value for counter_name if it exists.
+
+        Args:
+            counter_name: counter name or canonical counter key
+        Returns:
+            Counter value if counter_name exists.
+        Raises:
+            KeyError if counter_name does not exist.
+        """
+        if counter_name not in self.counters:
+            raise KeyError
+        return self.counters[counter_name].get()
+
+    def _get_or_create_counter(self, counter_name, tags=None):
+        """Helper method to get or create counters on demand.
+
+        Args:
+            counter_name: counter name
+            tags: Optional dict of tag names to values
+        Returns:
+            Counter object
+        """
+        if tags:
+            cache_key = (counter_name, tuple(sorted(tags.iteritems())))
+        else:
+            cache_key = counter_name
+
+        try:
+            return self.cache[cache_key]
+        except KeyError:
+            key = counter_key(counter_name, tags)
+            #Double check that counter does not exist
+            #after acquiring the lock
+            with self.lock:
+                if key not in self.counters:
+                    counter = self.counter_class(key, self.initial_value)
+                    self.counters[key] = counter
+                    self.trie.insert(key, counter)
+                counter = self.counters[key]
+                self.cache[cache_key] = counter
+            return counter
+
+    def _find(self, prefix=None, tags=None):
+        """Helper method to find counters by prefix and tags.
+
+        Only counters whose name is prefix, or whose name
+        starts with prefix followed by a separator, match.
+        i.e. the prefix thrift.method matches thrift.method.errors,
+        but not thrift.methods.
+
+        Args:
+            prefix: Optional counter name prefix
+            tags: Optional dict of tags which counters must have
+        Returns:
+            list of (key, Counter) tuples
+        """
+        with self.lock:
+            items = self.trie.find(prefix)
+
+        if prefix:
+            boundary = len(prefix)
+            items = [(k, v) for k, v in items
+                    if len(k) == boundary or k[boundary] in (NAME_SEPARATOR, TAG_SEPARATOR)]
+
+        if tags:
+            required = set("%s=%s" % (k, v) for k, v in tags.iteritems())
+            items = [(k, v) for k, v in items
+                    if required.issubset(k.split(TAG_SEPARATOR)[1:])]
+        return items
+
+    def get_counter(self, counter_name, tags=None):
+        """Get Counter object.
+
+        If the Counter object does not exist, It will created
+        and initialized with initial_value.
+
+        Args:
+            counter_name: counter name
+            tags: Optional dict of tag names to values
+        Returns:
+            Counter object
+        """
+        return self._get_or_create_counter(counter_name, tags)
+
+    def get(self, counter_name, tags=None):
+        """Get counter value.
+
+        If the Counter object does not exist, It will created
+        and initialized with initial_value.
+
+        Args:
+            counter_name: counter name
+            tags: Optional dict of tag names to values
+        Returns:
+            current counter value
+        """
+        return self._get_or_create_counter(counter_name, tags).get()
+
+    def set(self, counter_name, value, tags=None):
+        """Set counter value.
+
+        If the Counter object does not exist, It will created
+        and initialized with initial_value, and then
+        set to the given value.
+
+        Args:
+            counter_name: counter name
+            value: new counter value
+            tags: Optional dict of tag names to values
+        Returns:
+            previous counter value
+        """
+        return self._get_or_create_counter(counter_name, tags).set(value)
+
+    def increment(self, counter_name, n=1, tags=None):
+        """Increment counter value by n.
+
+        If the Counter object does not exist, It will created
+        and initialized with initial_value, and then
+        incremented by n.
+
+        Args:
+            counter_name: counter name
+            n: Optional value to increment counter by
+            tags: Optional dict of tag names to values
+        Returns:
+            new counter value
+        """
+        return self._get_or_create_counter(counter_name, tags).increment(n)
+
+    def decrement(self, counter_name, n=1, tags=None):
+        """Decrement counter value by n.
+
+        If the Counter object does not exist, It will created
+        and initialized with initial_value, and then
+        decremented by n.
+
+        Args:
+            counter_name: counter name
+            n: Optional value to decrement counter by
+            tags: Optional dict of tag names to values
+        Returns:
+            new counter value
+        """
+        return self._get_or_create_counter(counter_name, tags).decrement(n)
+
+    def sum(self, prefix=None, tags=None):
+        """Sum counters by prefix and tags.
+
+        Args:
+            prefix: Optional counter name prefix, i.e. thrift.method
+                to sum all thrift.method.* counters.
+            tags: Optional dict of tags which counters must
+                have to be included in the sum.
+        Returns:
+            sum of matching counter values
+        """
+        return sum(counter.get() for key, counter in self._find(prefix, tags))
+
+    def snapshot(self, prefix=None, tags=None):
+        """Snapshot counters by prefix and tags.
+
+        Args:
+            prefix: Optional counter name prefix
+            tags: Optional dict of tags which counters must
+                have to be included in the snapshot.
+        Returns:
+            dict of the form {key: value}
+        """
+        return {key: counter.get() for key, counter in self._find(prefix, tags)}
+
+    def as_dict(self):
+        """Return counters as dict of the form {key: value}.
+
+        Returns:
+            dict of the form {key: value}
+        """
+        with self.lock:
+            counters = self.counters.items()
+        return {k : v.get() for k,v in counters}
@@ -0,0 +1,342 @@
+import array
+import threading
+
+from trpycore.counter.base import Histogram
+
+class HistogramLayout(object):
+    """Log-linear histogram bucket layout.
+
+    Values are bucketed in the style of HDR histograms. Values below
+    2**precision_bits are recorded exactly. Above that, each power
+    of 2 range is divided into 2**(precision_bits-1) linear sub-buckets,
+    so the relative error of any recorded value is bounded by
+    1 / 2**(precision_bits-1), while the number of buckets only grows
+    logarithmically with max_value.
+    """
+
+    def __init__(self, max_value, precision_bits):
+        """HistogramLayout constructor.
+
+        Args:
+            max_value: maximum trackable value. Larger values
+                will be recorded in the last bucket.
+            precision_bits: number of bits of precision.
+        """
+        if precision_bits < 1:
+            raise ValueError("precision_bits must be at least 1")
+        self.max_value = max_value
+        self.precision_bits = precision_bits
+        self.sub_bucket_count = 1 << precision_bits
+        self.sub_bucket_half_count = self.sub_bucket_count >> 1
+        self.bucket_count = self.index(max_value) + 1
+
+    def __eq__(self, other):
+        return self.max_value == other.max_value and \
+                self.precision_bits == other.precision_bits
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def index(self, value):
+        """Get bucket index for value.
+
+        Args:
+            value: non-negative integer value
+        Returns:
+            bucket index
+        """
+        if value < self.sub_bucket_count:
+            return value
+        shift = value.bit_length() - self.precision_bits
+        return self.sub_bucket_count + \
+                (shift - 1) * self.sub_bucket_half_count + \
+                (value >> shift) - self.sub_bucket_half_count
+
+    def lowest_value(self, index):
+        """Get the lowest value recorded in the bucket at index.
+
+        Args:
+            index: bucket index
+        Returns:
+            lowest value equivalent to the bucket
+        """
+        if index < self.sub_bucket_count:
+            return index
+        shift, offset = divmod(index - self.sub_bucket_count, self.sub_bucket_half_count)
+        return (self.sub_bucket_half_count + offset) << (shift + 1)
+
+    def highest_value(self, index):
+        """Get the highest value recorded in the bucket at index.
+
+        Args:
+            index: bucket index
+        Returns:
+            highest value equivalent to the bucket
+        """
+        if index < self.sub_bucket_count:
+            return index
+        shift, offset = divmod(index - self.sub_bucket_count, self.sub_bucket_half_count)
+        return ((self.sub_bucket_half_count + offset + 1) << (shift + 1)) - 1
+
+class HistogramSnapshot(object):
+    """Immutable point in time snapshot of a histogram.
+
+    Snapshots with the same layout can be merged, which allows
+    histograms to be aggregated across threads, processes, or
+    reporting intervals.
+    """
+
+    def __init__(self, layout, counts, count=0, total=0, min=None, max=None):
+        """HistogramSnapshot constructor.
+
+        Args:
+            layout: HistogramLayout object
+            counts: sequence of bucket counts
+            count: total number of recorded values
+            total: sum of all recorded values
+            min: minimum recorded value
+            max: maximum recorded value
+        """
+        self.layout = layout
+        self.counts = counts
+        self.count = count
+        self.total = total
+        self.min = min
+        self.max = max
+
+    def merge(self, other):
+        """Merge with another snapshot.
+
+        Args:
+            other: HistogramSnapshot with the same layout.
+        Returns:
+            new HistogramSnapshot containing values from both snapshots.
+        Raises:
+            ValueError if the snapshot layouts differ.
+        """
+        if self.layout != other.layout:
+            raise ValueError("unable to merge histograms with different layouts")
+
+        counts = array.array("l", self.counts)
+        for index, count in enumerate(other.counts):
+            if count:
+                counts[index] += count
+
+        mins = [v for v in (self.min, other.min) if v is not None]
+        maxes = [v for v in (self.max, other.max) if v is not None]
+        return HistogramSnapshot(
+                layout=self.layout,
+                counts=counts,
+                count=self.count + other.count,
+                total=self.total + other.total,
+                min=min(mins) if mins else None,
+                max=max(maxes) if maxes else None)
+
+    def mean(self):
+        """Get the mean of the recorded values.
+
+        Returns:
+            mean value, or 0 if no values have been recorded.
+        """
+        if not self.count:
+            return 0
+        return float(self.total) / self.count
+
+    def percentile(self, percentile):
+        """Get the value at the given percentile.
+
+        The returned value is the highest value equivalent to
+        the bucket containing the percentile, capped at the
+        maximum recorded value. Since values larger than max_value
+        are recorded in the last bucket, percentiles falling in
+        the last bucket return the maximum recorded value.
+
+        Args:
+            percentile: percentile between 0 and 100.
+        Returns:
+            value at percentile, or 0 if no values have been recorded.
+        """
+        if not self.count:
+            return 0
+        percentile = min(max(percentile, 0), 100)
+        target = max(1, int(round(self.count * percentile / 100.0)))
+
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= target:
+                if index == self.layout.bucket_count - 1:
+                    return self.max
+                return min(self.layout.highest_value(index), self.max)
+        return self.max
+
+    def percentiles(self, percentiles):
+        """Get the values at the given percentiles.
+
+        Args:
+            percentiles: list of percentiles between 0 and 100.
+        Returns:
+            dict of the form {percentile: value}
+        """
+        return {p: self.percentile(p) for p in percentiles}
+
+    def as_dict(self):
+        """Return summary statistics as a dict.
+
+        Returns:
+            dict containing count, min, max, mean, and
+            the 50th, 90th, 99th, and 99.9th percentiles.
+        """
+        return {
+            "count": self.count,
+            "min": self.min or 0,
+            "max": self.max or 0,
+            "mean": self.mean(),
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "p999": self.percentile(99.9)
+        }
+
+class BasicHistogram(Histogram):
+    """Non-threadsafe Histogram class.
+
+    This class records non-negative integer values, i.e. latencies in
+    microseconds, into log-linear buckets (see HistogramLayout). Memory
+    is bounded and fixed at construction, and bucket counts are kept
+    in a preallocated array so recording does not allocate buckets.
+
+    This class is not threadsafe and should be used accordingly.
+    """
+
+    def __init__(self, name, max_value=3600000000, precision_bits=7):
+        """BasicHistogram constructor.
+
+        Args:
+            name: histogram name
+            max_value: Optional maximum trackable value. Larger
+                values will be recorded in the last bucket. Defaults
+                to 1 hour in microseconds.
+            precision_bits: Optional number of bits of precision.
+                The default of 7 bounds the relative error of recorded
+                values to less than 2%.
+        """
+        self.name = name
+        self.layout = HistogramLayout(max_value, precision_bits)
+        self.counts = array.array("l", [0] * self.layout.bucket_count)
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def record(self, value, count=1):
+        """Record value in the histogram.
+
+        Args:
+            value: non-negative integer value to record
+            count: optional number of times to record value
+        Raises:
+            ValueError if value is negative.
+        """
+        value = int(value)
+        if value < 0:
+            raise ValueError("histogram value must be non-negative")
+
+        if value > self.layout.max_value:
+            index = self.layout.bucket_count - 1
+        else:
+            index = self.layout.index(value)
+
+        self.counts[index] += count
+        self.count += count
+        self.total += value * count
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def snapshot(self):
+        """Get a snapshot of the histogram.
+
+        Returns:
+            HistogramSnapshot object
+        """
+        return HistogramSnapshot(
+                layout=self.layout,
+                counts=array.array("l", self.counts),
+                count=self.count,
+                total=self.total,
+                min=self.min,
+                max=self.max)
+
+    def reset(self):
+        """Reset histogram, discarding all recorded values.
+
+        Returns:
+            HistogramSnapshot object prior to reset
+        """
+        snapshot = HistogramSnapshot(
+                layout=self.layout,
+                counts=self.counts,
+                count=self.count,
+                total=self.total,
+                min=self.min,
+                max=self.max)
+        self.counts = array.array("l", [0] * self.layout.bucket_count)
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+        return snapshot
+
+class AtomicHistogram(BasicHistogram):
+    """Atomic Histogram class.
+
+    This class ensure atomic operations and is safe for using across
+    multiple threads.
+    """
+
+    def __init__(self, name, max_value=3600000000, precision_bits=7):
+        """AtomicHistogram constructor.
+
+        Args:
+            name: histogram name
+            max_value: Optional maximum trackable value. Larger
+                values will be recorded in the last bucket. Defaults
+                to 1 hour in microseconds.
+            precision_bits: Optional number of bits of precision.
+                The default of 7 bounds the relative error of recorded
+                values to less than 2%.
+        """
+        super(AtomicHistogram, self).__init__(name, max_value, precision_bits)
+        self.lock = threading.Lock()
+
+    def record(self, value, count=1):
+        """Record value in the histogram.
+
+        Args:
+            value: non-negative integer value to record
+            count: optional number of times to record value
+        Raises:
+            ValueError if value is negative.
+        """
+        with self.lock:
+            super(AtomicHistogram, self).record(value, count)
+
+    def snapshot(self):
+        """Get a snapshot of the histogram.
+
+        Returns:
+            HistogramSnapshot object
+        """
+        with self.lock:
+            return super(AtomicHistogram, self).snapshot()
+
+    def reset(self):
+        """Reset histogram, discarding all recorded values.
+
+        Returns:
+            HistogramSnapshot object prior to reset
+        """
+        with self.lock:
+            return super(AtomicHistogram, self).reset()
@@ -0,0 +1,331 @@
+import math
+import threading
+import time
+
+from trpycore.counter.base import Counter
+
+class EWMA(object):
+    """Exponentially weighted moving average rate.
+
+    EWMA is not threadsafe on its own, and is intended to be
+    ticked at a fixed interval by its owner (see Meter).
+    """
+
+    def __init__(self, minutes, tick_interval=5):
+        """EWMA constructor.
+
+        Args:
+            minutes: number of minutes the average represents
+            tick_interval: interval in seconds between ticks
+        """
+        self.minutes = minutes
+        self.tick_interval = tick_interval
+        self.alpha = 1 - math.exp(-float(tick_interval) / 60 / minutes)
+        self.rate = 0.0
+        self.uncounted = 0
+        self.initialized = False
+
+    def update(self, n=1):
+        """Update the average with n new events.
+
+        Args:
+            n: number of events
+        """
+        self.uncounted += n
+
+    def tick(self, ticks=1):
+        """Tick the average, decaying the rate.
+
+        The first tick accounts for events since the previous
+        tick, while any additional ticks represent intervals
+        with no events, so they are applied in constant time.
+
+        Args:
+            ticks: number of elapsed tick intervals
+        """
+        if ticks <= 0:
+            return
+        instant_rate = float(self.uncounted) / self.tick_interval
+        self.uncounted = 0
+        if self.initialized:
+            self.rate += self.alpha * (instant_rate - self.rate)
+        else:
+            self.rate = instant_rate
+            self.initialized = True
+        if ticks > 1:
+            self.rate *= (1 - self.alpha) ** (ticks - 1)
+
+    def get_rate(self):
+        """Get the rate in events per second.
+
+        Returns:
+            rate in events per second.
+        """
+        return self.rate
+
+class Meter(object):
+    """Meter class measuring event rates.
+
+    Meter tracks the total count and mean rate of events, along with
+    1, 5, and 15 minute exponentially weighted moving average rates.
+
+    The moving averages are ticked lazily when the meter is marked
+    or read, so meters do not require a dedicated thread.
+
+    This class is safe for using across multiple threads.
+    """
+
+    def __init__(self, name, tick_interval=5, clock=time.time):
+        """Meter constructor.
+
+        Args:
+            name: meter name
+            tick_interval: Optional interval in seconds between
+                moving average ticks.
+            clock: Optional no-arg callable returning the
+                current time in seconds.
+        """
+        self.name = name
+        self.tick_interval = tick_interval
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.count = 0
+        self.start_time = self.clock()
+        self.last_tick = self.start_time
+        self.m1_rate = EWMA(1, tick_interval)
+        self.m5_rate = EWMA(5, tick_interval)
+        self.m15_rate = EWMA(15, tick_interval)
+
+    def _tick_if_necessary(self, now):
+        """Helper method to tick moving averages if intervals have elapsed.
+
+        Must be called while holding the lock.
+
+        Args:
+            now: current time in seconds
+        """
+        ticks = int((now - self.last_tick) / self.tick_interval)
+        if ticks > 0:
+            self.last_tick += ticks * self.tick_interval
+            self.m1_rate.tick(ticks)
+            self.m5_rate.tick(ticks)
+            self.m15_rate.tick(ticks)
+
+    def tick(self):
+        """Tick moving averages if intervals have elapsed.
+
+        This is called automatically when the meter is marked
+        or read, but may also be called periodically to keep
+        averages up to date for infrequently used meters.
+        """
+        with self.lock:
+            self._tick_if_necessary(self.clock())
+
+    def mark(self, n=1):
+        """Mark the occurrence of n events.
+
+        Args:
+            n: optional number of events
+        """
+        with self.lock:
+            self._tick_if_necessary(self.clock())
+            self.count += n
+            self.m1_rate.update(n)
+            self.m5_rate.update(n)
+            self.m15_rate.update(n)
+
+    def get_count(self):
+        """Get total number of events.
+
+        Returns:
+            total number of events
+        """
+        return self.count
+
+    def mean_rate(self):
+        """Get mean rate since the meter was created.
+
+        Returns:
+            mean rate in events per second
+        """
+        elapsed = self.clock() - self.start_time
+        if elapsed <= 0:
+            return 0.0
+        return self.count / elapsed
+
+    def one_minute_rate(self):
+        """Get one minute exponentially weighted moving average rate.
+
+        Returns:
+            rate in events per second
+        """
+        with self.lock:
+            self._tick_if_necessary(self.clock())
+            return self.m1_rate.get_rate()
+
+    def five_minute_rate(self):
+        """Get five minute exponentially weighted moving average rate.
+
+        Returns:
+            rate in events per second
+        """
+        with self.lock:
+            self._tick_if_necessary(self.clock())
+            return self.m5_rate.get_rate()
+
+    def fifteen_minute_rate(self):
+        """Get fifteen minute exponentially weighted moving average rate.
+
+        Returns:
+            rate in events per second
+        """
+        with self.lock:
+            self._tick_if_necessary(self.clock())
+            return self.m15_rate.get_rate()
+
+    def as_dict(self):
+        """Return meter values as a dict.
+
+        Returns:
+            dict containing count, mean_rate, m1_rate,
+            m5_rate, and m15_rate.
+        """
+        with self.lock:
+            self._tick_if_necessary(self.clock())
+            return {
+                "count": self.count,
+                "mean_rate": self.mean_rate(),
+                "m1_rate": self.m1_rate.get_rate(),
+                "m5_rate": self.m5_rate.get_rate(),
+                "m15_rate": self.m15_rate.get_rate()
+            }
+
+class SlidingWindowCounter(Counter):
+    """Sliding window Counter class.
+
+    SlidingWindowCounter maintains the sum of values over the most
+    recent window of time, i.e. errors in the last 5 minutes. The window
+    is divided into a ring buffer of time buckets, and buckets which
+    fall out of the window are expired lazily as the counter is used,
+    so the counter does not require a dedicated thread.
+
+    Incrementing is O(1), and reading the windowed sum is O(1) since
+    a running total is maintained as buckets are expired.
+
+    This class is safe for using across multiple threads.
+    """
+
+    def __init__(self, name, window=60, buckets=60, clock=time.time):
+        """SlidingWindowCounter constructor.
+
+        Args:
+            name: counter name
+            window: Optional window size in seconds
+            buckets: Optional number of buckets to divide window into.
+                More buckets provide a more accurate window at the
+                expense of memory.
+            clock: Optional no-arg callable returning the
+                current time in seconds.
+        """
+        self.name = name
+        self.window = window
+        self.bucket_width = float(window) / buckets
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.buckets = [0] * buckets
+        self.total = 0
+        self.current_tick = int(self.clock() / self.bucket_width)
+
+    def _advance(self, now):
+        """Helper method to expire buckets which have left the window.
+
+        Must be called while holding the lock.
+
+        Args:
+            now: current time in seconds
+        Returns:
+            index of the current bucket
+        """
+        tick = int(now / self.bucket_width)
+        if tick > self.current_tick:
+            expired = min(tick - self.current_tick, len(self.buckets))
+            for i in range(1, expired + 1):
+                index = (self.current_tick + i) % len(self.buckets)
+                self.total -= self.buckets[index]
+                self.buckets[index] = 0
+            self.current_tick = tick
+        return self.current_tick % len(self.buckets)
+
+    def get(self):
+        """Get sum of values within the window.
+
+        Returns:
+            windowed counter value
+        """
+        with self.lock:
+            self._advance(self.clock())
+            return self.total
+
+    def set(self, value):
+        """Set counter value.
+
+        Clears the window and records value in the current bucket.
+
+        Args:
+            value: new counter value
+        Returns:
+            previous counter value
+        """
+        with self.lock:
+            index = self._advance(self.clock())
+            old_value = self.total
+            self.buckets = [0] * len(self.buckets)
+            self.buckets[index] = value
+            self.total = value
+            return old_value
+
+    def increment(self, n=1):
+        """Increment counter value by n.
+
+        Args:
+            n: optional value to increment counter by
+        Returns:
+            new counter value.
+        """
+        with self.lock:
+            index = self._advance(self.clock())
+            self.buckets[index] += n
+            self.total += n
+            return self.total
+
+    def decrement(self, n=1):
+        """Decrement counter value by n.
+
+        Args:
+            n: optional value to decrement counter by
+        Returns:
+            new counter value.
+        """
+        with self.lock:
+            index = self._advance(self.clock())
+            self.buckets[index] -= n
+            self.total -= n
+            return self.total
+
+    def mark(self, n=1):
+        """Mark the occurrence of n events.
+
+        Equivalent to increment(n).
+
+        Args:
+            n: optional number of events
+        """
+        self.increment(n)
+
+    def rate(self):
+        """Get the rate of events per second within the window.
+
+        Returns:
+            rate in events per second
+        """
+        return float(self.get()) / self.window
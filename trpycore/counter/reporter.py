@@ -0,0 +1,222 @@
+import abc
+import logging
+import socket
+import threading
+import time
+
+class Sink(object):
+    """Reporter sink abstract base class."""
+    __metaclass__ = abc.ABCMeta
+
+    @abc.abstractmethod
+    def write(self, batch):
+        """Write a batch of counter values.
+
+        Args:
+            batch: list of (name, value, timestamp) tuples
+        """
+        return
+
+    def close(self):
+        """Close the sink."""
+        return
+
+class FileSink(Sink):
+    """Line protocol file sink.
+
+    Writes each counter value as a line of the form:
+        <name> <value> <timestamp>
+    """
+
+    def __init__(self, path):
+        """FileSink constructor.
+
+        Args:
+            path: path of file to append counter values to
+        """
+        self.path = path
+        self.file = open(path, "a")
+
+    def write(self, batch):
+        """Write a batch of counter values.
+
+        Args:
+            batch: list of (name, value, timestamp) tuples
+        """
+        lines = ["%s %s %d\n" % (name, value, timestamp) for name, value, timestamp in batch]
+        self.file.write("".join(lines))
+        self.file.flush()
+
+    def close(self):
+        """Close the sink."""
+        self.file.close()
+
+class StatsdSink(Sink):
+    """Statsd UDP sink.
+
+    Writes counter values as statsd counters (<name>:<value>|c),
+    batching multiple counters per datagram, up to max_packet_size.
+    """
+
+    def __init__(self, host="localhost", port=8125, max_packet_size=512):
+        """StatsdSink constructor.
+
+        Args:
+            host: statsd host
+            port: statsd port
+            max_packet_size: maximum datagram size in bytes
+        """
+        self.address = (host, port)
+        self.max_packet_size = max_packet_size
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def write(self, batch):
+        """Write a batch of counter values.
+
+        Args:
+            batch: list of (name, value, timestamp) tuples
+        """
+        packet = []
+        packet_size = 0
+        for name, value, timestamp in batch:
+            line = "%s:%s|c" % (name, value)
+            if packet and packet_size + len(line) + 1 > self.max_packet_size:
+                self._send(packet)
+                packet = []
+                packet_size = 0
+            packet.append(line)
+            packet_size += len(line) + 1
+        if packet:
+            self._send(packet)
+
+    def _send(self, packet):
+        """Helper method to send a datagram.
+
+        Args:
+            packet: list of statsd lines
+        """
+        try:
+            self.socket.sendto("\n".join(packet), self.address)
+        except socket.error as error:
+            logging.warning("unable to send counters to statsd: %s" % str(error))
+
+    def close(self):
+        """Close the sink."""
+        self.socket.close()
+
+class CallbackSink(Sink):
+    """Callback sink.
+
+    Passes each batch of counter values to a callback.
+    """
+
+    def __init__(self, callback):
+        """CallbackSink constructor.
+
+        Args:
+            callback: callable taking a list of (name, value, timestamp)
+                tuples as its sole argument.
+        """
+        self.callback = callback
+
+    def write(self, batch):
+        """Write a batch of counter values.
+
+        Args:
+            batch: list of (name, value, timestamp) tuples
+        """
+        self.callback(batch)
+
+class CounterReporter(threading.Thread):
+    """Counter reporter thread.
+
+    Periodically snapshots a Counters object and writes the deltas
+    since the previous snapshot to a Sink. Snapshots are taken with
+    Counters.as_dict(), which does not block counter updates, and
+    all formatting and I/O happens in the reporter thread, so the
+    hot path is never blocked by exporting.
+
+    Usage:
+        reporter = CounterReporter(counters, StatsdSink(), interval=10)
+        reporter.start()
+        ...
+        reporter.stop()
+        reporter.join()
+    """
+
+    def __init__(self, counters, sink, interval=10, prefix=None, deltas=True, daemon=True):
+        """CounterReporter constructor.
+
+        Args:
+            counters: Counters object to report
+            sink: Sink object to write counter values to
+            interval: Optional reporting interval in seconds
+            prefix: Optional prefix to prepend to counter names
+            deltas: Optional boolean indicating that the change
+                in value since the last snapshot should be reported,
+                otherwise absolute values will be reported.
+                Unchanged counters are not reported in delta mode.
+            daemon: if True make a daemon thread
+        """
+        super(CounterReporter, self).__init__()
+        self.daemon = daemon
+        self.counters = counters
+        self.sink = sink
+        self.interval = interval
+        self.prefix = "%s." % prefix if prefix else ""
+        self.deltas = deltas
+        self.previous = {}
+        self.stop_event = threading.Event()
+
+    def _batch(self, current, timestamp):
+        """Compute values to report relative to the last reported snapshot.
+
+        Args:
+            current: dict of counter name to value
+            timestamp: snapshot timestamp in seconds
+        Returns:
+            list of (name, value, timestamp) tuples
+        """
+        batch = []
+        if self.deltas:
+            previous = self.previous
+            for name, value in current.iteritems():
+                delta = value - previous.get(name, 0)
+                if delta:
+                    batch.append((self.prefix + name, delta, timestamp))
+        else:
+            for name, value in current.iteritems():
+                batch.append((self.prefix + name, value, timestamp))
+        return batch
+
+    def report(self):
+        """Snapshot counters and write them to the sink.
+
+        If the sink raises an exception, the snapshot is not
+        recorded as reported, so that in delta mode, the deltas
+        are included in the next report rather than lost.
+        """
+        current = self.counters.as_dict()
+        batch = self._batch(current, int(time.time()))
+        if batch:
+            self.sink.write(batch)
+        self.previous = current
+
+    def run(self):
+        """Reporter run method."""
+        stopping = False
+        while not stopping:
+            self.stop_event.wait(self.interval)
+            stopping = self.stop_event.is_set()
+            try:
+                self.report()
+            except Exception as error:
+                logging.exception(error)
+        self.sink.close()
+
+    def stop(self):
+        """Stop the reporter.
+
+        A final report will be made prior to the reporter exiting.
+        """
+        self.stop_event.set()
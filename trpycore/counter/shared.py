@@ -0,0 +1,303 @@
+import errno
+import json
+import mmap
+import os
+import struct
+import tempfile
+
+from trpycore.atomic.value import atomic_add, atomic_get, atomic_set
+from trpycore.counter.base import Counter, Counters
+
+#Shared counters file format:
+#   header: magic (8 bytes), slot count (8 bytes), table size (8 bytes)
+#   table: json encoded list of counter names, padded to 8 bytes
+#   slots: 64-bit signed integer counter values
+MAGIC = "TRCNTR01"
+HEADER_FORMAT = "<8sQQ"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+SLOT_SIZE = 8
+
+class SharedCounter(Counter):
+    """Shared memory Counter class.
+
+    Counter backed by a 64-bit slot in a SharedCounters memory
+    map. All operations are atomic across threads and processes.
+    """
+
+    def __init__(self, name, shared_counters, slot):
+        """SharedCounter constructor.
+
+        Args:
+            name: counter name
+            shared_counters: SharedCounters object owning the
+                memory map.
+            slot: slot index of the counter within the memory map.
+        """
+        self.name = name
+        self.shared_counters = shared_counters
+        self.slot = slot
+
+    def get(self):
+        """Get current counter value.
+
+        Returns:
+            current counter value
+        """
+        return atomic_get(self.shared_counters.mmap, self.slot)
+
+    def set(self, value):
+        """Set counter value.
+
+        Args:
+            value: new counter value
+        Returns:
+            previous counter value
+        """
+        return atomic_set(self.shared_counters.mmap, self.slot, value)
+
+    def increment(self, n=1):
+        """Increment counter value by n.
+
+        Args:
+            n: optional value to increment counter by
+        Returns:
+            new counter value.
+        """
+        return atomic_add(self.shared_counters.mmap, self.slot, n)
+
+    def decrement(self, n=1):
+        """Decrement counter value by n.
+
+        Args:
+            n: optional value to decrement counter by
+        Returns:
+            new counter value.
+        """
+        return atomic_add(self.shared_counters.mmap, self.slot, -n)
+
+class SharedCounters(Counters):
+    """Shared memory Counters class.
+
+    This class stores counters in a memory mapped file, by default
+    under /dev/shm, so that counters can be shared across processes,
+    i.e. prefork worker processes started through process.daemon.
+    Each process increments the same 64-bit cells atomically, and
+    a supervisor process can read service-wide totals directly
+    from the shared memory without any IPC.
+
+    The set of counters is fixed when the file is created, and the
+    name to slot table is stored in the file itself, so processes
+    can attach to existing counters by name alone. Unlike other
+    Counters implementations, counters are not created on demand,
+    and accessing an unknown counter raises a KeyError.
+
+    Usage:
+        #supervisor, prior to forking workers
+        counters = SharedCounters("myservice", ["requests", "errors"])
+
+        #worker processes
+        counters = SharedCounters("myservice")
+        counters.increment("requests")
+    """
+
+    def __init__(self, name, counter_names=None, initial_value=0, directory="/dev/shm"):
+        """SharedCounters constructor.
+
+        If counter_names are provided and the shared counters file
+        does not exist, it will be created. Otherwise the existing
+        file will be attached.
+
+        Args:
+            name: shared counters name, used as the file name
+            counter_names: Optional list of counter names. Required
+                to create the shared counters file.
+            initial_value: Optional initial value for counters
+                when the shared counters file is created.
+            directory: Optional directory to store the shared
+                counters file in.
+        Raises:
+            IOError/OSError if the file does not exist and
+            counter_names were not provided.
+            ValueError if the file is invalid or its counter names
+            do not match counter_names.
+        """
+        self.name = name
+        self.path = os.path.join(directory, name)
+        self.initial_value = initial_value
+
+        if counter_names is not None and not os.path.exists(self.path):
+            self._create(list(counter_names))
+
+        with open(self.path, "r+b") as f:
+            self.mmap = mmap.mmap(f.fileno(), 0)
+
+        self.counter_names = self._read_table()
+        if counter_names is not None and list(counter_names) != self.counter_names:
+            self.close()
+            raise ValueError("shared counters %s exist with different counter names" % self.path)
+
+        self.counters = {}
+        for slot, counter_name in enumerate(self.counter_names):
+            self.counters[counter_name] = SharedCounter(counter_name, self, self.slot_offset + slot)
+
+    def _create(self, counter_names):
+        """Helper method to create the shared counters file.
+
+        The file is fully written to a temporary file prior to
+        being linked into place, so other processes will never
+        attach to a partially written file.
+
+        Args:
+            counter_names: list of counter names
+        """
+        table = json.dumps(counter_names)
+        table += " " * (-len(table) % SLOT_SIZE)
+        header = struct.pack(HEADER_FORMAT, MAGIC, len(counter_names), len(table))
+        slots = struct.pack("<%dq" % len(counter_names),
+                *([self.initial_value] * len(counter_names)))
+
+        directory = os.path.dirname(self.path)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".%s." % self.name)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(header)
+                f.write(table)
+                f.write(slots)
+            try:
+                os.link(temp_path, self.path)
+            except OSError as error:
+                #Another process created the file first
+                if error.errno != errno.EEXIST:
+                    raise
+        finally:
+            os.unlink(temp_path)
+
+    def _read_table(self):
+        """Helper method to read the name to slot table.
+
+        Returns:
+            list of counter names ordered by slot.
+        Raises:
+            ValueError if the file is invalid.
+        """
+        magic, slot_count, table_size = struct.unpack(
+                HEADER_FORMAT, self.mmap[:HEADER_SIZE])
+        if magic != MAGIC:
+            raise ValueError("invalid shared counters file %s" % self.path)
+
+        table = self.mmap[HEADER_SIZE:HEADER_SIZE + table_size]
+        counter_names = [str(n) for n in json.loads(table)]
+        if len(counter_names) != slot_count:
+            raise ValueError("invalid shared counters file %s" % self.path)
+
+        #Slot index of the first counter
+        self.slot_offset = (HEADER_SIZE + table_size) / SLOT_SIZE
+        return counter_names
+
+    def __contains__(self, counter_name):
+        """Check if counter_name is contained within Counters.
+
+        Returns:
+            True if counter_name exists, False otherwise.
+        """
+        return counter_name in self.counters
+
+    def __getitem__(self, counter_name):
+        """Get counter value for counter_name if it exists.
+
+        Returns:
+            Counter value if counter_name exists.
+        Raises:
+            KeyError if counter_name does not exist.
+        """
+        return self.counters[counter_name].get()
+
+    def get_counter(self, counter_name):
+        """Get Counter object.
+
+        Args:
+            counter_name: counter name
+        Returns:
+            Counter object
+        Raises:
+            KeyError if counter_name does not exist.
+        """
+        return self.counters[counter_name]
+
+    def get(self, counter_name):
+        """Get counter value.
+
+        Args:
+            counter_name: counter name
+        Returns:
+            current counter value
+        Raises:
+            KeyError if counter_name does not exist.
+        """
+        return self.counters[counter_name].get()
+
+    def set(self, counter_name, value):
+        """Set counter value.
+
+        Args:
+            counter_name: counter name
+            value: new counter value
+        Returns:
+            previous counter value
+        Raises:
+            KeyError if counter_name does not exist.
+        """
+        return self.counters[counter_name].set(value)
+
+    def increment(self, counter_name, n=1):
+        """Increment counter value by n.
+
+        Args:
+            counter_name: counter name
+            n: Optional value to increment counter by
+        Returns:
+            new counter value
+        Raises:
+            KeyError if counter_name does not exist.
+        """
+        return self.counters[counter_name].increment(n)
+
+    def decrement(self, counter_name, n=1):
+        """Decrement counter value by n.
+
+        Args:
+            counter_name: counter name
+            n: Optional value to decrement counter by
+        Returns:
+            new counter value
+        Raises:
+            KeyError if counter_name does not exist.
+        """
+        return self.counters[counter_name].decrement(n)
+
+    def as_dict(self):
+        """Return counters as dict of the form {name: value}.
+
+        Returns:
+            dict of the form {name: value}
+        """
+        return {k : v.get() for k,v in self.counters.iteritems()}
+
+    def close(self):
+        """Close the memory map.
+
+        Counters must not be used after they are closed.
+        """
+        self.mmap.close()
+
+    def unlink(self):
+        """Remove the shared counters file.
+
+        Processes which have already attached will continue
+        to share the existing counters until they are closed.
+        """
+        try:
+            os.unlink(self.path)
+        except OSError as error:
+            if error.errno != errno.ENOENT:
+                raise
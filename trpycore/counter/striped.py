@@ -0,0 +1,279 @@
+import threading
+import weakref
+
+from trpycore.counter.base import Counter, Counters
+
+class _CellOwner(object):
+    """Thread local owner of a counter cell.
+
+    Instances are stored in thread local storage, so they are
+    destroyed when the owning thread (or greenlet) exits, which
+    allows the owned cell to be folded back into the counter.
+    """
+    __slots__ = ["cell", "__weakref__"]
+
+    def __init__(self, cell):
+        self.cell = cell
+
+class StripedCounter(Counter):
+    """Striped Counter class.
+
+    This class shards the counter value across cells, one per thread
+    (or greenlet), which are summed when the counter is read. Each cell
+    is only ever written by its owning thread, so increments and
+    decrements are nearly contention-free, at the expense of more
+    expensive reads. This makes it well suited for hot counters which
+    are written far more often than they are read.
+
+    When a thread exits, its cell is folded back into the counter's
+    base value, so memory does not grow with short-lived threads.
+
+    Note that unlike other Counter implementations, increment() and
+    decrement() do not return the new counter value, since computing
+    it would require reading every cell.
+    """
+
+    def __init__(self, name, value=0, local_class=threading.local):
+        """StripedCounter constructor.
+
+        Args:
+            name: counter name
+            value: Optional initial counter value
+            local_class: Optional local storage class used to
+                determine stripes. threading.local is used by
+                default, gevent.local.local can be provided to
+                stripe per greenlet.
+        """
+        self.name = name
+        self.base = value
+        self.cells = {}
+        self.local = local_class()
+
+        #Reentrant since cells are folded by weakref callbacks, which
+        #may run during garbage collection or thread local teardown
+        #while the lock is held by the same thread.
+        self.lock = threading.RLock()
+
+    def _create_cell(self):
+        """Helper method to create the cell for the current thread.
+
+        Returns:
+            cell, single item list containing the thread's contribution.
+        """
+        cell = [0]
+        owner = _CellOwner(cell)
+
+        def fold(ref):
+            #Owning thread exited, fold cell into base value
+            with self.lock:
+                cell = self.cells.pop(ref)
+                self.base += cell[0]
+
+        with self.lock:
+            self.cells[weakref.ref(owner, fold)] = cell
+        self.local.owner = owner
+        return cell
+
+    def get(self):
+        """Get current counter value.
+
+        Returns:
+            current counter value
+        """
+        with self.lock:
+            #Copy the cells, since a cell may be folded during the sum
+            return self.base + sum(cell[0] for cell in self.cells.values())
+
+    def set(self, value):
+        """Set counter value.
+
+        Note that increments made concurrently with set() by
+        other threads may or may not be reflected in the new value.
+
+        Args:
+            value: new counter value
+        Returns:
+            previous counter value
+        """
+        with self.lock:
+            old_value = self.base + sum(cell[0] for cell in self.cells.values())
+            self.base += value - old_value
+            return old_value
+
+    def increment(self, n=1):
+        """Increment counter value by n.
+
+        Args:
+            n: optional value to increment counter by
+        Returns:
+            None
+        """
+        try:
+            cell = self.local.owner.cell
+        except AttributeError:
+            cell = self._create_cell()
+        cell[0] += n
+
+    def decrement(self, n=1):
+        """Decrement counter value by n.
+
+        Args:
+            n: optional value to decrement counter by
+        Returns:
+            None
+        """
+        try:
+            cell = self.local.owner.cell
+        except AttributeError:
+            cell = self._create_cell()
+        cell[0] -= n
+
+class StripedCounters(Counters):
+    """Striped Counters class.
+
+    This class is safe for using across multiple threads and is
+    optimized for counters which are frequently written by many
+    threads. See StripedCounter for details.
+    """
+
+    def __init__(self, initial_value=0, counter_names=None, local_class=threading.local):
+        """StripedCounters constructor.
+
+        Args:
+            initial_value: Optional initial value for new counters
+            counter_names: Optional list of counter_name to
+                create counters during initialization. Otherwise,
+                counters will automatically be created as needed.
+            local_class: Optional local storage class used to
+                determine stripes. threading.local is used by
+                default, gevent.local.local can be provided to
+                stripe per greenlet.
+        """
+        self.initial_value = initial_value
+        self.local_class = local_class
+        self.lock = threading.Lock()
+        self.counters = {}
+
+        for counter_name in counter_names or []:
+            counter = StripedCounter(counter_name, self.initial_value, self.local_class)
+            self.counters[counter_name] = counter
+
+    def __contains__(self, counter_name):
+        """Check if counter_name is contained within Counters.
+
+        Returns:
+            True if counter_name exists, False otherwise.
+        """
+        return counter_name in self.counters
+
+    def __getitem__(self, counter_name):
+        """Get counter value for counter_name if it exists.
+
+        Returns:
+            Counter value if counter_name exists.
+        Raises:
+            KeyError if counter_name does not exist.
+        """
+        if counter_name not in self.counters:
+            raise KeyError
+        return self.counters[counter_name].get()
+
+    def _get_or_create_counter(self, counter_name):
+        """Helper method to get or create counters on demand.
+
+        Args:
+            counter_name: counter name
+        Returns:
+            Counter object
+        """
+        try:
+            return self.counters[counter_name]
+        except KeyError:
+            #Double check that counter does not exist
+            #after acquiring the lock
+            with self.lock:
+                if counter_name not in self.counters:
+                    counter = StripedCounter(counter_name, self.initial_value, self.local_class)
+                    self.counters[counter_name] = counter
+            return self.counters[counter_name]
+
+    def get_counter(self, counter_name):
+        """Get Counter object.
+
+        If the Counter object does not exist, It will created
+        and initialized with initial_value.
+
+        Args:
+            counter_name: counter name
+        Returns:
+            Counter object
+        """
+        return self._get_or_create_counter(counter_name)
+
+    def get(self, counter_name):
+        """Get counter value.
+
+        If the Counter object does not exist, It will created
+        and initialized with initial_value.
+
+        Args:
+            counter_name: counter name
+        Returns:
+            current counter value
+        """
+        return self._get_or_create_counter(counter_name).get()
+
+    def set(self, counter_name, value):
+        """Set counter value.
+
+        If the Counter object does not exist, It will created
+        and initialized with initial_value, and then
+        set to the given value.
+
+        Args:
+            counter_name: counter name
+            value: new counter value
+        Returns:
+            previous counter value
+        """
+        return self._get_or_create_counter(counter_name).set(value)
+
+    def increment(self, counter_name, n=1):
+        """Increment counter value by n.
+
+        If the Counter object does not exist, It will created
+        and initialized with initial_value, and then
+        incremented by n.
+
+        Args:
+            counter_name: counter name
+            n: Optional value to increment counter by
+        Returns:
+            None
+        """
+        return self._get_or_create_counter(counter_name).increment(n)
+
+    def decrement(self, counter_name, n=1):
+        """Decrement counter value by n.
+
+        If the Counter object does not exist, It will created
+        and initialized with initial_value, and then
+        decremented by n.
+
+        Args:
+            counter_name: counter name
+            n: Optional value to decrement counter by
+        Returns:
+            None
+        """
+        return self._get_or_create_counter(counter_name).decrement(n)
+
+    def as_dict(self):
+        """Return counters as dict of the form {name: value}.
+
+        Returns:
+            dict of the form {name: value}
+        """
+        with self.lock:
+            counters = self.counters.items()
+        return {k : v.get() for k,v in counters}
@@ -0,0 +1,156 @@
+import logging
+import time
+
+import gevent
+import gevent.event
+import gevent.queue
+
+from trpycore.greenlet.util import join
+from trpycore.thread.threadpool import STOP_ITEM, Task, ThreadPool
+
+class GreenletTask(Task):
+    """Greenlet task work item.
+
+    Task whose result is a gevent.event.AsyncResult, so that
+    greenlets can wait on it without blocking the hub.
+    """
+
+    def __init__(self, function, args=None, kwargs=None):
+        """GreenletTask constructor.
+
+        Arguments:
+            function: callable to run
+            args: optional positional arguments for function
+            kwargs: optional keyword arguments for function
+        """
+        super(GreenletTask, self).__init__(function, args, kwargs)
+        self.result = gevent.event.AsyncResult()
+
+
+class GreenletPool(ThreadPool):
+    """Greenlet pool class.
+
+    Greenlet counterpart of ThreadPool with the same interface, where
+    a fixed number of worker greenlets pull work items from a
+    gevent.queue.Queue. submit() and map() results are
+    gevent.event.AsyncResult's.
+
+    Like ThreadPool, this pool can either be extended with the 'process'
+    method overriden, or passed a processor callable or any object
+    containing a 'process' method which will receive a work item as
+    its sole argument.
+    """
+
+    def __init__(self, num_greenlets, processor=None, queue=None):
+        """GreenletPool constructor.
+
+        Arguments:
+            num_greenlets: number of worker greenlets to create
+            processor: optional callable or object with 'process'
+                method taking a single work item parameter.
+                If not provided, self.process() will be used
+                to process work items.
+            queue: optional work item gevent.queue.Queue instance
+        """
+        super(GreenletPool, self).__init__(num_greenlets, processor,
+                queue=queue or gevent.queue.Queue())
+
+        if callable(self.processor):
+            self.process_item = self.processor
+        elif hasattr(self.processor, "process"):
+            self.process_item = self.processor.process
+        else:
+            raise NotImplementedError("processor must be callable or have a 'process' method")
+
+    def _run(self):
+        """Worker greenlet run method."""
+        while True:
+            item = self.queue.get()
+            if item is STOP_ITEM:
+                break
+            elif isinstance(item, Task):
+                item.run()
+                continue
+            try:
+                self.process_item(item)
+            except Exception as error:
+                logging.exception(error)
+
+    def start(self):
+        """Start the greenlet pool."""
+        if not self.running:
+            self.running = True
+            self.accepting = True
+            self.threads = [gevent.spawn(self._run) for i in range(self.num_threads)]
+
+    def _sleep(self, seconds):
+        """Sleep while waiting in shutdown(), yielding to other greenlets."""
+        gevent.sleep(seconds)
+
+    def join(self, timeout=None):
+        """Join worker greenlets.
+        If timeout is not None, is_alive() must be used to determine
+        if the greenlet pool is still running.
+
+        Arguments:
+            timeout: join timeout in seconds
+        """
+        join(self.threads, timeout)
+
+    def is_alive(self):
+        """Test if greenlet pool is running / alive.
+
+        Returns: True if greenlet pool is running, false otherwise.
+        """
+        return self.running or any(not greenlet.dead for greenlet in self.threads)
+
+    def submit(self, function, *args, **kwargs):
+        """Submit a function call for execution by a worker greenlet.
+
+        Arguments:
+            function: callable to run
+            args: positional arguments for function
+            kwargs: keyword arguments for function
+
+        Returns:
+            gevent.event.AsyncResult which will contain the function's
+            return value, or exception, once it completes.
+
+        Raises:
+            gevent.queue.Full
+        """
+        task = GreenletTask(function, args, kwargs)
+        self.put(task)
+        return task.result
+
+    def as_completed(self, results, timeout=None):
+        """Iterate over AsyncResult's as they complete.
+
+        Arguments:
+            results: iterable of gevent.event.AsyncResult objects,
+                i.e. returned from submit().
+            timeout: Optional timeout in seconds for all results
+                to complete.
+
+        Returns:
+            generator yielding AsyncResult objects in
+            completion order.
+
+        Raises:
+            gevent.Timeout if all results did not complete
+            within timeout.
+        """
+        results = list(results)
+        completed = gevent.queue.Queue()
+        for result in results:
+            result.rawlink(completed.put)
+
+        deadline = None if timeout is None else time.time() + timeout
+        for i in range(len(results)):
+            try:
+                if deadline is None:
+                    yield completed.get()
+                else:
+                    yield completed.get(timeout=max(deadline - time.time(), 0))
+            except gevent.queue.Empty:
+                raise gevent.Timeout(timeout)
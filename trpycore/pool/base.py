@@ -1,4 +1,5 @@
 import abc
+import time
 
 class PoolEmptyException(Exception):
     pass
@@ -21,6 +22,11 @@ class PoolContextManager(object):
         """
         self.pool = pool
         self.instance = instance
+
+        #Record borrow time for instrumented pools
+        self.metrics = getattr(pool, "metrics", None)
+        if self.metrics is not None:
+            self.borrowed = time.time()
     
     def get(self):
         """Returns the pool object."""
@@ -35,13 +41,23 @@ class PoolContextManager(object):
         return self.get()
 
     def __exit__(self, exception_type, exception_value, exception_traceback):
-        """Exit context manager without suppressing exceptions."""
-        self.pool.put(self.instance)
+        """Exit context manager without suppressing exceptions.
+
+        The pooled object is released back to the pool along with
+        the exception, if any, raised within the context, which
+        allows the pool to discard broken objects.
+        """
+        if self.metrics is not None:
+            self.metrics.returned(self.borrowed)
+        self.pool.release(self.instance, exception_value)
         return False
 
 
 class Pool(object):
     __metaclass__ = abc.ABCMeta
+
+    #PoolMetrics object for instrumented pools, otherwise None.
+    metrics = None
     
     @abc.abstractmethod
     def get(block=True, timeout=None):
@@ -78,3 +94,31 @@ class Pool(object):
             instance: Pooled object instance to return to pool.
         """
         return
+
+    def release(self, instance, exception=None):
+        """Release a pooled object back to the pool.
+
+        This method will be called by the PoolContextManager
+        upon exit, with the exception raised within the context,
+        if any. Pools which are able to replace broken objects
+        should override this method to discard the instance
+        when appropriate. By default, the instance is put back
+        in the pool.
+
+        Args:
+            instance: Pooled object instance to return to pool.
+            exception: Optional exception raised while the
+                pooled object was in use.
+        """
+        self.put(instance)
+
+    def stats(self):
+        """Get a snapshot of pool metrics.
+
+        Returns:
+            dict of pool metrics (see PoolMetrics.stats), or
+            an empty dict if the pool is not instrumented.
+        """
+        if self.metrics is None:
+            return {}
+        return self.metrics.stats()
@@ -0,0 +1,557 @@
+import logging
+import threading
+import time
+from collections import deque
+
+from trpycore.pool.base import Pool, PoolContextManager, PoolEmptyException
+from trpycore.pool.metrics import PoolMetrics
+from trpycore.thread.util import join
+
+class ElasticPool(Pool):
+    """Elastic, self-healing pool class.
+
+    This class manages a pool of objects which grows and shrinks with
+    demand. Pooled objects are created lazily by the factory when a
+    borrower needs one and no idle object is available, up to max_size.
+    Objects which have been idle for longer than idle_timeout are
+    evicted, down to min_size. Optionally, min_size objects can be
+    created up front, in parallel, to warm the pool.
+
+    Idle objects are reused most recently used first, so that under
+    light load a small set of hot objects is used while the rest
+    become idle and are evicted.
+
+    Broken objects are kept out of the request path:
+        - objects are discarded if an exception in discard_exceptions
+          is raised while they are borrowed through the context manager.
+        - objects are validated before being borrowed (validate hook).
+        - objects are reset before being returned (reset hook) and
+          discarded if the reset fails.
+        - objects exceeding max_lifetime or max_uses are retired.
+        - an optional background health checker periodically
+          validates idle objects.
+    Discarded objects are replaced asynchronously, except for invalid
+    objects found by a borrower, which creates the replacement itself.
+    """
+
+    def __init__(self, factory, min_size=0, max_size=10, idle_timeout=None,
+            prewarm=False, destroy=None, validate=None, reset=None,
+            discard_exceptions=(EnvironmentError,), max_lifetime=None, max_uses=None,
+            health_check_interval=None, instrumented=False):
+        """ElasticPool constructor.
+
+        Args:
+            factory: Instance of Factory or object which provides
+                a create method taking no arguments.
+            min_size: Minimum number of objects to keep in the pool
+                when evicting idle objects.
+            max_size: Maximum number of objects in the pool.
+            idle_timeout: Optional number of seconds an object may
+                remain idle before being evicted. If None, idle
+                objects will never be evicted.
+            prewarm: If True, min_size objects will be created
+                in parallel during construction.
+            destroy: Optional callable taking a pooled object as its
+                sole argument, which will be invoked when the object
+                is evicted or discarded. If not provided, the object's
+                close() method, if it has one, will be invoked.
+            validate: Optional callable taking a pooled object as its
+                sole argument and returning True if the object is
+                usable. Invoked before an idle object is borrowed
+                and by the health checker.
+            reset: Optional callable taking a pooled object as its
+                sole argument, which will be invoked when the object
+                is returned to the pool, i.e. to rollback transactions.
+                If reset raises an exception the object is discarded.
+            discard_exceptions: Optional tuple of exception classes
+                which, if raised while the object is borrowed through
+                the context manager, will cause the object to be
+                discarded rather than returned to the pool. Defaults
+                to EnvironmentError (i.e. IOError, socket.error), so
+                that application errors do not discard healthy objects.
+            max_lifetime: Optional number of seconds after creation
+                after which an object will be retired.
+            max_uses: Optional number of times an object may be
+                borrowed before it is retired.
+            health_check_interval: Optional interval in seconds
+                at which a background thread will evict expired
+                objects, validate idle objects, and replenish the
+                pool to min_size.
+            instrumented: If True, pool metrics will be recorded
+                and made available through stats().
+        """
+        if min_size > max_size:
+            raise ValueError("min_size must be less than or equal to max_size")
+
+        self.factory = factory
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.destroy = destroy
+        self.validate = validate
+        self.reset = reset
+        self.discard_exceptions = discard_exceptions or ()
+        self.max_lifetime = max_lifetime
+        self.max_uses = max_uses
+        self.health_check_interval = health_check_interval
+        self.condition = threading.Condition(threading.Lock())
+        self.metrics = PoolMetrics() if instrumented else None
+
+        #Deque of (pooled_object, idle_since) tuples ordered
+        #from least recently used to most recently used.
+        self.idle = deque()
+
+        #Total number of pooled objects including idle objects,
+        #borrowed objects, and objects being created.
+        self.size = 0
+
+        #Map of id(pooled_object) to [created, uses]
+        self.metadata = {}
+
+        self.health_check_stop = threading.Event()
+        self.health_check_thread = None
+
+        if prewarm:
+            self.prewarm()
+
+        if self.health_check_interval is not None:
+            self.health_check_thread = threading.Thread(target=self._health_check_loop)
+            self.health_check_thread.daemon = True
+            self.health_check_thread.start()
+
+    def _create(self):
+        """Helper method to create a pooled object.
+
+        The caller must have already reserved capacity for the
+        object by incrementing size. If creation fails, the
+        reservation will be released.
+
+        Returns:
+            pooled object
+        Raises:
+            PoolEmptyException if the object could not be created.
+        """
+        start = time.time()
+        try:
+            instance = self.factory.create()
+            if instance is None:
+                raise PoolEmptyException
+        except Exception as error:
+            logging.exception(error)
+            if self.metrics is not None:
+                self.metrics.create_failed()
+            with self.condition:
+                self.size -= 1
+                self.condition.notify()
+            raise PoolEmptyException
+
+        if self.metrics is not None:
+            self.metrics.created(start)
+        with self.condition:
+            self.metadata[id(instance)] = [time.time(), 0]
+        return instance
+
+    def _destroy(self, instance):
+        """Helper method to destroy an evicted or discarded pooled object.
+
+        Args:
+            instance: pooled object
+        """
+        try:
+            if self.destroy is not None:
+                self.destroy(instance)
+            elif hasattr(instance, "close"):
+                instance.close()
+        except Exception as error:
+            logging.exception(error)
+
+    def _is_retired(self, instance, now):
+        """Helper method to check if an object exceeded max_lifetime or max_uses.
+
+        Must be called while holding the condition lock.
+
+        Args:
+            instance: pooled object
+            now: current time in seconds
+        Returns:
+            True if the object should be retired, False otherwise.
+        """
+        metadata = self.metadata.get(id(instance))
+        if metadata is None:
+            return False
+        created, uses = metadata
+        if self.max_lifetime is not None and now - created >= self.max_lifetime:
+            return True
+        if self.max_uses is not None and uses >= self.max_uses:
+            return True
+        return False
+
+    def _is_valid(self, instance):
+        """Helper method to validate a pooled object.
+
+        Args:
+            instance: pooled object
+        Returns:
+            True if the object is valid, False otherwise.
+        """
+        if self.validate is None:
+            return True
+        try:
+            return bool(self.validate(instance))
+        except Exception as error:
+            logging.exception(error)
+            return False
+
+    def _expire(self, now, scan=False):
+        """Helper method to remove expired idle objects.
+
+        Idle objects which have exceeded idle_timeout (down to
+        min_size), max_lifetime or max_uses are removed. Idle objects
+        are ordered by idle time, so only idle objects at the head
+        of the idle deque are checked, unless scan is True, in which
+        case all idle objects are checked for max_lifetime and
+        max_uses. This keeps get() from scanning every idle object,
+        since get() checks the object it borrows itself.
+
+        Must be called while holding the condition lock.
+
+        Args:
+            now: current time in seconds
+            scan: if True check all idle objects for max_lifetime
+                and max_uses.
+        Returns:
+            list of expired pooled objects which must be destroyed
+            once the condition lock is released.
+        """
+        expired = []
+        if self.idle_timeout is not None:
+            while self.idle and self.size > self.min_size:
+                instance, idle_since = self.idle[0]
+                if now - idle_since < self.idle_timeout:
+                    break
+                self.idle.popleft()
+                expired.append(instance)
+                self._remove(instance)
+
+        if self.max_lifetime is None and self.max_uses is None:
+            pass
+        elif scan:
+            for entry in list(self.idle):
+                if self._is_retired(entry[0], now):
+                    self.idle.remove(entry)
+                    expired.append(entry[0])
+                    self._remove(entry[0])
+        else:
+            while self.idle and self._is_retired(self.idle[0][0], now):
+                instance, idle_since = self.idle.popleft()
+                expired.append(instance)
+                self._remove(instance)
+        return expired
+
+    def _remove(self, instance):
+        """Helper method to remove an object from the pool's accounting.
+
+        Must be called while holding the condition lock.
+
+        Args:
+            instance: pooled object
+        """
+        self.size -= 1
+        self.metadata.pop(id(instance), None)
+        self.condition.notify()
+
+    def _replenish(self, minimum=0):
+        """Helper method to create objects until the pool contains min_size objects.
+
+        Objects are created in parallel in background threads.
+
+        Args:
+            minimum: minimum number of objects to create,
+                i.e. to replace discarded objects, up to max_size.
+        Returns:
+            list of started threads creating objects.
+        """
+        with self.condition:
+            count = max(self.min_size - self.size, minimum)
+            count = min(count, self.max_size - self.size)
+            self.size += count
+
+        def create():
+            try:
+                instance = self._create()
+                self.put(instance)
+            except PoolEmptyException:
+                pass
+
+        threads = [threading.Thread(target=create) for i in range(count)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        return threads
+
+    def _health_check_loop(self):
+        """Health checker thread run method."""
+        while not self.health_check_stop.is_set():
+            self.health_check_stop.wait(self.health_check_interval)
+            if not self.health_check_stop.is_set():
+                try:
+                    self.health_check()
+                except Exception as error:
+                    logging.exception(error)
+
+    def health_check(self):
+        """Evict expired objects, validate idle objects, and replenish pool.
+
+        This is invoked periodically by the health checker thread
+        if health_check_interval was provided, but can also be
+        invoked directly.
+
+        Returns:
+            number of evicted or discarded objects.
+        """
+        with self.condition:
+            expired = self._expire(time.time(), scan=True)
+            #Take idle objects out of the pool while validating,
+            #so they are not borrowed concurrently.
+            checking = list(self.idle) if self.validate else []
+            if checking:
+                self.idle.clear()
+
+        for instance in expired:
+            self._destroy(instance)
+
+        valid = []
+        invalid = []
+        for entry in checking:
+            if self._is_valid(entry[0]):
+                valid.append(entry)
+            else:
+                invalid.append(entry[0])
+
+        if valid:
+            with self.condition:
+                #Valid objects were idle before any object returned during
+                #validation, so put them back at the head of the idle deque
+                #in their original order, which lazy expiry relies on.
+                self.idle.extendleft(reversed(valid))
+                self.condition.notify(len(valid))
+
+        for instance in invalid:
+            self.discard(instance)
+
+        self._replenish()
+        return len(expired) + len(invalid)
+
+    def prewarm(self, timeout=None):
+        """Create objects in parallel until the pool contains min_size objects.
+
+        Args:
+            timeout: Optional timeout in seconds to wait for
+                object creation to complete.
+        """
+        join(self._replenish(), timeout)
+
+    def evict(self):
+        """Evict objects which have been idle longer than idle_timeout,
+        or exceeded max_lifetime or max_uses.
+
+        This is done automatically as the pool is used, but can
+        be invoked periodically to evict objects from pools which
+        are not being used.
+
+        Returns:
+            number of evicted objects.
+        """
+        with self.condition:
+            expired = self._expire(time.time(), scan=True)
+        for instance in expired:
+            self._destroy(instance)
+        return len(expired)
+
+    def get(self, block=True, timeout=None):
+        """
+        Returns a PoolContextManager to manage the pooled object
+        resource and should be used as follows:
+
+        with pool.get() as pooled_object:
+            pooled_object.send()
+
+        Args:
+            block: If true, method will block until a pooled
+                object becomes available.
+            timeout: Number of seconds to block (if True) for
+                a pooled object to become available before
+                raising PoolEmptyException.
+        Returns:
+            PoolContextManager instance wrapping the pooled object.
+
+        Raises:
+            PoolEmptyException if no pooled object is available.
+        """
+        start = time.time()
+        deadline = None if timeout is None else start + timeout
+
+        while True:
+            instance = None
+            reserved = False
+            expired = []
+
+            with self.condition:
+                while True:
+                    now = time.time()
+                    expired.extend(self._expire(now))
+                    if self.idle:
+                        instance, idle_since = self.idle.pop()
+                        if self._is_retired(instance, now):
+                            expired.append(instance)
+                            self._remove(instance)
+                            instance = None
+                            continue
+                        break
+                    elif self.size < self.max_size:
+                        #Reserve capacity and create the object
+                        #after releasing the lock.
+                        self.size += 1
+                        reserved = True
+                        break
+                    elif not block or (deadline is not None and now >= deadline):
+                        break
+                    else:
+                        self.condition.wait(None if deadline is None else deadline - now)
+
+            for expired_instance in expired:
+                self._destroy(expired_instance)
+
+            if reserved:
+                #Creation failures are recorded by _create(),
+                #rather than as timeouts.
+                instance = self._create()
+            elif instance is None:
+                if self.metrics is not None:
+                    self.metrics.timed_out(start)
+                raise PoolEmptyException
+            elif not self._is_valid(instance):
+                #This borrower creates the replacement itself
+                self._discard(instance, replace=False)
+                continue
+
+            with self.condition:
+                metadata = self.metadata.get(id(instance))
+                if metadata is not None:
+                    metadata[1] += 1
+            if self.metrics is not None:
+                self.metrics.borrowed(start)
+            return PoolContextManager(self, instance)
+
+    def put(self, instance):
+        """Put a pooled object back in the pool.
+
+        The object will be reset, if a reset hook was provided,
+        and retired if it exceeded max_lifetime or max_uses.
+
+        Args:
+            instance: Pooled object instance to return to pool.
+        """
+        if self.reset is not None:
+            try:
+                self.reset(instance)
+            except Exception as error:
+                logging.exception(error)
+                self.discard(instance)
+                return
+
+        with self.condition:
+            retired = self._is_retired(instance, time.time())
+            if not retired:
+                self.idle.append((instance, time.time()))
+                self.condition.notify()
+
+        if retired:
+            self.discard(instance)
+
+    def release(self, instance, exception=None):
+        """Release a pooled object back to the pool.
+
+        This method will be called by the PoolContextManager upon
+        exit. If the exception is an instance of discard_exceptions
+        the object will be discarded, otherwise it will be put
+        back in the pool.
+
+        Args:
+            instance: Pooled object instance to return to pool.
+            exception: Optional exception raised while the
+                pooled object was in use.
+        """
+        if exception is not None and isinstance(exception, self.discard_exceptions):
+            self.discard(instance)
+        else:
+            self.put(instance)
+
+    def discard(self, instance):
+        """Discard a broken pooled object.
+
+        The object is removed from the pool and destroyed, and a
+        replacement will be created asynchronously. Blocked borrowers
+        will be woken, so they can create a replacement themselves
+        if needed.
+
+        Objects which are not tracked by the pool, i.e. objects
+        which were already discarded, are ignored.
+
+        Args:
+            instance: Pooled object instance to discard.
+        """
+        self._discard(instance, replace=True)
+
+    def _discard(self, instance, replace):
+        """Helper method to discard a pooled object.
+
+        Args:
+            instance: Pooled object instance to discard.
+            replace: if True create a replacement asynchronously,
+                otherwise only if the pool falls below min_size.
+        """
+        with self.condition:
+            if id(instance) not in self.metadata:
+                logging.warning("ignoring discard of untracked object: %r" % (instance,))
+                return
+            self._remove(instance)
+        if self.metrics is not None:
+            self.metrics.discarded()
+        self._destroy(instance)
+        self._replenish(1 if replace else 0)
+
+    def stats(self):
+        """Get a snapshot of pool metrics.
+
+        Returns:
+            dict of pool metrics (see PoolMetrics.stats), including
+            utilization relative to max_size and the current size
+            and idle count, or an empty dict if the pool is not
+            instrumented.
+        """
+        if self.metrics is None:
+            return {}
+        result = self.metrics.stats(capacity=self.max_size)
+        with self.condition:
+            result["size"] = self.size
+            result["idle"] = len(self.idle)
+        return result
+
+    def close(self):
+        """Stop the health checker and destroy all idle objects.
+
+        Borrowed objects are not affected, and will be added
+        back to the pool when they are returned.
+        """
+        self.health_check_stop.set()
+        if self.health_check_thread is not None:
+            self.health_check_thread.join()
+
+        with self.condition:
+            idle = [instance for instance, idle_since in self.idle]
+            self.idle.clear()
+            for instance in idle:
+                self._remove(instance)
+        for instance in idle:
+            self._destroy(instance)
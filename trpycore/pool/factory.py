@@ -1,6 +1,8 @@
 import logging
+import time
 
 from trpycore.pool.base import Pool, PoolContextManager, PoolEmptyException
+from trpycore.pool.metrics import PoolMetrics
 
 class FactoryPool(Pool):
     """Factory pool class which always returns a new instance object.
@@ -11,14 +13,17 @@ class FactoryPool(Pool):
     to create and is not actually worth pooling.
     """
 
-    def __init__(self, factory):
+    def __init__(self, factory, instrumented=False):
         """SimplePool constructor.
         
         Args:
             factory: Instance of Factory or object which provides
                 a create method taking no arguments.
+            instrumented: If True, pool metrics will be recorded
+                and made available through stats().
         """
         self.factory = factory
+        self.metrics = PoolMetrics() if instrumented else None
     
     def get(self, block=True, timeout=None):
         """
@@ -40,16 +45,22 @@ class FactoryPool(Pool):
         Raises:
             PoolEmptyException if no pooled object is available.
         """
+        start = time.time()
         try:
             instance = self.factory.create()
             if instance is None:
                 raise PoolEmptyException
-            else:
-                return PoolContextManager(self, instance)
         except Exception as error:
             logging.exception(error)
+            if self.metrics is not None:
+                self.metrics.create_failed()
             raise PoolEmptyException
 
+        if self.metrics is not None:
+            self.metrics.created(start)
+            self.metrics.borrowed(start)
+        return PoolContextManager(self, instance)
+
     def put(self, instance):
         """Put a pooled object back in the pool.
 
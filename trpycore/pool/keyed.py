@@ -0,0 +1,209 @@
+import logging
+import threading
+
+from trpycore.pool.base import Pool, PoolEmptyException
+
+class KeyedPool(Pool):
+    """Keyed multi-endpoint pool class.
+
+    This class manages a sub-pool per endpoint, where endpoints are
+    the data associated with the nodes of a consistent hash ring
+    (i.e. zookeeper.watch.HashringWatch). Pooled objects are borrowed
+    by key: the key's preference list is used to select the endpoint,
+    and if the preferred endpoint's pool is unable to provide an
+    object (PoolEmptyException), lower preference endpoints will be
+    tried in order.
+
+    Sub-pools are added and removed as endpoints join and leave the
+    hashring. To keep the sub-pools in sync, watch_observer must be
+    invoked when the hashring changes, i.e.
+
+        pool = KeyedPool(pool_factory)
+        watch = HashringWatch(client, path, watch_observer=pool.watch_observer)
+        pool.hashring_watch = watch
+        watch.start()
+
+        with pool.get(key) as connection:
+            connection.send()
+
+    Multiple hashring positions may share the same endpoint data, in
+    which case they share a single sub-pool.
+    """
+
+    def __init__(self, pool_factory, hashring_watch=None, max_endpoints=None):
+        """KeyedPool constructor.
+
+        Args:
+            pool_factory: callable taking an endpoint (hashring
+                node data) as its sole argument and returning a
+                Pool object for the endpoint.
+            hashring_watch: Optional HashringWatch object, or object
+                providing hashring() and preference_list(data)
+                methods. If the watch has already started, sub-pools
+                will be created for the current hashring.
+                This may also be set after construction.
+            max_endpoints: Optional maximum number of endpoints
+                to try, in preference order, before raising
+                PoolEmptyException. If None, all endpoints will
+                be tried.
+        """
+        self.pool_factory = pool_factory
+        self.hashring_watch = hashring_watch
+        self.max_endpoints = max_endpoints
+        self.lock = threading.Lock()
+        self.pools = {}
+
+        if self.hashring_watch is not None:
+            self.update(self.hashring_watch.hashring())
+
+    def _close_pool(self, endpoint, pool):
+        """Helper method to close a removed endpoint pool.
+
+        Args:
+            endpoint: endpoint data
+            pool: endpoint Pool object
+        """
+        try:
+            if hasattr(pool, "close"):
+                pool.close()
+        except Exception as error:
+            logging.exception(error)
+
+    def update(self, hashring):
+        """Update sub-pools to match the hashring.
+
+        Sub-pools will be created for new endpoints and removed,
+        and closed, for endpoints no longer on the hashring.
+        Borrowed objects from removed pools are still returned
+        to their own pool by the context manager.
+
+        Args:
+            hashring: list of HashringNode's
+        """
+        endpoints = set(node.data for node in hashring)
+
+        with self.lock:
+            removed = [(e, p) for e, p in self.pools.items() if e not in endpoints]
+            added = [e for e in endpoints if e not in self.pools]
+
+        #Create pools outside the lock since creation may
+        #be expensive, i.e. prewarming connections.
+        created = {}
+        for endpoint in added:
+            try:
+                created[endpoint] = self.pool_factory(endpoint)
+            except Exception as error:
+                logging.exception(error)
+
+        with self.lock:
+            for endpoint, pool in removed:
+                self.pools.pop(endpoint, None)
+            for endpoint, pool in created.items():
+                #Endpoint pool may have been concurrently created
+                if endpoint in self.pools:
+                    removed.append((endpoint, pool))
+                else:
+                    self.pools[endpoint] = pool
+
+        for endpoint, pool in removed:
+            self._close_pool(endpoint, pool)
+
+    def watch_observer(self, watch, previous_hashring, current_hashring,
+            added_nodes, removed_nodes):
+        """HashringWatch watch_observer to keep sub-pools in sync.
+
+        Args:
+            watch: HashringWatch object
+            previous_hashring: hashring prior to changes
+            current_hashring: hashring after changes
+            added_nodes: list of added HashringNode's
+            removed_nodes: list of removed HashringNode's
+        """
+        self.update(current_hashring)
+
+    def endpoints(self, key):
+        """Get the endpoints responsible for key in preference order.
+
+        Args:
+            key: string to hash to find the hashring position.
+        Returns:
+            list of unique endpoints in preference order.
+        """
+        result = []
+        for node in self.hashring_watch.preference_list(key):
+            if node.data not in result:
+                result.append(node.data)
+                if self.max_endpoints is not None and len(result) >= self.max_endpoints:
+                    break
+        return result
+
+    def get(self, key, block=True, timeout=None):
+        """
+        Returns a PoolContextManager to manage the pooled object
+        resource and should be used as follows:
+
+        with pool.get(key) as pooled_object:
+            pooled_object.send()
+
+        Endpoints are tried in preference order without blocking.
+        If none can provide a pooled object, and block is True,
+        the method will block on the most preferred endpoint.
+
+        Args:
+            key: string to hash to select the endpoint.
+            block: If true, method will block until a pooled
+                object becomes available.
+            timeout: Number of seconds to block (if True) for
+                a pooled object to become available before
+                raising PoolEmptyException.
+        Returns:
+            PoolContextManager instance wrapping the pooled object.
+            The context manager returns the object to the
+            endpoint pool it was borrowed from.
+
+        Raises:
+            PoolEmptyException if no pooled object is available.
+        """
+        endpoints = self.endpoints(key)
+        with self.lock:
+            candidates = [self.pools[e] for e in endpoints if e in self.pools]
+
+        for pool in candidates:
+            try:
+                return pool.get(block=False)
+            except PoolEmptyException:
+                continue
+
+        if block and candidates:
+            return candidates[0].get(block=True, timeout=timeout)
+        raise PoolEmptyException
+
+    def put(self, instance):
+        """Put a pooled object back in the pool.
+
+        Pooled objects are returned to the endpoint pool they
+        were borrowed from by the context manager returned from
+        get(), so this method does nothing.
+
+        Args:
+            instance: Pooled object instance to return to pool.
+        """
+        return
+
+    def stats(self):
+        """Get a snapshot of endpoint pool metrics.
+
+        Returns:
+            dict of endpoint to endpoint pool stats().
+        """
+        with self.lock:
+            pools = self.pools.items()
+        return {endpoint: pool.stats() for endpoint, pool in pools}
+
+    def close(self):
+        """Remove and close all endpoint pools."""
+        with self.lock:
+            pools = self.pools.items()
+            self.pools = {}
+        for endpoint, pool in pools:
+            self._close_pool(endpoint, pool)
@@ -0,0 +1,112 @@
+import time
+
+from trpycore.counter.histogram import AtomicHistogram
+from trpycore.counter.striped import StripedCounters
+
+class PoolMetrics(object):
+    """Pool metrics class.
+
+    Records pool usage so that an undersized pool (long borrow waits,
+    timeouts) can be distinguished from borrowers holding pooled
+    objects too long (long hold times, high utilization).
+
+    Counters:
+        borrows: number of successful borrows
+        timeouts: number of borrows which failed since no
+            pooled object became available
+        creates: number of pooled objects created
+        create_failures: number of failed pooled object creations
+        discards: number of pooled objects discarded
+        in_use: number of pooled objects currently borrowed
+    Histograms (microseconds):
+        wait: time spent waiting to borrow a pooled object
+        hold: time a pooled object was borrowed
+        create: time spent creating a pooled object
+
+    Counters are striped (see StripedCounters) so that recording
+    does not contend across borrowing threads.
+
+    This class is safe for using across multiple threads.
+    """
+
+    COUNTER_NAMES = ["borrows", "timeouts", "creates", "create_failures", "discards", "in_use"]
+
+    def __init__(self):
+        """PoolMetrics constructor."""
+        self.counters = StripedCounters(counter_names=self.COUNTER_NAMES)
+        self.wait = AtomicHistogram("wait")
+        self.hold = AtomicHistogram("hold")
+        self.create = AtomicHistogram("create")
+
+        #Counter objects are cached to avoid name lookups on the hot path.
+        self.borrows = self.counters.get_counter("borrows")
+        self.timeouts = self.counters.get_counter("timeouts")
+        self.creates = self.counters.get_counter("creates")
+        self.create_failures = self.counters.get_counter("create_failures")
+        self.discards = self.counters.get_counter("discards")
+        self.in_use = self.counters.get_counter("in_use")
+
+    def borrowed(self, start):
+        """Record a successful borrow.
+
+        Args:
+            start: time in seconds at which the borrow started
+        """
+        self.wait.record((time.time() - start) * 1000000)
+        self.borrows.increment()
+        self.in_use.increment()
+
+    def returned(self, start):
+        """Record the return of a borrowed pooled object.
+
+        Args:
+            start: time in seconds at which the object was borrowed
+        """
+        self.hold.record((time.time() - start) * 1000000)
+        self.in_use.decrement()
+
+    def timed_out(self, start):
+        """Record a failed borrow.
+
+        Args:
+            start: time in seconds at which the borrow started
+        """
+        self.wait.record((time.time() - start) * 1000000)
+        self.timeouts.increment()
+
+    def created(self, start):
+        """Record the creation of a pooled object.
+
+        Args:
+            start: time in seconds at which creation started
+        """
+        self.create.record((time.time() - start) * 1000000)
+        self.creates.increment()
+
+    def create_failed(self):
+        """Record a failed pooled object creation."""
+        self.create_failures.increment()
+
+    def discarded(self):
+        """Record a discarded pooled object."""
+        self.discards.increment()
+
+    def stats(self, capacity=None):
+        """Get a snapshot of pool metrics.
+
+        Args:
+            capacity: Optional maximum number of pooled objects
+                used to compute utilization.
+        Returns:
+            dict containing counter values, histogram summaries
+            (see HistogramSnapshot.as_dict), and, if capacity
+            was provided, utilization (in_use / capacity).
+        """
+        result = self.counters.as_dict()
+        result["wait"] = self.wait.snapshot().as_dict()
+        result["hold"] = self.hold.snapshot().as_dict()
+        result["create"] = self.create.snapshot().as_dict()
+        if capacity:
+            result["capacity"] = capacity
+            result["utilization"] = float(result["in_use"]) / capacity
+        return result
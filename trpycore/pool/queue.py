@@ -1,7 +1,10 @@
 import logging
+import threading
 import Queue
+import time
 
 from trpycore.pool.base import Pool, PoolContextManager, PoolEmptyException
+from trpycore.pool.metrics import PoolMetrics
 
 class QueuePool(Pool):
     """Queue pool class.
@@ -9,9 +12,18 @@ class QueuePool(Pool):
     This class manages a pool of objects using a queue. Pooled objects
     can be explicitly specified or the provided Factory will be used
     to create the objects.
+
+    Objects are discarded, rather than returned to the pool, if an
+    exception in discard_exceptions is raised while they are borrowed
+    through the context manager. If a factory was provided, discarded
+    objects are replaced in the discarding thread, which wakes blocked
+    borrowers and works with any queue_class, including gevent queues.
+    If the replacement cannot be created, the next borrower which finds
+    no idle object will retry.
     """
 
-    def __init__(self, size, factory=None, queue_class=Queue.Queue, pooled_objects=None):
+    def __init__(self, size, factory=None, queue_class=Queue.Queue, pooled_objects=None,
+            instrumented=False, discard_exceptions=(EnvironmentError,)):
         """QueuePool constructor.
         
         Args:
@@ -25,22 +37,63 @@ class QueuePool(Pool):
             pooled_objects: Optional list of objects to pool. This
                 can be provided as alternative to specifying a
                 factory object.
+            instrumented: If True, pool metrics will be recorded
+                and made available through stats().
+            discard_exceptions: Optional tuple of exception classes
+                which, if raised while the object is borrowed through
+                the context manager, will cause the object to be
+                discarded rather than returned to the pool. Defaults
+                to EnvironmentError (i.e. IOError, socket.error).
+        Raises:
+            ValueError if the queue is bounded and cannot hold
+            all pooled objects.
         """
         self.size = size
         self.factory = factory
         self.queue = queue_class()
         self.pooled_objects = pooled_objects or []
+        self.metrics = PoolMetrics() if instrumented else None
+        self.discard_exceptions = discard_exceptions or ()
+
+        #Number of discarded objects awaiting replacement
+        self.missing = 0
+        self.lock = threading.Lock()
+
+        #Filling a bounded queue beyond its capacity would block forever,
+        #i.e. RingBufferQueue defaults to a capacity of 1024.
+        maxsize = getattr(self.queue, "maxsize", 0)
+        count = len(self.pooled_objects) or self.size
+        if maxsize > 0 and count > maxsize:
+            raise ValueError("pool size %d exceeds queue capacity %d" % (count, maxsize))
         
         #Create the pooled objects using the specified factory if
         #pooled_objects were not provided.
         if not self.pooled_objects:
             for i in range(0, self.size):
-                self.pooled_objects.append(self.factory.create())
+                self.pooled_objects.append(self._create())
         
         #Add pooled objects to the queue
         for pooled_object in self.pooled_objects:
             self.queue.put(pooled_object)
     
+    def _create(self):
+        """Helper method to create a pooled object with the factory.
+
+        Returns:
+            pooled object
+        """
+        if self.metrics is None:
+            return self.factory.create()
+
+        start = time.time()
+        try:
+            instance = self.factory.create()
+        except Exception:
+            self.metrics.create_failed()
+            raise
+        self.metrics.created(start)
+        return instance
+
     def get(self, block=True, timeout=None):
         """
         Returns a PoolContextManager to manage the pooled object
@@ -61,17 +114,52 @@ class QueuePool(Pool):
         Raises:
             PoolEmptyException if no pooled object is available.
         """
+        start = time.time()
         try:
-            instance = self.queue.get(block=block, timeout=timeout)
+            instance = None
+            if self.missing:
+                try:
+                    instance = self.queue.get(block=False)
+                except Exception:
+                    instance = self._replace()
+            if instance is None:
+                instance = self.queue.get(block=block, timeout=timeout)
 
             if instance is None:
                 raise PoolEmptyException
-            else:
-                return PoolContextManager(self, instance)
         except Exception as error:
             logging.exception(error)
+            if self.metrics is not None:
+                self.metrics.timed_out(start)
             raise PoolEmptyException
 
+        if self.metrics is not None:
+            self.metrics.borrowed(start)
+        return PoolContextManager(self, instance)
+
+    def _replace(self):
+        """Helper method to create a replacement for a discarded object.
+
+        Returns:
+            pooled object, or None if no object is awaiting
+            replacement or creation failed.
+        """
+        with self.lock:
+            if not self.missing:
+                return None
+            self.missing -= 1
+
+        try:
+            instance = self._create()
+            if instance is None:
+                raise PoolEmptyException
+            return instance
+        except Exception as error:
+            logging.exception(error)
+            with self.lock:
+                self.missing += 1
+            return None
+
     def put(self, instance):
         """Put a pooled object back in the pool.
 
@@ -82,3 +170,57 @@ class QueuePool(Pool):
             instance: Pooled object instance to return to pool.
         """
         self.queue.put(instance)
+
+    def release(self, instance, exception=None):
+        """Release a pooled object back to the pool.
+
+        This method will be called by the PoolContextManager upon
+        exit. If the exception is an instance of discard_exceptions
+        the object will be discarded, otherwise it will be put
+        back in the pool.
+
+        Args:
+            instance: Pooled object instance to return to pool.
+            exception: Optional exception raised while the
+                pooled object was in use.
+        """
+        if exception is not None and isinstance(exception, self.discard_exceptions):
+            self.discard(instance)
+        else:
+            self.put(instance)
+
+    def discard(self, instance):
+        """Discard a broken pooled object.
+
+        The object is closed, if it has a close() method, and if
+        a factory was provided, replaced. Otherwise, the pool shrinks.
+
+        Args:
+            instance: Pooled object instance to discard.
+        """
+        if self.metrics is not None:
+            self.metrics.discarded()
+        try:
+            if hasattr(instance, "close"):
+                instance.close()
+        except Exception as error:
+            logging.exception(error)
+
+        if self.factory is not None:
+            with self.lock:
+                self.missing += 1
+            replacement = self._replace()
+            if replacement is not None:
+                self.queue.put(replacement)
+
+    def stats(self):
+        """Get a snapshot of pool metrics.
+
+        Returns:
+            dict of pool metrics (see PoolMetrics.stats), including
+            utilization, or an empty dict if the pool is not
+            instrumented.
+        """
+        if self.metrics is None:
+            return {}
+        return self.metrics.stats(capacity=self.size)
@@ -1,4 +1,7 @@
+import time
+
 from trpycore.pool.base import Pool, PoolContextManager, PoolEmptyException
+from trpycore.pool.metrics import PoolMetrics
 
 class SimplePool(Pool):
     """Simple pool class which always returns the same instance object.
@@ -9,14 +12,17 @@ class SimplePool(Pool):
     safe and does not require pooling.
     """
 
-    def __init__(self, instance):
+    def __init__(self, instance, instrumented=False):
         """SimplePool constructor.
         
         Args:
             instance: Pooled object instance which will be returned
                 for each and every get().
+            instrumented: If True, pool metrics will be recorded
+                and made available through stats().
         """
         self.instance = instance
+        self.metrics = PoolMetrics() if instrumented else None
     
     def get(self, block=True, timeout=None):
         """
@@ -38,10 +44,14 @@ class SimplePool(Pool):
         Raises:
             PoolEmptyException if no pooled object is available.
         """
+        start = time.time()
         if self.instance is None:
+            #Not a timeout, since SimplePool never waits
             raise PoolEmptyException
-        else:
-            return PoolContextManager(self, self.instance)
+
+        if self.metrics is not None:
+            self.metrics.borrowed(start)
+        return PoolContextManager(self, self.instance)
 
     def put(self, instance):
         """Put a pooled object back in the pool.
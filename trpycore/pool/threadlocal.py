@@ -1,30 +1,150 @@
 import logging
 import threading
+import time
+import weakref
 
 from trpycore.pool.base import Pool, PoolContextManager, PoolEmptyException
+from trpycore.pool.metrics import PoolMetrics
+
+class _Owner(object):
+    """Thread local owner of a pooled object.
+
+    Instances are stored in the pool's thread local storage, so they
+    are destroyed when the owning thread (or greenlet) exits, which
+    allows the owned pooled object to be reclaimed.
+    """
+    __slots__ = ["instance", "__weakref__"]
+
+    def __init__(self, instance):
+        self.instance = instance
 
 class ThreadLocalPool(Pool):
     """Thread local pool class.
 
     This class manages a pool of objects using thread local storage. Each
     thread will have its own pooled object created lazily by the factory.
-    """
-    
-    #Thread local storage
-    threadlocal = threading.local()
 
+    Thread local storage is per pool, so multiple pools do not share
+    pooled objects. When a thread exits, its pooled object is reclaimed
+    and destroyed, so short-lived threads do not leak objects, and the
+    number of live objects can be capped with max_size, in which case
+    threads without an object will block until another thread exits.
+    """
 
-    def __init__(self, factory):
+    def __init__(self, factory, max_size=None, destroy=None,
+            local_class=threading.local, instrumented=False):
         """ThreadLocalPool constructor.
-        
+
         Args:
             factory: Instance of Factory or object which provides
                 a create method taking no arguments. This factory
                 will be used to lazily create thread local
                 pooled objects.
+            max_size: Optional maximum number of live pooled objects.
+                If None, the number of objects is unbounded.
+            destroy: Optional callable taking a pooled object as its
+                sole argument, which will be invoked when the object's
+                owning thread exits. If not provided, the object's
+                close() method, if it has one, will be invoked.
+            local_class: Optional local storage class. threading.local
+                is used by default.
+            instrumented: If True, pool metrics will be recorded
+                and made available through stats().
         """
         self.factory = factory
-        
+        self.max_size = max_size
+        self.destroy = destroy
+        self.local = local_class()
+        self.metrics = PoolMetrics() if instrumented else None
+
+        #Reentrant since objects may be reclaimed by garbage
+        #collection while the lock is held by the same thread.
+        self.condition = threading.Condition(threading.RLock())
+
+        #Map of owner weakref to live pooled object
+        self.owners = {}
+
+        #Number of live pooled objects, including objects being created.
+        self.size = 0
+
+    def _reserve(self, block, timeout):
+        """Helper method to reserve capacity for a new pooled object.
+
+        Args:
+            block: If true, block until capacity is available.
+            timeout: Number of seconds to block (if True).
+        Raises:
+            PoolEmptyException if capacity is not available.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self.condition:
+            while self.max_size is not None and self.size >= self.max_size:
+                now = time.time()
+                if not block or (deadline is not None and now >= deadline):
+                    raise PoolEmptyException
+                self.condition.wait(None if deadline is None else deadline - now)
+            self.size += 1
+
+    def _unreserve(self):
+        """Helper method to release capacity reserved by _reserve()."""
+        with self.condition:
+            self.size -= 1
+            self.condition.notify()
+
+    def _create(self):
+        """Helper method to create the pooled object for the current thread.
+
+        The caller must have already reserved capacity for the
+        object with _reserve(). If creation fails, the reservation
+        will be released.
+
+        Returns:
+            pooled object
+        Raises:
+            PoolEmptyException if the object could not be created.
+        """
+        start = time.time()
+        try:
+            instance = self.factory.create()
+            if instance is None:
+                raise PoolEmptyException
+        except Exception as error:
+            logging.exception(error)
+            self._unreserve()
+            if self.metrics is not None:
+                self.metrics.create_failed()
+            raise PoolEmptyException
+
+        if self.metrics is not None:
+            self.metrics.created(start)
+
+        owner = _Owner(instance)
+        def reclaim(ref):
+            #Owning thread exited, destroy its pooled object
+            with self.condition:
+                instance = self.owners.pop(ref)
+            self._unreserve()
+            self._destroy(instance)
+
+        with self.condition:
+            self.owners[weakref.ref(owner, reclaim)] = instance
+        self.local.owner = owner
+        return instance
+
+    def _destroy(self, instance):
+        """Helper method to destroy a reclaimed pooled object.
+
+        Args:
+            instance: pooled object
+        """
+        try:
+            if self.destroy is not None:
+                self.destroy(instance)
+            elif hasattr(instance, "close"):
+                instance.close()
+        except Exception as error:
+            logging.exception(error)
+
     def get(self, block=True, timeout=None):
         """
         Returns a PoolContextManager to manage the pooled object
@@ -45,20 +165,24 @@ class ThreadLocalPool(Pool):
         Raises:
             PoolEmptyException if no pooled object is available.
         """
-        try:
-            #If thread local pooled_object does not exist, create it.
-            if not getattr(self.threadlocal, "pooled_object", None):
-                self.threadlocal.pooled_object = self.factory.create()
-            
-            instance = self.threadlocal.pooled_object
+        start = time.time()
 
-            if instance is None:
-                raise PoolEmptyException
-            else:
-                return PoolContextManager(self, instance)
-        except Exception as error:
-            logging.exception(error)
-            raise PoolEmptyException
+        #If thread local pooled object does not exist, create it.
+        owner = getattr(self.local, "owner", None)
+        if owner is not None:
+            instance = owner.instance
+        else:
+            try:
+                self._reserve(block, timeout)
+            except PoolEmptyException:
+                if self.metrics is not None:
+                    self.metrics.timed_out(start)
+                raise
+            instance = self._create()
+
+        if self.metrics is not None:
+            self.metrics.borrowed(start)
+        return PoolContextManager(self, instance)
 
     def put(self, instance):
         """Put a pooled object back in the pool.
@@ -70,3 +194,18 @@ class ThreadLocalPool(Pool):
             instance: Pooled object instance to return to pool.
         """
         return
+
+    def stats(self):
+        """Get a snapshot of pool metrics.
+
+        Returns:
+            dict of pool metrics (see PoolMetrics.stats), including
+            the number of live objects and utilization relative to
+            max_size, if provided, or an empty dict if the pool is
+            not instrumented.
+        """
+        if self.metrics is None:
+            return {}
+        result = self.metrics.stats(capacity=self.max_size)
+        result["size"] = self.size
+        return result
@@ -0,0 +1,294 @@
+import logging
+import time
+from collections import deque
+
+import gevent
+import gevent.event
+
+from trpycore.pool.base import Pool, PoolContextManager, PoolEmptyException
+from trpycore.pool.metrics import PoolMetrics
+
+class GFairPool(Pool):
+    """Gevent fair pool class.
+
+    This class manages a pool of objects for use across greenlets.
+    Unlike QueuePool with a gevent queue, waiting greenlets are served
+    in strict FIFO order: a returned object is handed directly to the
+    longest waiting greenlet, so a newly arriving greenlet can never
+    take an object ahead of one that is already waiting.
+
+    Pooled objects are created lazily, up to max_size, in separate
+    greenlets, so slow creation (i.e. connecting with psycopg2_gevent
+    or riak_gevent) does not block the requesting greenlet beyond its
+    timeout, and the number of concurrent creations can be bounded
+    with max_creating. Objects created after their waiter gave up are
+    handed to the next waiter or added to the pool.
+
+    get() is safe to cancel: if the waiting greenlet is killed or
+    times out, it is removed from the waiters, and an object which was
+    handed to it in the meantime is passed on rather than leaked.
+    """
+
+    def __init__(self, factory, max_size=10, max_creating=None, destroy=None,
+            discard_exceptions=(EnvironmentError,), instrumented=False):
+        """GFairPool constructor.
+
+        Args:
+            factory: Instance of Factory or object which provides
+                a create method taking no arguments. create() will
+                be invoked in a separate greenlet.
+            max_size: Maximum number of objects in the pool.
+            max_creating: Optional maximum number of objects being
+                created concurrently. If None, up to max_size.
+            destroy: Optional callable taking a pooled object as its
+                sole argument, which will be invoked when the object
+                is discarded. If not provided, the object's close()
+                method, if it has one, will be invoked.
+            discard_exceptions: Optional tuple of exception classes
+                which, if raised while the object is borrowed through
+                the context manager, will cause the object to be
+                discarded rather than returned to the pool. Defaults
+                to EnvironmentError (i.e. IOError, socket.error), so
+                that application errors do not discard healthy objects.
+            instrumented: If True, pool metrics will be recorded
+                and made available through stats().
+        """
+        self.factory = factory
+        self.max_size = max_size
+        self.max_creating = max_creating or max_size
+        self.destroy = destroy
+        self.discard_exceptions = discard_exceptions or ()
+        self.metrics = PoolMetrics() if instrumented else None
+
+        #Idle pooled objects
+        self.idle = deque()
+
+        #FIFO of gevent.event.AsyncResult's for waiting greenlets
+        self.waiters = deque()
+
+        #Total number of pooled objects including idle objects,
+        #borrowed objects, and objects being created.
+        self.size = 0
+
+        #Number of objects being created
+        self.creating = 0
+
+    def _fill(self):
+        """Helper method to spawn object creations for waiting greenlets."""
+        while self.creating < len(self.waiters) and \
+                self.size < self.max_size and \
+                self.creating < self.max_creating:
+            self.size += 1
+            self.creating += 1
+            gevent.spawn(self._create)
+
+    def _new(self):
+        """Helper method to create a pooled object.
+
+        The caller must have already reserved capacity for the
+        object by incrementing size. If creation fails, the
+        reservation will be released.
+
+        Returns:
+            pooled object
+        Raises:
+            PoolEmptyException if the object could not be created.
+        """
+        start = time.time()
+        try:
+            instance = self.factory.create()
+            if instance is None:
+                raise PoolEmptyException
+        except Exception as error:
+            logging.exception(error)
+            self.size -= 1
+            if self.metrics is not None:
+                self.metrics.create_failed()
+            raise PoolEmptyException
+
+        if self.metrics is not None:
+            self.metrics.created(start)
+        return instance
+
+    def _create(self):
+        """Helper method to create a pooled object in its own greenlet.
+
+        The created object is handed to the longest waiting greenlet.
+        If creation fails, the longest waiting greenlet will fail with
+        PoolEmptyException, rather than waiting for its timeout.
+        Either way, creations are then spawned for the remaining
+        waiting greenlets, which were held back by max_creating.
+        """
+        try:
+            instance = self._new()
+        except PoolEmptyException:
+            self.creating -= 1
+            if self.waiters:
+                self.waiters.popleft().set_exception(PoolEmptyException())
+        else:
+            self.creating -= 1
+            self.put(instance)
+        self._fill()
+
+    def _destroy(self, instance):
+        """Helper method to destroy a discarded pooled object.
+
+        Args:
+            instance: pooled object
+        """
+        try:
+            if self.destroy is not None:
+                self.destroy(instance)
+            elif hasattr(instance, "close"):
+                instance.close()
+        except Exception as error:
+            logging.exception(error)
+
+    def get(self, block=True, timeout=None):
+        """
+        Returns a PoolContextManager to manage the pooled object
+        resource and should be used as follows:
+
+        with pool.get() as pooled_object:
+            pooled_object.send()
+
+        Args:
+            block: If true, method will block until a pooled
+                object becomes available.
+            timeout: Number of seconds to block (if True) for
+                a pooled object to become available before
+                raising PoolEmptyException.
+        Returns:
+            PoolContextManager instance wrapping the pooled object.
+
+        Raises:
+            PoolEmptyException if no pooled object is available.
+        """
+        start = time.time()
+
+        #Only take an idle object if no one is waiting, to
+        #preserve FIFO order.
+        if self.idle and not self.waiters:
+            instance = self.idle.pop()
+        elif not block:
+            if self.waiters or self.size >= self.max_size:
+                if self.metrics is not None:
+                    self.metrics.timed_out(start)
+                raise PoolEmptyException
+            #Create the object in this greenlet, since
+            #there is no one to hand it to otherwise.
+            self.size += 1
+            instance = self._new()
+        else:
+            waiter = gevent.event.AsyncResult()
+            self.waiters.append(waiter)
+            self._fill()
+            try:
+                waiter.wait(timeout)
+            except BaseException:
+                #Greenlet was killed or interrupted by an outer timeout.
+                self._cancel(waiter)
+                raise
+
+            if not waiter.successful():
+                #Creation failures are recorded by _new(),
+                #rather than as timeouts.
+                failed = waiter.ready()
+                self._cancel(waiter)
+                if self.metrics is not None and not failed:
+                    self.metrics.timed_out(start)
+                raise PoolEmptyException
+            instance = waiter.value
+
+        if self.metrics is not None:
+            self.metrics.borrowed(start)
+        return PoolContextManager(self, instance)
+
+    def _cancel(self, waiter):
+        """Helper method to cancel a waiter which failed, timed out, or was killed.
+
+        Args:
+            waiter: gevent.event.AsyncResult of the waiting greenlet.
+        """
+        try:
+            self.waiters.remove(waiter)
+        except ValueError:
+            #Waiter was already served. If it was handed an object
+            #before the greenlet could take it, pass the object on.
+            if waiter.successful():
+                self.put(waiter.value)
+
+    def put(self, instance):
+        """Put a pooled object back in the pool.
+
+        The object is handed to the longest waiting greenlet,
+        if any, otherwise it is added to the idle objects.
+
+        Args:
+            instance: Pooled object instance to return to pool.
+        """
+        if self.waiters:
+            self.waiters.popleft().set(instance)
+        else:
+            self.idle.append(instance)
+
+    def release(self, instance, exception=None):
+        """Release a pooled object back to the pool.
+
+        This method will be called by the PoolContextManager upon
+        exit. If the exception is an instance of discard_exceptions
+        the object will be discarded, otherwise it will be put
+        back in the pool.
+
+        Args:
+            instance: Pooled object instance to return to pool.
+            exception: Optional exception raised while the
+                pooled object was in use.
+        """
+        if exception is not None and isinstance(exception, self.discard_exceptions):
+            self.discard(instance)
+        else:
+            self.put(instance)
+
+    def discard(self, instance):
+        """Discard a broken pooled object.
+
+        The object is removed from the pool and destroyed, and
+        a replacement is created if greenlets are waiting.
+
+        Args:
+            instance: Pooled object instance to discard.
+        """
+        self.size -= 1
+        if self.metrics is not None:
+            self.metrics.discarded()
+        self._destroy(instance)
+        self._fill()
+
+    def stats(self):
+        """Get a snapshot of pool metrics.
+
+        Returns:
+            dict of pool metrics (see PoolMetrics.stats), including
+            utilization relative to max_size, the current size,
+            idle, waiting and creating counts, or an empty dict if
+            the pool is not instrumented.
+        """
+        if self.metrics is None:
+            return {}
+        result = self.metrics.stats(capacity=self.max_size)
+        result["size"] = self.size
+        result["idle"] = len(self.idle)
+        result["waiting"] = len(self.waiters)
+        result["creating"] = self.creating
+        return result
+
+    def close(self):
+        """Destroy all idle objects.
+
+        Borrowed objects are not affected, and will be added
+        back to the pool when they are returned.
+        """
+        while self.idle:
+            self.size -= 1
+            self._destroy(self.idle.pop())
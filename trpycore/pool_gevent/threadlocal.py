@@ -0,0 +1,71 @@
+import gevent.local
+try:
+    from gevent.coros import Semaphore
+except ImportError:
+    #gevent >= 1.0
+    from gevent.lock import Semaphore
+
+from trpycore.pool.base import PoolEmptyException
+from trpycore.pool.threadlocal import ThreadLocalPool
+
+class GThreadLocalPool(ThreadLocalPool):
+    """Greenlet local pool class.
+
+    This class manages a pool of objects using greenlet local storage.
+    Each greenlet will have its own pooled object created lazily by the
+    factory, which is reclaimed and destroyed once the greenlet exits
+    and is garbage collected. If max_size is provided, greenlets
+    without an object will cooperatively block until another
+    greenlet's object is reclaimed.
+    """
+
+    def __init__(self, factory, max_size=None, destroy=None, instrumented=False):
+        """GThreadLocalPool constructor.
+
+        Args:
+            factory: Instance of Factory or object which provides
+                a create method taking no arguments. This factory
+                will be used to lazily create greenlet local
+                pooled objects.
+            max_size: Optional maximum number of live pooled objects.
+                If None, the number of objects is unbounded.
+            destroy: Optional callable taking a pooled object as its
+                sole argument, which will be invoked when the object's
+                owning greenlet exits. If not provided, the object's
+                close() method, if it has one, will be invoked.
+            instrumented: If True, pool metrics will be recorded
+                and made available through stats().
+        """
+        super(GThreadLocalPool, self).__init__(
+                factory=factory,
+                max_size=max_size,
+                destroy=destroy,
+                local_class=gevent.local.local,
+                instrumented=instrumented)
+
+        if self.max_size is not None:
+            self.semaphore = Semaphore(self.max_size)
+        else:
+            self.semaphore = None
+
+    def _reserve(self, block, timeout):
+        """Helper method to reserve capacity for a new pooled object.
+
+        Args:
+            block: If true, block until capacity is available.
+            timeout: Number of seconds to block (if True).
+        Raises:
+            PoolEmptyException if capacity is not available.
+        """
+        if self.semaphore is not None:
+            if not self.semaphore.acquire(blocking=block, timeout=timeout if block else None):
+                raise PoolEmptyException
+        with self.condition:
+            self.size += 1
+
+    def _unreserve(self):
+        """Helper method to release capacity reserved by _reserve()."""
+        with self.condition:
+            self.size -= 1
+        if self.semaphore is not None:
+            self.semaphore.release()
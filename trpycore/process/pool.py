@@ -0,0 +1,361 @@
+import cPickle
+import logging
+import mmap
+import multiprocessing
+import threading
+import time
+import Queue
+
+from trpycore.thread.threadpool import STOP_ITEM, Task, ThreadPool
+
+#Serializes pipe creation and process forking across all pools, so
+#that a forked child never inherits another worker's pipe end, which
+#would prevent the parent from detecting that worker's exit.
+_fork_lock = threading.Lock()
+
+class ProcessCrashedException(Exception):
+    """Worker process exited while processing a work item."""
+    pass
+
+class SharedItem(object):
+    """Shared memory work item.
+
+    The data of SharedItem work items is copied into a shared memory
+    buffer, rather than pickled, when dispatched to a worker process.
+    The processor receives a read-only buffer object over the data,
+    which is only valid until the processor returns.
+
+    SharedItem's which do not fit in the pool's shared memory buffer
+    are pickled, in which case the processor receives the data itself.
+    """
+
+    def __init__(self, data):
+        """SharedItem constructor.
+
+        Args:
+            data: str data
+        """
+        self.data = data
+
+class _SharedReference(object):
+    """Reference to SharedItem data in a shared memory buffer."""
+    def __init__(self, offset, length):
+        self.offset = offset
+        self.length = length
+
+class _Call(object):
+    """Picklable function call for Task work items."""
+    def __init__(self, function, args, kwargs):
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+
+def _portable(value):
+    """Convert value to a picklable value.
+
+    Returns:
+        value if it can be pickled, otherwise an Exception
+        containing its repr().
+    """
+    try:
+        cPickle.dumps(value, cPickle.HIGHEST_PROTOCOL)
+        return value
+    except Exception:
+        return Exception(repr(value))
+
+def _worker_main(connection, parent_connection, processor, shared):
+    """Worker process main.
+
+    Receives batches of work items from the parent, and replies with
+    a list of (success, value) tuples, one per work item, where value
+    is a Task's return value or exception.
+
+    Args:
+        connection: worker's end of the pipe
+        parent_connection: parent's end of the pipe, to be closed
+        processor: callable or object with 'process' method
+        shared: optional shared memory mmap buffer
+    """
+    parent_connection.close()
+
+    if not callable(processor):
+        processor = processor.process
+
+    while True:
+        try:
+            batch = cPickle.loads(connection.recv_bytes())
+        except EOFError:
+            break
+        if batch is None:
+            break
+
+        results = []
+        for item in batch:
+            if isinstance(item, _Call):
+                try:
+                    results.append((True, item.function(*item.args, **item.kwargs)))
+                except Exception as error:
+                    results.append((False, error))
+                continue
+
+            if isinstance(item, _SharedReference):
+                item = buffer(shared, item.offset, item.length)
+            elif isinstance(item, SharedItem):
+                item = item.data
+            try:
+                processor(item)
+            except Exception as error:
+                logging.exception(error)
+            results.append((True, None))
+
+        try:
+            connection.send(results)
+        except Exception:
+            connection.send([(success, _portable(value)) for success, value in results])
+
+    connection.close()
+
+
+class ProcessWorkerThread(threading.Thread):
+    """Worker thread for use with ProcessPool class.
+
+    Worker will pull batches of up to batch_size work items from the
+    queue, waiting at most batch_timeout seconds for a batch to fill,
+    and dispatch each batch to its worker process in a single message.
+
+    The worker process is restarted after processing max_tasks work
+    items, or if it exits unexpectedly. Work items in the batch being
+    processed when a worker process exits are redispatched individually,
+    so that a single work item crashing the process fails only itself.
+    """
+
+    def __init__(self, queue, processor, batch_size=1, batch_timeout=0,
+            max_tasks=None, shared_size=0, daemon=False):
+        """ProcessWorkerThread constructor
+
+        Arguments:
+            queue: queue to pull work items from
+            processor: callable or object with 'process'
+                method taking a single work item parameter.
+            batch_size: maximum number of work items per dispatch
+            batch_timeout: maximum seconds to wait for a batch
+                to fill once the first item has been received.
+            max_tasks: optional number of work items after which
+                the worker process will be restarted.
+            shared_size: size in bytes of the shared memory buffer
+                for SharedItem work items.
+            daemon: if True make a daemon thread
+        """
+        super(ProcessWorkerThread, self).__init__()
+
+        if not callable(processor) and not hasattr(processor, "process"):
+            raise NotImplementedError("processor must be callable or have a 'process' method")
+
+        self.daemon = daemon
+        self.queue = queue
+        self.processor = processor
+        self.batch_size = batch_size
+        self.batch_timeout = batch_timeout
+        self.max_tasks = max_tasks
+        self.shared = mmap.mmap(-1, shared_size) if shared_size else None
+        self.process = None
+        self.connection = None
+        self.tasks = 0
+        self.restarts = 0
+
+    def _spawn(self):
+        """Start a new worker process."""
+        with _fork_lock:
+            self.connection, child_connection = multiprocessing.Pipe()
+            self.process = multiprocessing.Process(target=_worker_main,
+                    args=(child_connection, self.connection, self.processor, self.shared))
+            self.process.daemon = True
+            self.process.start()
+            child_connection.close()
+        self.tasks = 0
+
+    def _terminate(self):
+        """Stop the worker process, and wait for it to exit."""
+        try:
+            self.connection.send_bytes(cPickle.dumps(None))
+        except IOError:
+            pass
+        self.process.join()
+        self.connection.close()
+
+    def _restart(self):
+        """Restart the worker process."""
+        self._terminate()
+        self._spawn()
+        self.restarts += 1
+
+    def _next_batch(self):
+        """Get the next batch of work items.
+
+        Returns:
+            (batch, stop) tuple, where batch is a list of work
+            items, and stop is True if STOP_ITEM was received.
+        """
+        batch = []
+        item = self.queue.get()
+        deadline = time.time() + self.batch_timeout
+        while True:
+            if item is STOP_ITEM:
+                return batch, True
+            batch.append(item)
+
+            if len(batch) >= self.batch_size:
+                break
+            try:
+                item = self.queue.get_nowait()
+            except Queue.Empty:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=remaining)
+                except Queue.Empty:
+                    break
+        return batch, False
+
+    def _message(self, batch):
+        """Convert a batch of work items to a picklable message.
+
+        Task's are converted to function calls, and SharedItem data
+        is copied into the shared memory buffer if it fits.
+        """
+        message = []
+        offset = 0
+        for item in batch:
+            if isinstance(item, Task):
+                item = _Call(item.function, item.args, item.kwargs)
+            elif isinstance(item, SharedItem) and self.shared is not None:
+                length = len(item.data)
+                if offset + length <= len(self.shared):
+                    self.shared[offset:offset + length] = item.data
+                    item = _SharedReference(offset, length)
+                    offset += length
+            message.append(item)
+        return message
+
+    def _dispatch(self, batch):
+        """Dispatch a batch of work items to the worker process.
+
+        Arguments:
+            batch: list of work items
+        """
+        try:
+            data = cPickle.dumps(self._message(batch), cPickle.HIGHEST_PROTOCOL)
+        except Exception as error:
+            self._isolate(batch, error)
+            return
+
+        try:
+            self.connection.send_bytes(data)
+            results = self.connection.recv()
+        except (EOFError, IOError):
+            self.process.join()
+            error = ProcessCrashedException("worker process %s exited with code %s" % \
+                    (self.process.pid, self.process.exitcode))
+            logging.error(str(error))
+            self._restart()
+            self._isolate(batch, error)
+            return
+
+        for item, (success, value) in zip(batch, results):
+            if isinstance(item, Task):
+                if success:
+                    item.result.set(value)
+                else:
+                    item.result.set_exception(value)
+
+        self.tasks += len(batch)
+        if self.max_tasks and self.tasks >= self.max_tasks:
+            self._restart()
+
+    def _isolate(self, batch, error):
+        """Redispatch a failed batch one work item at a time.
+
+        Arguments:
+            batch: list of work items
+            error: exception which caused the batch to fail
+        """
+        if len(batch) > 1:
+            for item in batch:
+                self._dispatch([item])
+        elif isinstance(batch[0], Task):
+            batch[0].result.set_exception(error)
+        else:
+            logging.error("dropping work item: %s" % str(error))
+
+    def run(self):
+        """Worker run method."""
+        self._spawn()
+        try:
+            stop = False
+            while not stop:
+                batch, stop = self._next_batch()
+                if batch:
+                    self._dispatch(batch)
+        finally:
+            self._terminate()
+
+
+class ProcessPool(ThreadPool):
+    """Process pool class.
+
+    Drop-in replacement for ThreadPool for CPU bound work items, which
+    are processed in worker processes and are not limited by the GIL.
+    Each worker process is fed by a ProcessWorkerThread in the parent
+    process.
+
+    Like ThreadPool, this pool can either be extended with the 'process'
+    method overriden, or passed a processor. Worker processes are forked,
+    so the processor need not be picklable, but work items, and the
+    functions and arguments passed to submit() and map(), must be.
+    SharedItem work items are passed through shared memory instead.
+
+    Work items being processed when a worker process crashes may be
+    processed again, so processing should be idempotent.
+    """
+
+    def __init__(self, num_processes, processor=None, daemon=False, queue=None,
+            batch_size=1, batch_timeout=0, max_tasks=None, shared_size=0):
+        """ProcessPool constructor.
+
+        Arguments:
+            num_processes: number of worker processes to create
+            processor: optional callable or object with 'process'
+                method taking a single work item parameter.
+                If not provided, self.process() will be used
+                to process work items.
+            daemon: if True worker threads will be made daemon threads
+            queue: optional worker item Queue instance
+            batch_size: maximum number of work items dispatched to
+                a worker process in a single message.
+            batch_timeout: optional maximum seconds to wait for a
+                batch to fill once the first work item is received.
+            max_tasks: optional number of work items after which
+                a worker process will be restarted.
+            shared_size: optional size in bytes of each worker
+                process's shared memory buffer for SharedItem
+                work items.
+        """
+        super(ProcessPool, self).__init__(num_processes, processor, daemon, queue)
+        self.batch_size = batch_size
+        self.batch_timeout = batch_timeout
+        self.max_tasks = max_tasks
+        self.shared_size = shared_size
+
+    def start(self):
+        """Start the process pool."""
+        if not self.running:
+            self.running = True
+            self.accepting = True
+            self.threads = []
+            for i in range(self.num_threads):
+                worker = ProcessWorkerThread(self.queue, self.processor,
+                        self.batch_size, self.batch_timeout, self.max_tasks,
+                        self.shared_size, self.daemon)
+                self.threads.append(worker)
+                worker.start()
@@ -0,0 +1,273 @@
+import logging
+import threading
+import time
+import Queue
+
+from trpycore.thread.threadpool import STOP_ITEM, QueuedItem, Task, ThreadPool, \
+        ThreadPoolShutdownException, WorkerThread
+
+class AutoscalingWorkerThread(WorkerThread):
+    """Worker thread for use with AutoscalingThreadPool class.
+
+    In addition to processing work items, the worker records how long
+    each item waited in the queue, and whether it is currently idle,
+    for use by the pool's scaler.
+    """
+
+    def __init__(self, pool, queue, processor, daemon=False):
+        """AutoscalingWorkerThread constructor
+
+        Arguments:
+            pool: AutoscalingThreadPool which owns the worker
+            queue: queue to pull QueuedItem's from
+            processor: callable or object with 'process'
+                method taking a single work item parameter.
+            daemon: if True make a daemon thread
+        """
+        super(AutoscalingWorkerThread, self).__init__(queue, processor, daemon)
+        self.pool = pool
+        self.idle_since = time.time()
+
+    def run(self):
+        """Worker run method."""
+        try:
+            while True:
+                self.idle_since = time.time()
+                item = self.queue.get()
+                self.idle_since = None
+
+                if item is STOP_ITEM:
+                    break
+
+                self.pool._dequeued(time.time() - item.enqueued)
+                item = item.item
+                if isinstance(item, Task):
+                    item.run()
+                    continue
+                try:
+                    self.processor(item)
+                except Exception as error:
+                    logging.exception(error)
+        finally:
+            self.pool._exited(self)
+
+
+class AutoscalingThreadPool(ThreadPool):
+    """Autoscaling thread pool class.
+
+    The number of worker threads varies between min_threads and
+    max_threads. A scaler thread samples the pool every interval
+    seconds and:
+        - grows the pool when there is a backlog, no idle workers, and
+          either queued items waited at least wait_threshold seconds or
+          the backlog reached depth_threshold. The pool grows by up to
+          half its current size at a time.
+        - retires one worker per interval once it has been idle for
+          idle_timeout seconds, but never within cooldown seconds of
+          growing, so bursty load does not cause oscillation.
+
+    Like ThreadPool, this pool can either be extended with the 'process'
+    method overriden, or passed a processor.
+    """
+
+    def __init__(self, min_threads, max_threads, processor=None, daemon=False,
+            queue=None, wait_threshold=0.1, depth_threshold=None,
+            idle_timeout=60, cooldown=None, interval=1):
+        """AutoscalingThreadPool constructor.
+
+        Arguments:
+            min_threads: minimum number of worker threads
+            max_threads: maximum number of worker threads
+            processor: optional callable or object with 'process'
+                method taking a single work item parameter.
+                If not provided, self.process() will be used
+                to process work items.
+            daemon: if True worker threads will be made daemon threads
+            queue: optional worker item Queue instance
+            wait_threshold: queue wait time in seconds above which
+                the pool will grow.
+            depth_threshold: optional queue depth at or above which
+                the pool will grow.
+            idle_timeout: seconds a worker must be idle before
+                being retired.
+            cooldown: optional seconds after growing during which
+                workers will not be retired. Defaults to idle_timeout.
+            interval: scaler sampling interval in seconds.
+        """
+        if min_threads > max_threads:
+            raise ValueError("min_threads must be less than or equal to max_threads")
+
+        super(AutoscalingThreadPool, self).__init__(min_threads, processor, daemon, queue)
+        self.min_threads = min_threads
+        self.max_threads = max_threads
+        self.wait_threshold = wait_threshold
+        self.depth_threshold = depth_threshold
+        self.idle_timeout = idle_timeout
+        self.cooldown = idle_timeout if cooldown is None else cooldown
+        self.interval = interval
+
+        self.lock = threading.Lock()
+        self.workers = set()
+        self.scaler = None
+        self.scaler_stop = threading.Event()
+
+        #Sampled state since the scaler's previous tick
+        self.max_wait = 0
+        self.dequeued = 0
+        self.previous_depth = 0
+        self.last_grow = 0
+
+        #Number of STOP_ITEM's queued to retire idle workers
+        self.retiring = 0
+
+    def _dequeued(self, wait):
+        """Record that a worker dequeued an item.
+
+        Arguments:
+            wait: seconds the item waited in the queue
+        """
+        with self.lock:
+            self.dequeued += 1
+            if wait > self.max_wait:
+                self.max_wait = wait
+
+    def _exited(self, worker):
+        """Record that a worker exited.
+
+        Arguments:
+            worker: exiting AutoscalingWorkerThread
+        """
+        with self.lock:
+            self.workers.discard(worker)
+            self.num_threads = len(self.workers)
+            if self.retiring:
+                self.retiring -= 1
+
+    def _spawn(self, count):
+        """Start count additional workers.
+
+        Must be called while holding the lock.
+        """
+        for i in range(count):
+            worker = AutoscalingWorkerThread(self, self.queue, self.processor, self.daemon)
+            self.workers.add(worker)
+            #Replace rather than mutate the list, so a concurrent
+            #join() iterating the previous list is unaffected.
+            self.threads = [t for t in self.threads if t.is_alive()] + [worker]
+            worker.start()
+        self.num_threads = len(self.workers)
+
+    def scale(self):
+        """Sample the pool and grow or shrink it if needed.
+
+        This is invoked every interval by the scaler thread.
+
+        Returns:
+            change in the number of worker threads.
+        """
+        now = time.time()
+        depth = self.queue.qsize()
+
+        with self.lock:
+            if not self.running:
+                return 0
+
+            max_wait, self.max_wait = self.max_wait, 0
+            dequeued, self.dequeued = self.dequeued, 0
+            #Items which were queued at the previous tick and
+            #were not dequeued have waited at least interval.
+            if self.previous_depth and depth and not dequeued:
+                max_wait = max(max_wait, self.interval)
+            self.previous_depth = depth
+
+            live = len(self.workers)
+            #Snapshot idle times, since workers update them without the lock
+            idle = [w.idle_since for w in self.workers]
+            idle = [t for t in idle if t is not None]
+
+            backlogged = depth > 0 and not idle
+            pressured = max_wait >= self.wait_threshold or \
+                    (self.depth_threshold is not None and depth >= self.depth_threshold)
+
+            if backlogged and pressured and live < self.max_threads:
+                count = min(self.max_threads - live, depth, max(1, live // 2))
+                self._spawn(count)
+                self.last_grow = now
+                return count
+
+            if live > self.min_threads and depth == 0 and \
+                    now - self.last_grow >= self.cooldown:
+                expired = [t for t in idle if now - t >= self.idle_timeout]
+                #Any idle worker will take the STOP_ITEM, so only
+                #retire if there are more expired workers than
+                #STOP_ITEM's which have not yet been taken.
+                if len(expired) > self.retiring and live - self.retiring > self.min_threads:
+                    try:
+                        self.queue.put_nowait(STOP_ITEM)
+                    except Queue.Full:
+                        return 0
+                    self.retiring += 1
+                    return -1
+        return 0
+
+    def _scale_loop(self):
+        """Scaler thread run method."""
+        while not self.scaler_stop.is_set():
+            self.scaler_stop.wait(self.interval)
+            if not self.scaler_stop.is_set():
+                try:
+                    self.scale()
+                except Exception as error:
+                    logging.exception(error)
+
+    def start(self):
+        """Start the thread pool."""
+        with self.lock:
+            if self.running:
+                return
+            self.running = True
+            self.accepting = True
+            self.threads = []
+            self._spawn(self.min_threads)
+
+        self.scaler_stop.clear()
+        self.scaler = threading.Thread(target=self._scale_loop)
+        self.scaler.daemon = True
+        self.scaler.start()
+
+    def stop(self):
+        """Stop the thread pool."""
+        with self.lock:
+            if not self.running:
+                return
+            self.running = False
+            #Workers being retired already have a STOP_ITEM queued,
+            #and extra STOP_ITEM's would stop workers after a restart.
+            count = len(self.workers) - self.retiring
+        self.scaler_stop.set()
+        for i in range(count):
+            self.queue.put(STOP_ITEM)
+
+    def put(self, item, block=True, timeout=None, **kwargs):
+        """Put a work item in the queue for processing by worker thread.
+
+        Arguments:
+            item: processor specific work item
+            block: if True call will block if work item is full
+            timeout: if block True, block timeout seconds at most
+                and then raise Queue.Full exception.
+            kwargs: optional queue specific keyword arguments,
+                i.e. priority and deadline for SchedulingQueue.
+
+        Raises:
+            Queue.Full
+            ThreadPoolShutdownException
+        """
+        putting = self.putting
+        putting.append(None)
+        try:
+            if not self.accepting:
+                raise ThreadPoolShutdownException()
+            self.queue.put(QueuedItem(time.time(), item), block, timeout, **kwargs)
+        finally:
+            putting.pop()
@@ -0,0 +1,125 @@
+import threading
+import time
+
+from trpycore.counter.histogram import AtomicHistogram
+from trpycore.counter.striped import StripedCounters
+
+class ThreadPoolMetrics(object):
+    """Thread pool metrics class.
+
+    Records thread pool usage so that an undersized pool (long queue
+    waits, deep queue, highly utilized workers) can be distinguished
+    from slow work items (long processing times).
+
+    Counters:
+        processed: number of work items processed
+        errors: number of work items which raised an exception
+    Histograms (microseconds):
+        wait: time from put() until a worker started processing
+        process: time spent processing a work item (or batch)
+
+    Exceptions are counted by exception class name, and each running
+    worker's utilization is the fraction of time since it started that
+    it spent processing. Workers are removed once they exit.
+
+    This class is safe for using across multiple threads.
+    """
+
+    COUNTER_NAMES = ["processed", "errors"]
+
+    def __init__(self):
+        """ThreadPoolMetrics constructor."""
+        self.counters = StripedCounters(counter_names=self.COUNTER_NAMES)
+        self.wait = AtomicHistogram("wait")
+        self.process = AtomicHistogram("process")
+        self.lock = threading.Lock()
+        self.exceptions = {}
+
+        #Map of running worker name to [started, busy seconds] list,
+        #which is only updated by the worker itself.
+        self.workers = {}
+
+        #Counter objects are cached to avoid name lookups on the hot path.
+        self.processed_counter = self.counters.get_counter("processed")
+        self.errors_counter = self.counters.get_counter("errors")
+
+    def started(self, worker):
+        """Register a started worker.
+
+        Args:
+            worker: worker thread
+        Returns:
+            worker's [started, busy seconds] list.
+        """
+        utilization = [time.time(), 0.0]
+        with self.lock:
+            self.workers[worker.name] = utilization
+        return utilization
+
+    def stopped(self, worker):
+        """Remove an exited worker.
+
+        Args:
+            worker: worker thread
+        """
+        with self.lock:
+            self.workers.pop(worker.name, None)
+
+    def dequeued(self, enqueued, start):
+        """Record that a worker started processing a work item.
+
+        Args:
+            enqueued: time in seconds at which the item was put
+            start: time in seconds at which processing started
+        """
+        self.wait.record((start - enqueued) * 1000000)
+
+    def processed(self, utilization, start, count=1, exception=None):
+        """Record that a worker finished processing.
+
+        Args:
+            utilization: worker's list returned by started()
+            start: time in seconds at which processing started
+            count: number of work items processed
+            exception: optional exception raised by processing
+        """
+        elapsed = time.time() - start
+        utilization[1] += elapsed
+        self.process.record(elapsed * 1000000)
+        self.processed_counter.increment(count)
+        if exception is not None:
+            self.errors_counter.increment()
+            name = type(exception).__name__
+            with self.lock:
+                self.exceptions[name] = self.exceptions.get(name, 0) + 1
+
+    def stats(self, depth=None):
+        """Get a snapshot of thread pool metrics.
+
+        Args:
+            depth: Optional current queue depth.
+        Returns:
+            dict containing counter values, histogram summaries
+            (see HistogramSnapshot.as_dict), exceptions (dict of
+            exception class name to count), workers (dict of worker
+            name to utilization), utilization (mean utilization of
+            workers) and, if provided, depth.
+        """
+        now = time.time()
+        result = self.counters.as_dict()
+        result["wait"] = self.wait.snapshot().as_dict()
+        result["process"] = self.process.snapshot().as_dict()
+        with self.lock:
+            result["exceptions"] = dict(self.exceptions)
+            workers = self.workers.items()
+
+        result["workers"] = {}
+        for name, (started, busy) in workers:
+            elapsed = now - started
+            result["workers"][name] = min(busy / elapsed, 1.0) if elapsed > 0 else 0.0
+        utilizations = result["workers"].values()
+        result["utilization"] = sum(utilizations) / len(utilizations) if utilizations else 0.0
+
+        if depth is not None:
+            result["depth"] = depth
+        return result
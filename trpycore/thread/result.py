@@ -1,4 +1,7 @@
+import logging
 import threading
+import time
+import Queue
 
 class AsyncResult(object):
     """AsyncResult is a convenience class for async methods.
@@ -16,17 +19,22 @@ class AsyncResult(object):
         self.event = threading.Event()
         self.result = None
         self.exception = None
-    
+        self.lock = threading.Lock()
+        self.callbacks = []
+
     def ready(self):
         return self.event.is_set()
-    
+
+    def successful(self):
+        return self.ready() and self.exception is None
+
     def get(self, block=True, timeout=None):
         if not self.ready() and block:
             self.event.wait(timeout)
-        
+
         if not self.ready():
             raise self.Timeout("Timeout: result not ready")
-        
+
         if self.exception is not None:
             raise self.exception
         else:
@@ -34,8 +42,196 @@ class AsyncResult(object):
 
     def set(self, value=None):
         self.result = value
-        self.event.set()
+        self._complete()
 
     def set_exception(self, exception):
         self.exception = exception
-        self.event.set()
+        self._complete()
+
+    def link(self, callback):
+        """Register a callback to be invoked upon completion.
+
+        The callback will be invoked with this object as its sole
+        argument, in the context of the thread completing the
+        result, or immediately if the result is already ready.
+
+        Args:
+            callback: callable taking an AsyncResult argument.
+        """
+        with self.lock:
+            if not self.ready():
+                self.callbacks.append(callback)
+                return
+        self._notify(callback)
+
+    def unlink(self, callback):
+        """Remove a callback registered with link().
+
+        Callbacks which were already invoked, or were never
+        registered, are ignored.
+
+        Args:
+            callback: callable previously passed to link().
+        """
+        with self.lock:
+            try:
+                self.callbacks.remove(callback)
+            except ValueError:
+                pass
+
+    def then(self, function):
+        """Chain a function to be applied to this result.
+
+        Once this result completes successfully, function is invoked
+        with its value, in the context of the completing thread, and
+        the returned AsyncResult is set to function's return value.
+        If function returns an AsyncResult, the returned AsyncResult
+        is set once it completes. Exceptions raised by this result, or
+        by function, are propagated to the returned AsyncResult.
+
+        Args:
+            function: callable taking this result's value.
+        Returns:
+            AsyncResult
+        """
+        chained = AsyncResult()
+
+        def propagate(result):
+            if result.exception is not None:
+                chained.set_exception(result.exception)
+            else:
+                chained.set(result.result)
+
+        def callback(result):
+            if result.exception is not None:
+                chained.set_exception(result.exception)
+                return
+            try:
+                value = function(result.result)
+            except Exception as error:
+                chained.set_exception(error)
+                return
+            if isinstance(value, AsyncResult):
+                value.link(propagate)
+            else:
+                chained.set(value)
+
+        self.link(callback)
+        return chained
+
+    def _complete(self):
+        """Helper method to mark the result ready and notify callbacks."""
+        with self.lock:
+            self.event.set()
+            callbacks, self.callbacks = self.callbacks, []
+        for callback in callbacks:
+            self._notify(callback)
+
+    def _notify(self, callback):
+        """Helper method to invoke callback without propagating errors."""
+        try:
+            callback(self)
+        except Exception as error:
+            logging.exception(error)
+
+def as_completed(results, timeout=None):
+    """Iterate over AsyncResult's as they complete.
+
+    Args:
+        results: iterable of AsyncResult objects
+        timeout: Optional timeout in seconds for all results
+            to complete.
+    Returns:
+        generator yielding AsyncResult objects in
+        completion order.
+    Raises:
+        AsyncResult.Timeout if all results did not complete
+        within timeout.
+    """
+    results = list(results)
+    completed = Queue.Queue()
+    for result in results:
+        result.link(completed.put)
+
+    deadline = None if timeout is None else time.time() + timeout
+    try:
+        for i in range(len(results)):
+            try:
+                if deadline is None:
+                    yield completed.get()
+                else:
+                    yield completed.get(timeout=max(deadline - time.time(), 0))
+            except Queue.Empty:
+                raise AsyncResult.Timeout("Timeout: results not ready")
+    finally:
+        #Unlink callbacks of results which have not completed if the
+        #timeout expired or iteration was abandoned.
+        for result in results:
+            result.unlink(completed.put)
+
+def wait_all(results, timeout=None):
+    """Wait for all results to complete.
+
+    Rather than waiting on each result in turn, the caller is woken
+    once all results have completed, or timeout expires.
+
+    Args:
+        results: iterable of AsyncResult objects
+        timeout: Optional timeout in seconds for all results
+            to complete.
+    Returns:
+        list of completed results, in results order, which
+        will not include all results if timeout expired.
+    """
+    results = list(results)
+    lock = threading.Lock()
+    event = threading.Event()
+    remaining = [len(results)]
+
+    def callback(result):
+        with lock:
+            remaining[0] -= 1
+            if not remaining[0]:
+                event.set()
+
+    if results:
+        try:
+            for result in results:
+                result.link(callback)
+            event.wait(timeout)
+        finally:
+            for result in results:
+                result.unlink(callback)
+    return [result for result in results if result.ready()]
+
+def wait_any(results, timeout=None):
+    """Wait for any result to complete.
+
+    Args:
+        results: iterable of AsyncResult objects
+        timeout: Optional timeout in seconds for a result
+            to complete.
+    Returns:
+        first completed result, or None if timeout expired.
+    """
+    results = list(results)
+    completed = []
+    event = threading.Event()
+
+    def callback(result):
+        completed.append(result)
+        event.set()
+
+    for result in results:
+        if result.ready():
+            return result
+    try:
+        for result in results:
+            result.link(callback)
+        event.wait(timeout)
+    finally:
+        #Unlink callbacks from results which have not completed,
+        #so that long lived results do not accumulate callbacks.
+        for result in results:
+            result.unlink(callback)
+    return completed[0] if completed else None
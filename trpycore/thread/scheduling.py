@@ -0,0 +1,197 @@
+import heapq
+import itertools
+import logging
+import time
+import Queue
+
+from trpycore.counter.histogram import AtomicHistogram
+from trpycore.thread.threadpool import STOP_ITEM, QueuedItem, Task
+
+class DeadlineExpiredException(Exception):
+    """Work item deadline expired before it was processed."""
+    pass
+
+class SchedulingQueue(Queue.Queue):
+    """Priority and deadline scheduling queue.
+
+    Drop-in replacement for Queue.Queue for use with ThreadPool, i.e.
+
+        pool = ThreadPool(10, processor, queue=SchedulingQueue())
+        pool.put(item, priority=0, deadline=time.time() + 0.5)
+        pool.put(bulk_item, priority=10)
+
+    Items are dequeued in priority order (lower values first), then
+    earliest deadline first, then FIFO. Items whose deadline has
+    passed when they reach the head of the queue are dropped rather
+    than returned. If a dropped item is a Task (ThreadPool.submit()),
+    its result is set to DeadlineExpiredException, and expired_observer,
+    if provided, is invoked with the dropped item.
+
+    STOP_ITEM is always scheduled after all other items, so stopping a
+    pool does not preempt queued work.
+
+    Per priority metrics (queue wait time, dequeued and expired counts,
+    and the age of the oldest queued item) are available through
+    stats() to detect starvation of low priority work.
+    """
+
+    def __init__(self, maxsize=0, default_priority=0, expired_observer=None):
+        """SchedulingQueue constructor.
+
+        Args:
+            maxsize: Optional maximum queue size. If less than or
+                equal to zero, the queue size is infinite.
+            default_priority: Optional priority for items put
+                without an explicit priority.
+            expired_observer: Optional callable taking a dropped
+                work item as its sole argument.
+        """
+        Queue.Queue.__init__(self, maxsize)
+        self.default_priority = default_priority
+        self.expired_observer = expired_observer
+
+        #Map of priority to per priority metrics
+        self.metrics = {}
+
+    def _init(self, maxsize):
+        self.queue = []
+        self.sequence = itertools.count()
+
+    def _qsize(self, len=len):
+        return len(self.queue)
+
+    def _put(self, entry):
+        heapq.heappush(self.queue, entry)
+
+    def _get(self):
+        return heapq.heappop(self.queue)
+
+    def _metrics(self, priority):
+        """Helper method to get or create metrics for priority.
+
+        Returns:
+            dict containing dequeued and expired counts and
+            a wait time histogram (microseconds).
+        """
+        try:
+            return self.metrics[priority]
+        except KeyError:
+            with self.mutex:
+                return self.metrics.setdefault(priority, {
+                    "dequeued": 0,
+                    "expired": 0,
+                    "wait": AtomicHistogram("wait")
+                })
+
+    def put(self, item, block=True, timeout=None, priority=None, deadline=None):
+        """Put an item into the queue.
+
+        Args:
+            item: work item
+            block: if True call will block if the queue is full
+            timeout: if block True, block timeout seconds at most
+                and then raise Queue.Full exception.
+            priority: Optional priority, where lower values
+                are dequeued first. Defaults to default_priority.
+            deadline: Optional absolute time, in seconds since the
+                epoch, after which the item will be dropped rather
+                than dequeued.
+        Raises:
+            Queue.Full
+        """
+        if item is STOP_ITEM:
+            priority, deadline = float("inf"), None
+        elif priority is None:
+            priority = self.default_priority
+
+        entry = (
+            priority,
+            float("inf") if deadline is None else deadline,
+            next(self.sequence),
+            time.time(),
+            item)
+        Queue.Queue.put(self, entry, block, timeout)
+
+    def get(self, block=True, timeout=None):
+        """Remove and return the next unexpired item from the queue.
+
+        Args:
+            block: if True call will block until an item is available.
+            timeout: if block True, block timeout seconds at most
+                and then raise Queue.Empty exception.
+        Returns:
+            work item
+        Raises:
+            Queue.Empty
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            remaining = None if deadline is None else max(deadline - time.time(), 0)
+            priority, item_deadline, sequence, enqueued, item = \
+                    Queue.Queue.get(self, block, remaining)
+
+            now = time.time()
+            if item is STOP_ITEM:
+                return item
+
+            metrics = self._metrics(priority)
+            if now > item_deadline:
+                with self.mutex:
+                    metrics["expired"] += 1
+                self.task_done()
+                self._expire(item)
+                continue
+
+            with self.mutex:
+                metrics["dequeued"] += 1
+            metrics["wait"].record((now - enqueued) * 1000000)
+            return item
+
+    def _expire(self, item):
+        """Helper method to notify that an expired item was dropped.
+
+        Args:
+            item: dropped work item, or QueuedItem
+                (instrumented pools) wrapping it.
+        """
+        if isinstance(item, QueuedItem):
+            item = item.item
+        try:
+            if isinstance(item, Task):
+                item.result.set_exception(DeadlineExpiredException())
+            if self.expired_observer is not None:
+                self.expired_observer(item)
+        except Exception as error:
+            logging.exception(error)
+
+    def stats(self):
+        """Get per priority scheduling metrics.
+
+        Returns:
+            dict of priority to dict containing queued, dequeued
+            and expired counts, oldest (age in seconds of the
+            oldest queued item) and wait (queue wait time
+            histogram summary in microseconds).
+        """
+        now = time.time()
+        with self.mutex:
+            queued = {}
+            oldest = {}
+            for priority, deadline, sequence, enqueued, item in self.queue:
+                if item is STOP_ITEM:
+                    continue
+                queued[priority] = queued.get(priority, 0) + 1
+                oldest[priority] = max(oldest.get(priority, 0), now - enqueued)
+            metrics = dict(self.metrics)
+
+        result = {}
+        for priority in set(metrics) | set(queued):
+            priority_metrics = self._metrics(priority)
+            result[priority] = {
+                "queued": queued.get(priority, 0),
+                "oldest": oldest.get(priority, 0),
+                "dequeued": priority_metrics["dequeued"],
+                "expired": priority_metrics["expired"],
+                "wait": priority_metrics["wait"].snapshot().as_dict()
+            }
+        return result
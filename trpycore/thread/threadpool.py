@@ -2,18 +2,101 @@ import logging
 import threading
 import time
 import Queue
+from collections import deque
 
+from trpycore.thread.metrics import ThreadPoolMetrics
+from trpycore.thread.result import AsyncResult, as_completed
 from trpycore.thread.util import join
 
 STOP_ITEM = object()
 
+class QueuedItem(object):
+    """Queued work item with the time it was put.
+
+    Instrumented pools queue work items wrapped in QueuedItem, so that
+    queue wait time can be measured. Queues which inspect work items,
+    i.e. SchedulingQueue, must unwrap them.
+    """
+    __slots__ = ["enqueued", "item"]
+
+    def __init__(self, enqueued, item):
+        """QueuedItem constructor.
+
+        Arguments:
+            enqueued: time in seconds at which item was put
+            item: work item
+        """
+        self.enqueued = enqueued
+        self.item = item
+
+class ThreadPoolShutdownException(Exception):
+    """Thread pool was shut down, and is not accepting work items."""
+    pass
+
+class BatchProcessingException(Exception):
+    """Batch processing failed for some of the batch's work items.
+
+    Raised by batch processors to report the work items which failed,
+    once the remaining work items have been processed successfully.
+    Only the failed work items are treated as failed, and none of
+    the batch's work items are reprocessed.
+    """
+
+    def __init__(self, failed, message=None):
+        """BatchProcessingException constructor.
+
+        Arguments:
+            failed: list of failed work items
+            message: optional exception message
+        """
+        super(BatchProcessingException, self).__init__(
+                message or "%d work item(s) failed" % len(failed))
+        self.failed = failed
+
+def _run_chunk(function, chunk):
+    """Apply function to each item in chunk for ThreadPool.map().
+
+    This is a module level function, rather than a closure,
+    so that chunks are picklable for ProcessPool.
+    """
+    return [function(item) for item in chunk]
+
+class Task(object):
+    """Task work item.
+
+    Tasks are submitted to a ThreadPool with submit() and are run
+    directly by the worker thread, rather than being passed to the
+    processor. The task's return value, or exception, is delivered
+    through its AsyncResult.
+    """
+
+    def __init__(self, function, args=None, kwargs=None):
+        """Task constructor.
+
+        Arguments:
+            function: callable to run
+            args: optional positional arguments for function
+            kwargs: optional keyword arguments for function
+        """
+        self.function = function
+        self.args = args or ()
+        self.kwargs = kwargs or {}
+        self.result = AsyncResult()
+
+    def run(self):
+        """Run the task and set its result."""
+        try:
+            self.result.set(self.function(*self.args, **self.kwargs))
+        except Exception as error:
+            self.result.set_exception(error)
+
 class WorkerThread(threading.Thread):
     """Worker thread for use with ThreadPool class.
     Worker will pull work items from the queue
     and delegate item processing to the processor.
     """
 
-    def __init__(self, queue, processor, daemon=False):
+    def __init__(self, queue, processor, daemon=False, metrics=None):
         """WorkerThread constructor
 
         Arguments:
@@ -21,11 +104,14 @@ class WorkerThread(threading.Thread):
             processor: callable or object with 'process'
                 method taking a single work item parameter.
             daemon: if True make a daemon thread
+            metrics: optional ThreadPoolMetrics, in which case
+                the queue contains QueuedItem's.
         """
         super(WorkerThread, self).__init__()
 
         self.daemon = daemon
         self.queue = queue
+        self.metrics = metrics
 
         if callable(processor):
             self.processor = processor
@@ -36,24 +122,204 @@ class WorkerThread(threading.Thread):
     
     def run(self):
         """Worker run method."""
+        if self.metrics is not None:
+            self._run_instrumented()
+            return
+
         while True:
             item = self.queue.get()
             if item is STOP_ITEM:
                 break
+            elif isinstance(item, Task):
+                item.run()
+                continue
             try:
                 self.processor(item)
             except Exception as error:
                 logging.exception(error)
 
+    def _run_instrumented(self):
+        """Worker run method recording metrics.
+
+        This is a separate loop, so that uninstrumented
+        workers do not pay for instrumentation.
+        """
+        metrics = self.metrics
+        utilization = metrics.started(self)
+        try:
+            while True:
+                item = self.queue.get()
+                if item is STOP_ITEM:
+                    break
+
+                start = time.time()
+                metrics.dequeued(item.enqueued, start)
+                item = item.item
+                if isinstance(item, Task):
+                    item.run()
+                    metrics.processed(utilization, start, exception=item.result.exception)
+                    continue
+                try:
+                    self.processor(item)
+                    metrics.processed(utilization, start)
+                except Exception as error:
+                    metrics.processed(utilization, start, exception=error)
+                    logging.exception(error)
+        finally:
+            metrics.stopped(self)
+
+
+class BatchWorkerThread(WorkerThread):
+    """Batch worker thread for use with ThreadPool class.
+    Worker will pull up to batch_size work items from the queue,
+    waiting at most batch_timeout seconds for a batch to fill,
+    and delegate processing of the batch to the processor.
+
+    If batch processing raises BatchProcessingException, its failed
+    work items are logged, and no work items are reprocessed.
+
+    If batch processing raises any other exception, each item in the
+    batch is reprocessed individually as a single item batch,
+    so that one bad item does not cause the whole batch to fail.
+    Items which were processed before the exception was raised are
+    then processed again, so batch processing must be idempotent
+    unless it reports failures with BatchProcessingException.
+    """
+
+    def __init__(self, queue, processor, batch_size, batch_timeout=0, daemon=False,
+            metrics=None):
+        """BatchWorkerThread constructor
+
+        Arguments:
+            queue: queue to pull work items from
+            processor: callable or object with 'process_batch'
+                method taking a list of work items parameter.
+            batch_size: maximum number of work items per batch
+            batch_timeout: maximum seconds to wait for a batch
+                to fill once the first item has been received.
+            daemon: if True make a daemon thread
+            metrics: optional ThreadPoolMetrics, in which case
+                the queue contains QueuedItem's.
+        """
+        #Bypass WorkerThread's constructor, which requires
+        #a 'process' method rather than 'process_batch'.
+        super(WorkerThread, self).__init__()
+
+        self.daemon = daemon
+        self.queue = queue
+        self.metrics = metrics
+        self.batch_size = batch_size
+        self.batch_timeout = batch_timeout
+
+        if hasattr(processor, "process_batch"):
+            self.processor = processor.process_batch
+        elif callable(processor):
+            self.processor = processor
+        else:
+            raise NotImplementedError("processor must be callable or have a 'process_batch' method")
+
+    def _next_batch(self):
+        """Get the next batch of work items.
+
+        Returns:
+            (batch, stop) tuple, where batch is a list of work
+            items, and stop is True if STOP_ITEM was received.
+        """
+        batch = []
+        metrics = self.metrics
+        item = self.queue.get()
+        deadline = time.time() + self.batch_timeout
+        while True:
+            if item is STOP_ITEM:
+                return batch, True
+
+            if metrics is not None:
+                start = time.time()
+                metrics.dequeued(item.enqueued, start)
+                item = item.item
+                if isinstance(item, Task):
+                    item.run()
+                    metrics.processed(self.utilization, start, exception=item.result.exception)
+                else:
+                    batch.append(item)
+            elif isinstance(item, Task):
+                item.run()
+            else:
+                batch.append(item)
+
+            if len(batch) >= self.batch_size:
+                break
+            try:
+                item = self.queue.get_nowait()
+            except Queue.Empty:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=remaining)
+                except Queue.Empty:
+                    break
+        return batch, False
+
+    def run(self):
+        """Worker run method."""
+        metrics = self.metrics
+        if metrics is not None:
+            self.utilization = metrics.started(self)
+
+        try:
+            stop = False
+            while not stop:
+                batch, stop = self._next_batch()
+                if not batch:
+                    continue
+                start = time.time()
+                try:
+                    self.processor(batch)
+                    if metrics is not None:
+                        metrics.processed(self.utilization, start, len(batch))
+                except BatchProcessingException as error:
+                    if metrics is not None:
+                        metrics.processed(self.utilization, start, len(batch), error)
+                    logging.error("batch processing failed for %d of %d work items: %s" % \
+                            (len(error.failed), len(batch), str(error)))
+                except Exception as error:
+                    if metrics is not None:
+                        metrics.processed(self.utilization, start, len(batch), error)
+                    logging.exception(error)
+                    if len(batch) > 1:
+                        #Isolate the failing item(s)
+                        for item in batch:
+                            try:
+                                self.processor([item])
+                            except Exception as error:
+                                logging.exception(error)
+        finally:
+            if metrics is not None:
+                metrics.stopped(self)
+
 
 class ThreadPool(object):
     """Thread pool class.
     This pool can either be extended with the 'process' method overriden,
     or passed a processor callabale or any object containing a 'process'
     method which will receive a worker item as its sole argument.
+
+    In batch mode (batch_size provided), workers process lists of
+    work items, i.e. for bulk inserts, with the processor's
+    'process_batch' method, or the processor callable. Batch
+    processors should raise BatchProcessingException to report
+    individual failed work items. Any other exception causes each
+    of the batch's work items to be reprocessed individually
+    (see BatchWorkerThread).
+
+    If instrumented, queue wait and processing times, exceptions,
+    queue depth and worker utilization are available through stats().
+    Work items are then queued as QueuedItem's.
     """
 
-    def __init__(self, num_threads, processor=None, daemon=False, queue=None):
+    def __init__(self, num_threads, processor=None, daemon=False, queue=None,
+            batch_size=None, batch_timeout=0, instrumented=False):
         """ThreadPool constructor.
 
         Arguments:
@@ -64,21 +330,45 @@ class ThreadPool(object):
                 to process work items.
             daemone: if True worker threads will be made daemone threads
             queue: optional worker item Queue instance
+            batch_size: optional maximum number of work items per
+                batch. If provided, workers will process batches
+                of work items. If a processor is provided, it must
+                be a callable or object with a 'process_batch' method
+                taking a list of work items parameter. Otherwise,
+                self.process_batch() will be used.
+            batch_timeout: optional maximum seconds to wait for a
+                batch to fill once the first work item is received.
+            instrumented: if True record metrics (see stats()).
         """
         self.num_threads = num_threads
         self.processor = processor or self
         self.daemon = daemon
         self.queue = queue or Queue.Queue()
+        self.batch_size = batch_size
+        self.batch_timeout = batch_timeout
         self.threads = []
         self.running = False
+        self.accepting = True
+        self.metrics = ThreadPoolMetrics() if instrumented else None
+
+        #One entry per put() in progress. put() registers itself before
+        #checking accepting, so that shutdown() either observes the put
+        #in progress, or the put observes shutdown. deque append() and
+        #pop() are atomic, so puts never contend on a lock.
+        self.putting = deque()
 
     def start(self):
         """Start the thread pool."""
         if not self.running:
             self.running = True
+            self.accepting = True
             self.threads = []
             for i in range(self.num_threads):
-                worker = WorkerThread(self.queue, self.processor, self.daemon)
+                if self.batch_size:
+                    worker = BatchWorkerThread(self.queue, self.processor,
+                            self.batch_size, self.batch_timeout, self.daemon, self.metrics)
+                else:
+                    worker = WorkerThread(self.queue, self.processor, self.daemon, self.metrics)
                 self.threads.append(worker)
                 worker.start()
     
@@ -89,6 +379,108 @@ class ThreadPool(object):
             for i in range(self.num_threads):
                 self.queue.put(STOP_ITEM)
     
+    def shutdown(self, drain=True, timeout=None):
+        """Stop accepting work items, stop the thread pool and join.
+
+        Once shut down, put() raises ThreadPoolShutdownException
+        until the pool is started again.
+
+        If drain is True, queued work items are processed before
+        workers exit, until timeout expires. Otherwise, queued work
+        items are removed immediately, and workers exit once they
+        complete their current work item.
+
+        Work items which were not processed are removed from the queue
+        and returned. Removed Task's results are set to
+        ThreadPoolShutdownException. Workers may still be completing
+        their current work item if timeout expires, in which case
+        is_alive() will return True.
+
+        Puts in progress when shutdown() is called may still enqueue
+        their work items. shutdown() waits for them to complete, and
+        once timeout expires, removes queued work items so that puts
+        blocked on a full queue complete promptly.
+
+        Arguments:
+            drain: if True process queued work items
+            timeout: optional timeout in seconds to wait for
+                workers to exit.
+
+        Returns:
+            list of unprocessed work items.
+        """
+        self.accepting = False
+
+        start = time.time()
+        deadline = None if timeout is None else start + timeout
+        unprocessed = self._wait_for_puts(drain, deadline)
+        if not drain:
+            unprocessed.extend(self._remove())
+        self.stop()
+        self.join(timeout)
+
+        #Remove work items left over if timeout expired
+        unprocessed.extend(self._remove())
+        if timeout is not None and self.is_alive():
+            self.join(max(timeout - (time.time() - start), 0))
+
+        for item in unprocessed:
+            if isinstance(item, Task):
+                item.result.set_exception(ThreadPoolShutdownException())
+        return unprocessed
+
+    def _wait_for_puts(self, drain, deadline):
+        """Wait for puts in progress to complete.
+
+        Until deadline expires, if drain is True and workers are
+        running, blocked puts wait for workers to make room. Otherwise,
+        queued work items are removed to make room.
+
+        Arguments:
+            drain: if True leave queued work items for workers
+            deadline: optional time in seconds after which
+                queued work items are removed regardless of drain.
+
+        Returns:
+            list of removed work items.
+        """
+        items = []
+        while self.putting:
+            if not drain or not self.is_alive() or \
+                    (deadline is not None and time.time() >= deadline):
+                items.extend(self._remove())
+            self._sleep(0.001)
+        return items
+
+    def _sleep(self, seconds):
+        """Sleep while waiting in shutdown()."""
+        time.sleep(seconds)
+
+    def _remove(self):
+        """Remove all queued work items.
+
+        STOP_ITEM's are left in the queue, so that workers still exit.
+
+        Returns:
+            list of removed work items.
+        """
+        items = []
+        stops = 0
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except Queue.Empty:
+                break
+            if item is STOP_ITEM:
+                stops += 1
+            elif isinstance(item, QueuedItem):
+                items.append(item.item)
+            else:
+                items.append(item)
+        for i in range(stops):
+            self.queue.put(STOP_ITEM)
+        return items
+
     def join(self, timeout=None):
         """Join worker threads.
         If timeout is not None, is_alive() must be used to determine
@@ -111,7 +503,7 @@ class ThreadPool(object):
                 break
         return result
 
-    def put(self, item, block=True, timeout=None):
+    def put(self, item, block=True, timeout=None, **kwargs):
         """Put a work item in the queue for processing by worker thread.
 
         Arguments:
@@ -119,11 +511,120 @@ class ThreadPool(object):
             block: if True call will block if work item is full
             timeout: if block True, block timeout seconds at most
                 and then raise Queue.Full exception.
+            kwargs: optional queue specific keyword arguments,
+                i.e. priority and deadline for SchedulingQueue.
         
         Raises:
             Queue.Full
+            ThreadPoolShutdownException
+        """
+        if self.metrics is not None:
+            item = QueuedItem(time.time(), item)
+        putting = self.putting
+        putting.append(None)
+        try:
+            if not self.accepting:
+                raise ThreadPoolShutdownException()
+            self.queue.put(item, block, timeout, **kwargs)
+        finally:
+            putting.pop()
+
+    def stats(self):
+        """Get a snapshot of thread pool metrics.
+
+        Returns:
+            dict of thread pool metrics (see ThreadPoolMetrics.stats),
+            including queue depth, or an empty dict if the pool is
+            not instrumented.
         """
-        self.queue.put(item, block, timeout)
+        if self.metrics is None:
+            return {}
+        return self.metrics.stats(depth=self.queue.qsize())
+
+    def submit(self, function, *args, **kwargs):
+        """Submit a function call for execution by a worker thread.
+
+        Arguments:
+            function: callable to run
+            args: positional arguments for function
+            kwargs: keyword arguments for function
+
+        Returns:
+            AsyncResult which will contain the function's return
+            value, or exception, once it completes.
+
+        Raises:
+            Queue.Full
+        """
+        task = Task(function, args, kwargs)
+        self.put(task)
+        return task.result
+
+    def map(self, function, iterable, chunksize=1, max_in_flight=None, timeout=None):
+        """Apply function to each item in iterable using worker threads.
+
+        Items are submitted in chunks of chunksize, and results are
+        yielded in order as they become available. At most
+        max_in_flight chunks are submitted at any time, so
+        iterable may be large or unbounded.
+
+        Arguments:
+            function: callable taking a single item argument
+            iterable: iterable of items
+            chunksize: number of items to process per work item
+            max_in_flight: maximum number of chunks submitted but
+                not yet consumed. Defaults to twice num_threads.
+            timeout: optional timeout in seconds to wait for each
+                chunk's result.
+
+        Returns:
+            generator yielding function results in iterable order.
+
+        Raises:
+            AsyncResult.Timeout if a chunk's result is not ready
+            within timeout, or the exception raised by function.
+        """
+        max_in_flight = max_in_flight or self.num_threads * 2
+
+        def chunks():
+            chunk = []
+            for item in iterable:
+                chunk.append(item)
+                if len(chunk) >= chunksize:
+                    yield chunk
+                    chunk = []
+            if chunk:
+                yield chunk
+
+        in_flight = deque()
+        for chunk in chunks():
+            if len(in_flight) >= max_in_flight:
+                for result in in_flight.popleft().get(timeout=timeout):
+                    yield result
+            in_flight.append(self.submit(_run_chunk, function, chunk))
+
+        while in_flight:
+            for result in in_flight.popleft().get(timeout=timeout):
+                yield result
+
+    def as_completed(self, results, timeout=None):
+        """Iterate over AsyncResult's as they complete.
+
+        Arguments:
+            results: iterable of AsyncResult objects, i.e.
+                returned from submit().
+            timeout: Optional timeout in seconds for all results
+                to complete.
+
+        Returns:
+            generator yielding AsyncResult objects in
+            completion order.
+
+        Raises:
+            AsyncResult.Timeout if all results did not complete
+            within timeout.
+        """
+        return as_completed(results, timeout)
 
     def process(self, item):
         """Work item process method.
@@ -134,3 +635,27 @@ class ThreadPool(object):
         callable or object is not being used.
         """
         raise NotImplementedError("process not implemented")
+
+    def process_batch(self, items):
+        """Work item batch process method.
+
+        This method will be used as the batch processor in batch mode
+        in the event that no explicit processor is provided in the
+        constructor. By default, each item is processed with process(),
+        with errors isolated per item. Subclasses should override this
+        method to process items in bulk.
+
+        Arguments:
+            items: list of work items
+        Raises:
+            BatchProcessingException if any work items failed.
+        """
+        failed = []
+        for item in items:
+            try:
+                self.process(item)
+            except Exception as error:
+                logging.exception(error)
+                failed.append(item)
+        if failed:
+            raise BatchProcessingException(failed)
@@ -0,0 +1,224 @@
+import itertools
+import logging
+import random
+import threading
+from collections import deque
+
+from trpycore.thread.threadpool import Task, ThreadPool, ThreadPoolShutdownException
+
+class WorkStealingWorkerThread(threading.Thread):
+    """Worker thread for use with WorkStealingThreadPool class.
+    Worker will pop work items from its own deque (most recently
+    added first), and when its deque is empty, steal work items
+    from other workers' deques (least recently added first).
+    """
+
+    def __init__(self, pool, deque, processor, daemon=False):
+        """WorkStealingWorkerThread constructor
+
+        Arguments:
+            pool: WorkStealingThreadPool which owns the worker
+            deque: collections.deque of work items owned by the worker
+            processor: callable or object with 'process'
+                method taking a single work item parameter.
+            daemon: if True make a daemon thread
+        """
+        super(WorkStealingWorkerThread, self).__init__()
+
+        self.daemon = daemon
+        self.pool = pool
+        self.deque = deque
+
+        if callable(processor):
+            self.processor = processor
+        elif hasattr(processor, "process"):
+            self.processor = processor.process
+        else:
+            raise NotImplementedError("processor must be callable or have a 'process' method")
+
+    def run(self):
+        """Worker run method."""
+        pool = self.pool
+        pool.local.deque = self.deque
+        pop = self.deque.pop
+        while True:
+            try:
+                item = pop()
+            except IndexError:
+                item = pool._steal(self.deque)
+                if item is None:
+                    if pool._idle():
+                        break
+                    continue
+
+            if isinstance(item, Task):
+                item.run()
+                continue
+            try:
+                self.processor(item)
+            except Exception as error:
+                logging.exception(error)
+
+
+class WorkStealingThreadPool(ThreadPool):
+    """Work stealing thread pool class.
+
+    Each worker owns a deque of work items, so unlike ThreadPool, work
+    items do not pass through a single shared, locked queue. Work items
+    put from a worker thread (i.e. submit() from within a task) are
+    added to that worker's own deque, and work items put from other
+    threads are distributed round robin across the workers. Idle
+    workers steal work items from other workers' deques before
+    going to sleep.
+
+    Deques are unbounded, so put() never blocks, and work items are
+    not strictly processed in FIFO order.
+
+    Like ThreadPool, this pool can either be extended with the 'process'
+    method overriden, or passed a processor. None is not a valid
+    work item.
+    """
+
+    def __init__(self, num_threads, processor=None, daemon=False):
+        """WorkStealingThreadPool constructor.
+
+        Arguments:
+            num_threads: number of worker thread to create
+            processor: optional callable or object with 'process'
+                method taking a single work item parameter.
+                If not provided, self.process() will be used
+                to process work items.
+            daemon: if True worker threads will be made daemon threads
+        """
+        super(WorkStealingThreadPool, self).__init__(num_threads, processor, daemon)
+        self.local = threading.local()
+        self.condition = threading.Condition(threading.Lock())
+        self.sleeping = 0
+        #Number of sleeping workers notified, but not yet awake
+        self.waking = 0
+        self.stopping = False
+
+        #Deques outlive worker threads, so work items can be
+        #put before the pool is started or after it is stopped.
+        self.deques = [deque() for i in range(self.num_threads)]
+        self.next_deque = itertools.cycle(self.deques).next
+
+    def _steal(self, own):
+        """Steal a work item from another worker's deque.
+
+        Arguments:
+            own: stealing worker's deque
+        Returns:
+            work item, or None if no work items are available.
+        """
+        deques = self.deques
+        offset = random.randrange(len(deques))
+        for i in xrange(len(deques)):
+            victim = deques[(offset + i) % len(deques)]
+            #Check before popping, since raising IndexError for
+            #each empty deque is comparatively expensive.
+            if victim and victim is not own:
+                try:
+                    return victim.popleft()
+                except IndexError:
+                    pass
+        return None
+
+    def _idle(self):
+        """Wait for work items once no work items could be found.
+
+        Returns:
+            True if the worker should exit, False otherwise.
+        """
+        with self.condition:
+            #Register as sleeping before rechecking the deques, since
+            #put() appends before checking for sleeping workers. Either
+            #put() observes this worker and notifies it, or the recheck
+            #observes put()'s work item.
+            self.sleeping += 1
+            try:
+                for work in self.deques:
+                    if work:
+                        return False
+                if self.stopping:
+                    return True
+                self.condition.wait()
+                if self.waking:
+                    self.waking -= 1
+                return False
+            finally:
+                self.sleeping -= 1
+
+    def start(self):
+        """Start the thread pool."""
+        if not self.running:
+            self.running = True
+            self.accepting = True
+            self.stopping = False
+            self.threads = []
+            for work in self.deques:
+                worker = WorkStealingWorkerThread(self, work, self.processor, self.daemon)
+                self.threads.append(worker)
+                worker.start()
+
+    def stop(self):
+        """Stop the thread pool.
+
+        Workers will exit once all work items have been processed.
+        """
+        if self.running:
+            self.running = False
+            with self.condition:
+                self.stopping = True
+                self.condition.notify_all()
+
+    def _remove(self):
+        """Remove all work items from worker deques.
+
+        Returns:
+            list of removed work items.
+        """
+        items = []
+        for work in self.deques:
+            while True:
+                try:
+                    items.append(work.popleft())
+                except IndexError:
+                    break
+        return items
+
+    def put(self, item, block=True, timeout=None, **kwargs):
+        """Put a work item in a deque for processing by worker thread.
+
+        Arguments:
+            item: processor specific work item
+            block: unused, since deques are unbounded
+            timeout: unused, since deques are unbounded
+            kwargs: unused
+
+        Raises:
+            ThreadPoolShutdownException
+        """
+        work = getattr(self.local, "deque", None)
+        if work is None:
+            work = self.next_deque()
+        putting = self.putting
+        putting.append(None)
+        try:
+            if not self.accepting:
+                raise ThreadPoolShutdownException()
+            work.append(item)
+        finally:
+            putting.pop()
+
+        #Wake one sleeping worker per work item, until every sleeping
+        #worker has been notified, so that a burst of work items is
+        #processed in parallel. Workers which were notified but are not
+        #yet awake are guaranteed to find work items (or have them
+        #stolen), so puts only contend for the condition lock while
+        #there are sleeping workers left to notify.
+        if self.sleeping > self.waking:
+            with self.condition:
+                if self.sleeping > self.waking:
+                    self.waking += 1
+                    self.condition.notify()
@@ -4,6 +4,8 @@ import threading
 
 import zookeeper
 
+from trpycore.thread.result import AsyncResult
+
 #Map zookeeper event types to names
 TYPE_NAME_MAP = {
     zookeeper.CHANGED_EVENT: "CHANGED_EVENT",
@@ -81,42 +83,18 @@ class ZookeeperClient(threading.Thread):
             self.type_name = TYPE_NAME_MAP.get(type)
             self.state_name = STATE_NAME_MAP.get(state)
     
-    class AsyncResult(object):
+    class AsyncResult(AsyncResult):
         """AsyncResult is returned by async methods if a callback is not passsed.
            This provides a convenient way for the invoker to receive the result
            in a non-busy-waiting manner.
-        """
 
-        class TimeoutException(Exception):
-            pass
+           This is trpycore.thread.result.AsyncResult, so results compose
+           with ThreadPool results through link(), then(), wait_all() and
+           wait_any().
+        """
 
-        def __init__(self):
-            self.event = threading.Event()
-            self.result = None
-            self.exception = None
-        
-        def ready(self):
-            return self.event.is_set()
-        
-        def get(self, block=True, timeout=None):
-            if not self.ready() and block:
-                self.event.wait(timeout)
-            
-            if not self.ready():
-                raise self.TimeoutException("Timeout: result not ready")
-            
-            if self.exception is not None:
-                raise self.exception
-            else:
-                return self.result
-
-        def set(self, value=None):
-            self.result = value
-            self.event.set()
-    
-        def set_exception(self, exception):
-            self.exception = exception
-            self.event.set()
+        #Alias of Timeout for backwards compatibility
+        TimeoutException = AsyncResult.Timeout
 
     def __init__(self, servers, session_id=None, session_password=None):
         """Zookeeper constructor.